@@ -0,0 +1,66 @@
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Callable, Optional
+import numpy as np
+
+from generator.tp_generator import generate, Source
+
+# Cumulative probabilities of a Poisson distribution, up to the count where
+# the remaining mass is negligible
+@lru_cache(maxsize=None)
+def poisson_cdf(l: float) -> np.ndarray:
+    pmf = [np.exp(-l)]
+    cdf = [pmf[0]]
+    k = 0
+    while k < l or (1 - cdf[-1] > 1e-15 and pmf[-1] > 0):
+        k += 1
+        pmf.append(pmf[-1] * l / k)
+        cdf.append(cdf[-1] + pmf[-1])
+    return np.array(cdf)
+
+# Draws one Poisson variate per uniform by inverting the distribution
+def poisson_counts(l: float, uniforms: np.ndarray) -> np.ndarray:
+    cdf = poisson_cdf(float(l))
+    return np.minimum(np.searchsorted(cdf, uniforms, side="right"), len(cdf) - 1)
+
+class ArrivalProcess(ABC):
+    # Amount of arrivals on each of the ticks [start, start + ticks)
+    @abstractmethod
+    def counts(self, start: int, ticks: int) -> np.ndarray:
+        pass
+
+# The uniforms of every process come from its source, so with common random
+# numbers the same uniforms are inverted whatever the rate
+class PoissonArrivals(ArrivalProcess):
+    def __init__(self, rate: float, source: Optional[Source] = None):
+        self._rate = rate
+        self._source = source
+
+    def counts(self, start: int, ticks: int) -> np.ndarray:
+        return poisson_counts(self._rate, generate(ticks, self._source))
+
+# Poisson arrivals whose rate changes with the tick, given as a function
+# of an array of ticks
+class TimeVaryingPoissonArrivals(ArrivalProcess):
+    def __init__(self, rate: Callable[[np.ndarray], np.ndarray], source: Optional[Source] = None):
+        self._rate = rate
+        self._source = source
+
+    def counts(self, start: int, ticks: int) -> np.ndarray:
+        rates = np.broadcast_to(self._rate(np.arange(start, start + ticks)), (ticks,))
+        uniforms = generate(ticks, self._source)
+        counts = np.zeros(ticks, dtype=int)
+        for rate in np.unique(rates):
+            ticks_with_rate = rates == rate
+            counts[ticks_with_rate] = poisson_counts(rate, uniforms[ticks_with_rate])
+        return counts
+
+# Arrivals in groups of platoon_size, with platoons arriving as a Poisson
+# process. The mean amount of arrivals per tick is still rate
+class PlatoonArrivals(ArrivalProcess):
+    def __init__(self, rate: float, platoon_size: int, source: Optional[Source] = None):
+        self._platoons = PoissonArrivals(rate / platoon_size, source)
+        self._platoon_size = platoon_size
+
+    def counts(self, start: int, ticks: int) -> np.ndarray:
+        return self._platoon_size * self._platoons.counts(start, ticks)
@@ -0,0 +1,78 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+import numpy as np
+
+from generator.tp_generator import poi, Source
+from .arrival_process import ArrivalProcess
+
+# Source of the amount of arrivals of every tick. Each tick a source either
+# reads its arrivals with next() or, if it can't take any, drops them with
+# skip()
+class ArrivalSchedule(ABC):
+    @abstractmethod
+    def next(self) -> int:
+        pass
+
+    @abstractmethod
+    def skip(self):
+        pass
+
+    # Next ticks, up to limit, whose arrivals are known without drawing
+    # random numbers
+    def known_ticks(self, limit: int) -> int:
+        return 0
+
+    # Next ticks, up to limit, known to have no arrivals
+    def idle_ticks(self, limit: int) -> int:
+        return 0
+
+# Draws a Poisson variate on every tick, as the simulator did before the
+# schedules were precomputed. It keeps the runs of old seeds reproducible
+class SampledSchedule(ArrivalSchedule):
+    def __init__(self, rate: float, source: Optional[Source] = None):
+        self._rate = rate
+        self._source = source
+
+    def next(self) -> int:
+        return poi(self._rate, self._source)
+
+    def skip(self):
+        pass
+
+# Arrivals of a process computed up front from tick start to the horizon, in
+# batches of batch_size ticks. If the simulation goes on after the horizon,
+# the schedule is extended one batch at a time
+class PrecomputedSchedule(ArrivalSchedule):
+    def __init__(self, process: ArrivalProcess, horizon: int, batch_size: int = 3600, start: int = 0):
+        self._process = process
+        self._batch_size = batch_size
+        self._start = start
+        self._tick = 0
+        batches = [process.counts(tick, min(batch_size, horizon - tick))
+                   for tick in range(start, horizon, batch_size)]
+        self._counts = np.concatenate(batches).tolist() if batches else []
+
+    def _extend(self):
+        batch = self._process.counts(self._start + len(self._counts), self._batch_size)
+        self._counts.extend(batch.tolist())
+
+    def next(self) -> int:
+        if self._tick == len(self._counts):
+            self._extend()
+        count = self._counts[self._tick]
+        self._tick += 1
+        return count
+
+    def skip(self):
+        self.next()
+
+    def known_ticks(self, limit: int) -> int:
+        return min(limit, len(self._counts) - self._tick)
+
+    def idle_ticks(self, limit: int) -> int:
+        ticks = 0
+        for count in self._counts[self._tick:self._tick + self.known_ticks(limit)]:
+            if count > 0:
+                break
+            ticks += 1
+        return ticks
@@ -1,6 +1,13 @@
-from typing import Tuple, List
+import os
+import dataclasses
+import pickle
+import zlib
+from typing import Tuple, List, Optional
 
 from grid.grid import Grid
+from grid.array_grid import ArrayGrid
+from grid.cell_filter import entity_index_keys
+from grid.scheduler import ShuffleScheduler, LegacyScheduler, FrontToBackScheduler
 from grid.relative_grid import RelativeGrid
 from rectangle import Rectangle
 from pedestrian.waiting_area import WaitingArea
@@ -9,23 +16,81 @@ from vehicle.turning_vehicle_lane import TurningVehicleLane
 from vehicle.straight_vehicle_lane import StraightVehicleLane
 from vehicle.vehicle_lane import VehicleLane
 from config import Config
-from plotter import Plotter
+from arrivals.arrival_process import PoissonArrivals, PlatoonArrivals
+from arrivals.arrival_schedule import ArrivalSchedule, SampledSchedule, PrecomputedSchedule
+from generator import tp_generator
+from generator.tp_generator import Source, PEDESTRIAN_ARRIVALS, VEHICLE_ARRIVALS, PEDESTRIAN_PLACEMENT
+from instrumentation import RunStats
+from frame_sink import DEFAULT_ANIMATION_FILE, DEFAULT_ANIMATION_FPS
+from terminal import TerminalRenderer, print_lines
+from trajectory import TrajectoryRecorder
+
+# Changed whenever a change to the simulation alters the outcome of seeded
+# runs, so results stored by older versions aren't reused
+ENGINE_VERSION = 2
+
+GRID_ENGINES = {
+    "list": Grid,
+    "numpy": ArrayGrid,
+}
+
+UPDATE_ORDERS = {
+    "shuffle": ShuffleScheduler,
+    "legacy": LegacyScheduler,
+    "front_to_back": FrontToBackScheduler,
+}
 
 class Automata:
-    def __init__(self, config: Config = None, animate: bool = False):
+    # With instrument, the time of every phase of a tick and the queries
+    # to the grid are counted, see stats. With animate, every tick is
+    # rendered to animation_file as it runs, see save_animation. With
+    # trajectory_file, the entities of every tick are recorded to it, see
+    # trajectory.Trajectory to read them back
+    def __init__(self, config: Config = None, animate: bool = False, instrument: bool = False,
+                 animation_file: Optional[str] = None, animation_fps: int = DEFAULT_ANIMATION_FPS,
+                 trajectory_file: Optional[str] = None):
         self._config = config or Config.new_from_env_file()
-        self._grid = Grid[RoadEntity](self._config.total_rows, self._config.total_cols)
+        self._light = self._config.new_stop_light()
+        # The random numbers of the run, a copy of the generator of the seed
+        # set last with tp_generator.set_seed. The run only draws from its
+        # copy, and only while it builds or runs, so other runs in the process
+        # built from the same seed don't change them
+        self._random = tp_generator.current_state().configured(self._config.rng_backend,
+                                                               self._config.rng_buffer_size,
+                                                               self._config.common_random_numbers)
+        if self._config.grid_engine not in GRID_ENGINES:
+            raise ValueError(f"Unknown grid engine {self._config.grid_engine}, expected one of {list(GRID_ENGINES)}")
+        if self._config.update_order not in UPDATE_ORDERS:
+            raise ValueError(f"Unknown update order {self._config.update_order}, expected one of {list(UPDATE_ORDERS)}")
+        grid_class = GRID_ENGINES[self._config.grid_engine]
+        scheduler = UPDATE_ORDERS[self._config.update_order]()
+        self._grid = grid_class[RoadEntity](self._config.total_rows,
+                                            self._config.total_cols,
+                                            scheduler,
+                                            entity_index_keys)
         self._crosswalk_zone = Rectangle(self._config.crosswalk_prot.rows, self._config.crosswalk_prot.cols)
         self._crosswalk_zone.move_down(self._config.vehicle_prot.rows)
         self._crosswalk_zone.move_right(self._config.waiting_area_prot.cols)
 
-        self.build_waiting_areas()
-        self.build_vehicle_lanes()
+        with tp_generator.using(self._random):
+            self.build_waiting_areas()
+            self.build_vehicle_lanes()
 
         self._epoch = 0
         self._conflicts = 0
-        self._plotter = Plotter(self._grid, self._config, animate)
+        # Ticks in a row that changed neither the grid nor the stop light,
+        # and the conflicts the entities ran into in the last tick
+        self._quiet_ticks = 0
+        self._idle_conflicts = 0
+        self._plotter = None
         self._animate = animate
+        self._animation_file = animation_file
+        self._animation_fps = animation_fps
+        self._stats = RunStats() if instrument else None
+        self._grid.instrument(self._stats)
+        if animate:
+            self._plotter = self.new_plotter()
+        self._recorder = TrajectoryRecorder(trajectory_file, self._config) if trajectory_file else None
 
     def build_waiting_areas(self):
         if self._config.waiting_area_prot.cols > 0:
@@ -39,8 +104,11 @@ class Automata:
         grid_area_east = RelativeGrid(walking_zone.lower_right, walking_zone, "West", self._grid)
 
         self._waiting_areas: List[WaitingArea] = []
-        waiting_area_west = WaitingArea(self._config.pedestrian_arrival_rate, grid_area_west)
-        waiting_area_east = WaitingArea(self._config.pedestrian_arrival_rate, grid_area_east)
+        rate = self._config.pedestrian_arrival_rate
+        waiting_area_west = WaitingArea(self.new_arrival_schedule(rate, source=(PEDESTRIAN_ARRIVALS, 0)), grid_area_west,
+                                        placement=(PEDESTRIAN_PLACEMENT, 0))
+        waiting_area_east = WaitingArea(self.new_arrival_schedule(rate, source=(PEDESTRIAN_ARRIVALS, 1)), grid_area_east,
+                                        placement=(PEDESTRIAN_PLACEMENT, 1))
 
         self._waiting_areas.append(waiting_area_west)
         self._waiting_areas.append(waiting_area_east)
@@ -62,28 +130,121 @@ class Automata:
                 origin = vehicle_lane_zone.lower_left
             
             grid = RelativeGrid(origin, vehicle_lane_zone, facing, self._grid)
+            arrivals = self.new_arrival_schedule(self._config.vehicle_arrival_rate, source=(VEHICLE_ARRIVALS, i))
             if i == 0 or i == vehicle_lanes_amount - 1:
-                vehicle_lane = TurningVehicleLane(self._config, grid)
+                vehicle_lane = TurningVehicleLane(self._config, grid, arrivals)
             else:
-                vehicle_lane = StraightVehicleLane(self._config, grid)
+                vehicle_lane = StraightVehicleLane(self._config, grid, arrivals)
             self._vehicle_lanes.append(vehicle_lane)
 
+    def new_arrival_schedule(self, rate: float, start: int = 0, source: Optional[Source] = None) -> ArrivalSchedule:
+        if self._config.arrivals == "sampled":
+            return SampledSchedule(rate, source)
+        elif self._config.arrivals == "poisson":
+            process = PoissonArrivals(rate, source)
+        elif self._config.arrivals == "platoon":
+            process = PlatoonArrivals(rate, self._config.platoon_size, source)
+        else:
+            raise ValueError(f"Unknown arrivals {self._config.arrivals}, expected sampled, poisson or platoon")
+        return PrecomputedSchedule(process, self._config.simulation_time, start=start)
+
+    # The plotter, and with it matplotlib and the sprites, is only loaded when
+    # something is rendered, so headless runs never pay for it
+    def new_plotter(self):
+        from plotter import Plotter
+        return Plotter(self._grid, self._config, self._animate, self._animation_file, self._animation_fps)
+
     def update(self):
-        self._config.pedestrian_stop_light.update()
+        with tp_generator.using(self._random):
+            self._update()
+
+    def _update(self):
+        light = self._light
+        light_state = light.state
+        changes = self._grid.changes
+        conflicts = self._conflicts
+
+        if self._stats is None:
+            for _, phase in self._phases():
+                phase()
+        else:
+            self._stats.run_tick(self._phases(), lambda: self._grid.entity_count)
+
+        # Only the move phase runs into conflicts
+        self._idle_conflicts = self._conflicts - conflicts
+        self._epoch += 1
+        if self._grid.changes == changes and light.state == light_state:
+            self._quiet_ticks += 1
+        else:
+            self._quiet_ticks = 0
+
+    # The phases of a tick, in the order they run, named as in
+    # instrumentation.PHASES
+    def _phases(self):
+        return (("light", self._light.update),
+                ("waiting_areas", self._update_waiting_areas),
+                ("think", self._think),
+                ("move", self._move),
+                ("lanes", self._update_vehicle_lanes),
+                ("plotter", self._add_frame))
+
+    def _update_waiting_areas(self):
         for waiting_area in self._waiting_areas:
             waiting_area.update()
 
-        self._grid.apply(lambda object, _: object.think(self._crosswalk_zone, self._config.pedestrian_stop_light))
-        
+    def _think(self):
+        self._grid.apply(lambda object, _: object.think(self._crosswalk_zone, self._light))
+
+    def _move(self):
         self._grid.apply(self.move_object)
 
+    def _update_vehicle_lanes(self):
         for vehicle_lane in self._vehicle_lanes:
             vehicle_lane.update()
-        
+
+    # The tick as it ended, for the animation and the trajectory. The epoch
+    # is only counted once the tick is over
+    def _add_frame(self):
         if self._animate:
             self._plotter.add_frame()
+        if self._recorder is not None:
+            self._recorder.record(self._epoch + 1, self._grid)
 
-        self._epoch += 1
+    # Ticks, up to limit, sure to change nothing but the stop light
+    # countdown, the arrival queues and the conflicts. After two ticks in a
+    # row that changed neither the grid nor the light, every entity keeps
+    # doing what it did in the last one, draws no random numbers and runs
+    # into the same conflicts, until an entity is placed or the light changes
+    def _idle_ticks(self, limit: int) -> int:
+        if self._quiet_ticks < 2:
+            return 0
+        ticks = min(limit, self._light.time_to_change - 1)
+        for source in self._waiting_areas + self._vehicle_lanes:
+            if ticks == 0:
+                break
+            ticks = source.idle_ticks(ticks)
+        return ticks
+
+    # Same outcome as ticks updates that are idle. The only random numbers
+    # drawn in them are the ones of the update order, and the arrivals are
+    # only read if they are already known, so skipping them all at once
+    # keeps every draw where it was
+    def _skip_idle(self, ticks: int):
+        self._light.advance(ticks)
+        for waiting_area in self._waiting_areas:
+            waiting_area.skip(ticks)
+        self._grid.skip_apply(2 * ticks)
+        for vehicle_lane in self._vehicle_lanes:
+            vehicle_lane.skip(ticks)
+        self._conflicts += ticks * self._idle_conflicts
+
+        if self._animate:
+            for _ in range(ticks):
+                self._plotter.add_frame()
+        if self._recorder is not None:
+            self._recorder.repeat(ticks)
+        self._epoch += ticks
+        self._quiet_ticks += ticks
 
     def move_object(self, entity: RoadEntity, _: Tuple[int, int]):
         conflict_happened = entity.move(self._crosswalk_zone)
@@ -91,19 +252,125 @@ class Automata:
             self._conflicts += 1
 
 
-    def show(self):
-        print(f"Epoch: {self._epoch}")
-        print(f"Conflicts: {self._conflicts}")
-        self._config.pedestrian_stop_light.show()
-        print("Waiting at East:", self._waiting_areas[0])
-        print("Waiting at West:", self._waiting_areas[1])
-        
-        self._plotter.plot()
+    # The state of the run and the grid around the crosswalk, drawn on
+    # renderer, which only writes what changed since its last frame, or
+    # printed whole
+    def show(self, renderer: Optional[TerminalRenderer] = None):
+        if self._plotter is None:
+            self._plotter = self.new_plotter()
+        lines = [[f"Epoch: {self._epoch}"],
+                 [f"Conflicts: {self._conflicts}"],
+                 [str(self._light)],
+                 [f"Waiting at East: {self._waiting_areas[0]}"],
+                 [f"Waiting at West: {self._waiting_areas[1]}"],
+                 *self._plotter.plot_lines()]
+        if renderer is not None:
+            renderer.draw(lines)
+        else:
+            print_lines(lines)
 
     def advance_to(self, epoch: int):
-        while self._epoch < epoch:
-            self.update()
+        with tp_generator.using(self._random):
+            while self._epoch < epoch:
+                idle_ticks = self._idle_ticks(epoch - self._epoch) if self._config.fast_forward else 0
+                if idle_ticks > 0 and self._stats is not None:
+                    self._stats.skip_ticks(idle_ticks, self._skip_idle, lambda: self._grid.entity_count)
+                elif idle_ticks > 0:
+                    self._skip_idle(idle_ticks)
+                else:
+                    self._update()
+
+    # Counters of the run so far as plain types, None unless the automata was
+    # built with instrument
+    def stats(self) -> Optional[dict]:
+        if self._stats is None:
+            return None
+        arrived_pedestrians = sum(area._total_generated_pedestrians for area in self._waiting_areas)
+        arrived_vehicles = sum(lane._total_generated_vehicles for lane in self._vehicle_lanes)
+        return {
+            "epoch": self._epoch,
+            "conflicts": self._conflicts,
+            **self._stats.to_dict(),
+            "entities": self._grid.entity_count,
+            "arrived_pedestrians": arrived_pedestrians,
+            "spawned_pedestrians": arrived_pedestrians - sum(area._waiting_pedestrians for area in self._waiting_areas),
+            "arrived_vehicles": arrived_vehicles,
+            "spawned_vehicles": arrived_vehicles - sum(lane._waiting_vehicles for lane in self._vehicle_lanes),
+        }
+
+    # The plotter holds matplotlib objects and the animation being written,
+    # it is built again on restore. A restored run animates to a file of its
+    # own, named after the epoch it goes on from, and records no trajectory
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_plotter"] = None
+        state["_recorder"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._animate:
+            root, extension = os.path.splitext(self._animation_file or DEFAULT_ANIMATION_FILE)
+            self._animation_file = f"{root}_{self._epoch}{extension}"
+            self._plotter = self.new_plotter()
+
+    # The whole state of the run, including the position of its random
+    # generator, pickled and compressed. A snapshot is only restored by the
+    # same ENGINE_VERSION
+    def snapshot(self) -> bytes:
+        return zlib.compress(pickle.dumps((ENGINE_VERSION, self), pickle.HIGHEST_PROTOCOL))
+
+    # The restored run draws from a copy of the generator of the run as it
+    # was, so it goes on as that run would have, and neither changes the
+    # numbers of the other or of any run in the process
+    @classmethod
+    def restore(cls, data: bytes) -> "Automata":
+        engine_version, automata = pickle.loads(zlib.decompress(data))
+        if engine_version != ENGINE_VERSION:
+            raise ValueError(f"Snapshot of engine version {engine_version}, expected {ENGINE_VERSION}")
+        return automata
+
+    # A copy of the run that goes on from its current state, leaving this
+    # one alone. With a seed the copy gets a generator of its own seeded
+    # with it, and the arrivals still to come are drawn anew, and so they
+    # are with new arrival rates
+    def fork(self,
+             seed: Optional[int] = None,
+             stream: Optional[int] = None,
+             pedestrian_arrival_rate: Optional[float] = None,
+             vehicle_arrival_rate: Optional[float] = None) -> "Automata":
+        forked = Automata.restore(self.snapshot())
+        if seed is not None:
+            forked._random = forked._random.reseeded(seed, stream)
+        if pedestrian_arrival_rate is not None:
+            forked._config = dataclasses.replace(forked._config, pedestrian_arrival_rate=pedestrian_arrival_rate)
+        if vehicle_arrival_rate is not None:
+            forked._config = dataclasses.replace(forked._config, vehicle_arrival_rate=vehicle_arrival_rate)
+
+        if seed is not None or pedestrian_arrival_rate is not None or vehicle_arrival_rate is not None:
+            with tp_generator.using(forked._random):
+                forked._draw_arrivals()
+        return forked
+
+    def _draw_arrivals(self):
+        for i, waiting_area in enumerate(self._waiting_areas):
+            waiting_area._arrivals = self.new_arrival_schedule(self._config.pedestrian_arrival_rate, self._epoch,
+                                                               (PEDESTRIAN_ARRIVALS, i))
+        for i, vehicle_lane in enumerate(self._vehicle_lanes):
+            vehicle_lane._arrivals = self.new_arrival_schedule(self._config.vehicle_arrival_rate, self._epoch,
+                                                               (VEHICLE_ARRIVALS, i))
+
+    # Finishes the animation written so far and returns its path, moved to
+    # filename if given
+    def save_animation(self, filename: Optional[str] = None) -> str:
+        assert self._animate, "Cannot save an animation if animation is disabled"
+        return self._plotter.save(filename)
+
+    # Writes what is left of the trajectory, which can be read while the
+    # run goes on up to the last chunk written
+    def close_trajectory(self):
+        if self._recorder is not None:
+            self._recorder.close(conflicts=self._conflicts)
 
     def save_mp4(self, filename: str):
-        assert self._animate, "Cannot save mp4 if animation is disabled"
-        self._plotter.save_mp4(filename)
+        self.save_animation(filename)
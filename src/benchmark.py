@@ -0,0 +1,298 @@
+import os
+import dataclasses
+import sys
+import json
+import time
+import platform
+from typing import Callable, Dict, List, Optional, Tuple
+
+from automata import Automata
+from config import Config
+from grid.grid import Grid
+from grid.relative_grid import RelativeGrid
+from grid.cell_filter import entity_index_keys
+from generator.bbs import BlumBlumShub
+from generator import tp_generator
+from generator.tp_generator import set_seed
+from pedestrian.pedestrian import Pedestrian
+from rectangle import Rectangle
+from relative_position import forward, still
+from run_scenario import (PEDESTRIAN_ARRIVAL_RATES, VEHICLE_ARRIVAL_RATES, SEED, N_PROCESSES,
+                          run_sweep)
+
+# Suites to run, out of micro, macro and parallel
+BENCHMARK_SUITES = os.environ.get("BENCHMARK_SUITES", "micro,macro,parallel").split(",")
+BENCHMARK_FILE = os.environ.get("BENCHMARK_FILE", "results/benchmark.json")
+# Results of an earlier run to compare with. A throughput more than
+# BENCHMARK_TOLERANCE below the one of the baseline is a regression
+BENCHMARK_BASELINE = os.environ.get("BENCHMARK_BASELINE", "benchmarks/baseline.json")
+BENCHMARK_TOLERANCE = float(os.environ.get("BENCHMARK_TOLERANCE", 0.15))
+# Micro benchmarks keep the best of their rounds, the least disturbed by
+# the rest of the machine
+BENCHMARK_ROUNDS = int(os.environ.get("BENCHMARK_ROUNDS", 5))
+BENCHMARK_TICKS = int(os.environ.get("BENCHMARK_TICKS", 3600))
+BENCHMARK_MACRO_ROUNDS = int(os.environ.get("BENCHMARK_MACRO_ROUNDS", 3))
+# The parallel sweep is run with 1 to BENCHMARK_PROCESSES processes
+BENCHMARK_PROCESSES = int(os.environ.get("BENCHMARK_PROCESSES", N_PROCESSES or os.cpu_count() or 1))
+BENCHMARK_PARALLEL_TICKS = int(os.environ.get("BENCHMARK_PARALLEL_TICKS", 600))
+
+# Geometries of make scenario_1 and make scenario_2
+SCENARIOS = {
+    "scenario_1": {"GREEN_LIGHT_TIME": "50", "CROSSWALK_ROWS": "6"},
+    "scenario_2": {"GREEN_LIGHT_TIME": "35", "CROSSWALK_ROWS": "10"},
+}
+
+# Corners of the sweep of run_scenario, as (pedestrian, vehicle) arrival rates
+CORNERS = {
+    "low_low": (PEDESTRIAN_ARRIVAL_RATES[0], VEHICLE_ARRIVAL_RATES[0]),
+    "low_high": (PEDESTRIAN_ARRIVAL_RATES[0], VEHICLE_ARRIVAL_RATES[-1]),
+    "high_low": (PEDESTRIAN_ARRIVAL_RATES[-1], VEHICLE_ARRIVAL_RATES[0]),
+    "high_high": (PEDESTRIAN_ARRIVAL_RATES[-1], VEHICLE_ARRIVAL_RATES[-1]),
+}
+
+# The rest of the settings still come from the environment, so the engines
+# and backends can be benchmarked as GRID_ENGINE=numpy make benchmark
+def scenario_config(scenario: str, pedestrian_arrival_rate: float, vehicle_arrival_rate: float) -> Config:
+    saved = {name: os.environ.get(name) for name in SCENARIOS[scenario]}
+    os.environ.update(SCENARIOS[scenario])
+    try:
+        config = Config.new_from_env_file()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+    return dataclasses.replace(config,
+                               pedestrian_arrival_rate=pedestrian_arrival_rate,
+                               vehicle_arrival_rate=vehicle_arrival_rate)
+
+# Micro benchmarks time a single operation. Each one does a round of it and
+# returns how many times the operation was done and the seconds those took,
+# leaving its setup out
+
+Round = Callable[[], Tuple[int, float]]
+
+# Snapshots of scenario 1 at the busiest corner of the sweep, shared by the
+# benchmarks of the entities and the grid. Halfway through a green light
+# the crosswalk is full of pedestrians, and early in the red one the
+# vehicles are driving through it
+GREEN_EPOCH = 660
+RED_EPOCH = 603
+_warm: Dict[int, bytes] = {}
+
+def warm_snapshot(epoch: int) -> bytes:
+    if epoch not in _warm:
+        set_seed(SEED)
+        automata = Automata(scenario_config("scenario_1", *CORNERS["high_high"]))
+        automata.advance_to(epoch)
+        _warm[epoch] = automata.snapshot()
+    return _warm[epoch]
+
+def _grid_queries(f: Optional[Callable]) -> Round:
+    def run() -> Tuple[int, float]:
+        grid = Automata.restore(warm_snapshot(GREEN_EPOCH))._grid
+        cells = [(row, col) for row in range(grid.rows) for col in range(grid.cols)]
+        start = time.perf_counter()
+        for row, col in cells:
+            grid.calc_dist_to_next(row, col, f, 10)
+            grid.calc_dist_to_prev(row, col, f, 10)
+            grid.calc_dist_to_vertically_next(row, col, f, 10)
+            grid.calc_dist_to_vertically_prev(row, col, f, 10)
+        return 4 * len(cells), time.perf_counter() - start
+    return run
+
+# A pedestrian walked across every row of an empty grid, one cell at a
+# time, passes times
+def relative_grid_move(passes: int = 20) -> Tuple[int, float]:
+    config = scenario_config("scenario_1", 0, 0)
+    grid = Grid(config.total_rows, config.total_cols, index_keys=entity_index_keys)
+    bounds = Rectangle(config.total_rows, config.total_cols)
+    moves = 0
+    seconds = 0.0
+    for _ in range(passes):
+        for row in range(grid.rows):
+            rel_grid = RelativeGrid((row, 0), bounds, "East", grid)
+            rel_grid.fill(still(), Pedestrian(rel_grid.new_displaced(still())))
+            start = time.perf_counter()
+            for _ in range(grid.cols - 1):
+                rel_grid.move(forward(1))
+            seconds += time.perf_counter() - start
+            moves += grid.cols - 1
+            rel_grid.clear()
+    return moves, seconds
+
+def bbs_next() -> Tuple[int, float]:
+    generator = BlumBlumShub(SEED)
+    draws = 100000
+    start = time.perf_counter()
+    for _ in range(draws):
+        next(generator)
+    return draws, time.perf_counter() - start
+
+def poi() -> Tuple[int, float]:
+    generator = BlumBlumShub(SEED)
+    rate = float(CORNERS["high_high"][0])
+    draws = 20000
+    start = time.perf_counter()
+    for _ in range(draws):
+        generator.poi(rate)
+    return draws, time.perf_counter() - start
+
+# The entities of the warm snapshot, restored again for every pass since
+# thinking and moving change them
+def _entity_pass(vehicles: bool, think_only: bool, epoch: int) -> Round:
+    def run() -> Tuple[int, float]:
+        operations = 0
+        seconds = 0.0
+        for _ in range(50):
+            automata = Automata.restore(warm_snapshot(epoch))
+            light = automata._light
+            entities = [entity for _, entity in automata._grid.entities() if entity.is_vehicle() == vehicles]
+            # Entities draw from the generator of the restored run
+            with tp_generator.using(automata._random):
+                start = time.perf_counter()
+                for entity in entities:
+                    entity.think(automata._crosswalk_zone, light)
+                if think_only:
+                    seconds += time.perf_counter() - start
+                else:
+                    start = time.perf_counter()
+                    for entity in entities:
+                        entity.move(automata._crosswalk_zone)
+                    seconds += time.perf_counter() - start
+            operations += len(entities)
+        return operations, seconds
+    return run
+
+MICRO_BENCHMARKS: Dict[str, Round] = {
+    "grid_calc_dist_indexed": _grid_queries(None),
+    "grid_calc_dist_scanned": _grid_queries(lambda entity: entity.is_vehicle()),
+    "relative_grid_move": relative_grid_move,
+    "bbs_next": bbs_next,
+    "poi": poi,
+    "vehicle_move": _entity_pass(vehicles=True, think_only=False, epoch=RED_EPOCH),
+    "pedestrian_think": _entity_pass(vehicles=False, think_only=True, epoch=GREEN_EPOCH),
+}
+
+def run_micro(rounds: int = BENCHMARK_ROUNDS) -> Dict[str, dict]:
+    results = {}
+    for name, run in MICRO_BENCHMARKS.items():
+        best = 0.0
+        for _ in range(rounds):
+            operations, seconds = run()
+            best = max(best, operations / seconds)
+        results[name] = {"ops_per_sec": best}
+        print(f"{name}: {best:,.0f} ops/s", flush=True)
+    return results
+
+# Runs at every corner of the sweep of both scenarios, keeping the fastest
+# of rounds runs of each. The conflicts are kept as well, a change in them
+# means the outcome changed and not only the speed
+def run_macro(ticks: int = BENCHMARK_TICKS, rounds: int = BENCHMARK_MACRO_ROUNDS) -> Dict[str, dict]:
+    results = {}
+    for scenario in SCENARIOS:
+        for stream, (corner, (pedestrian_arrival_rate, vehicle_arrival_rate)) in enumerate(CORNERS.items()):
+            seconds = float("inf")
+            for _ in range(rounds):
+                config = dataclasses.replace(scenario_config(scenario, pedestrian_arrival_rate, vehicle_arrival_rate),
+                                             simulation_time=ticks)
+                set_seed(SEED, stream)
+                start = time.perf_counter()
+                automata = Automata(config)
+                automata.advance_to(ticks)
+                seconds = min(seconds, time.perf_counter() - start)
+            name = f"{scenario}_{corner}"
+            results[name] = {"ticks_per_sec": ticks / seconds, "seconds": seconds, "conflicts": automata._conflicts}
+            print(f"{name}: {ticks / seconds:,.0f} ticks/s, {automata._conflicts} conflicts", flush=True)
+    return results
+
+# The corners of scenario 1 swept with 1 to processes processes, with as
+# many runs of each as processes so every process has work
+def run_parallel(processes: int = BENCHMARK_PROCESSES, ticks: int = BENCHMARK_PARALLEL_TICKS) -> Dict[str, dict]:
+    configs = [dataclasses.replace(scenario_config("scenario_1", *rates), simulation_time=ticks)
+               for rates in CORNERS.values()]
+    results = {}
+    single = None
+    for n in range(1, processes + 1):
+        start = time.perf_counter()
+        for _ in run_sweep(configs, runs=processes, processes=n):
+            pass
+        seconds = time.perf_counter() - start
+        single = single or seconds
+        efficiency = single / (n * seconds)
+        results[str(n)] = {"seconds": seconds, "speedup": single / seconds, "efficiency": efficiency}
+        print(f"{n} processes: {seconds:.2f} s, speedup {single / seconds:.2f}, efficiency {efficiency:.0%}", flush=True)
+    return results
+
+SUITES = {
+    "micro": run_micro,
+    "macro": run_macro,
+    "parallel": run_parallel,
+}
+
+# Throughputs compared with the baseline, higher is better in all of them
+METRICS = {
+    "micro": "ops_per_sec",
+    "macro": "ticks_per_sec",
+    "parallel": "efficiency",
+}
+
+def run_benchmarks(suites: List[str] = BENCHMARK_SUITES) -> dict:
+    unknown = [suite for suite in suites if suite not in SUITES]
+    if unknown:
+        raise ValueError(f"Unknown benchmark suites {unknown}, expected some of {list(SUITES)}")
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "engine": {"grid_engine": os.environ.get("GRID_ENGINE"), "rng_backend": os.environ.get("RNG_BACKEND")},
+    }
+    for suite in suites:
+        print(f"Running {suite} benchmarks", flush=True)
+        results[suite] = SUITES[suite]()
+    return results
+
+# Lines of the comparison and whether any benchmark regressed. Changed
+# conflicts are reported too, but only the throughputs can regress
+def compare(results: dict, baseline: dict, tolerance: float = BENCHMARK_TOLERANCE) -> Tuple[List[str], bool]:
+    lines = []
+    regressed = False
+    for suite, metric in METRICS.items():
+        for name, current in results.get(suite, {}).items():
+            previous = baseline.get(suite, {}).get(name)
+            if previous is None:
+                continue
+            ratio = current[metric] / previous[metric]
+            status = ""
+            if ratio < 1 - tolerance:
+                status = "REGRESSION"
+                regressed = True
+            if "conflicts" in current and current["conflicts"] != previous["conflicts"]:
+                status = f"{status} conflicts {previous['conflicts']} -> {current['conflicts']}".strip()
+            lines.append(f"{suite}/{name}: {previous[metric]:,.2f} -> {current[metric]:,.2f} {metric} "
+                         f"({ratio - 1:+.1%}) {status}".rstrip())
+    return lines, regressed
+
+def main():
+    results = run_benchmarks()
+    os.makedirs(os.path.dirname(BENCHMARK_FILE) or ".", exist_ok=True)
+    with open(BENCHMARK_FILE, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved in {BENCHMARK_FILE}")
+
+    if os.path.abspath(BENCHMARK_FILE) == os.path.abspath(BENCHMARK_BASELINE) or not os.path.exists(BENCHMARK_BASELINE):
+        return
+    with open(BENCHMARK_BASELINE) as f:
+        baseline = json.load(f)
+    if (baseline.get("machine"), baseline.get("cpus")) != (results["machine"], results["cpus"]):
+        print(f"The baseline comes from another machine ({baseline.get('machine')}, {baseline.get('cpus')} cpus)")
+    lines, regressed = compare(results, baseline)
+    print(f"Compared with {BENCHMARK_BASELINE} (tolerance {BENCHMARK_TOLERANCE:.0%}):")
+    for line in lines:
+        print(line)
+    sys.exit(1 if regressed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
+import hashlib
+import json
 import os
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from typing import Dict, Any, Mapping, Optional, Tuple
 from dotenv import load_dotenv
 
 from rectangle import Rectangle
-from stoplight import StopLight
+from stoplight import StopLight, StopLightState
 
 DEFAULT_CROSSWALK_ROWS = 6
 DEFAULT_CROSSWALK_COLS = 42
@@ -14,79 +19,237 @@ DEFAULT_STOP_LIGHT_CYCLE = 90
 DEFAULT_GREEN_LIGHT_TIME = 50
 DEFAULT_PEDESTRIAN_ARRIVAL_RATE = 500/3600
 DEFAULT_VEHICLE_ARRIVAL_RATE =  1400/(6*3600)
+# "list" keeps the cells in a list of lists of objects, "numpy" in typed
+# arrays, which is slower for the queries the simulation makes
+DEFAULT_GRID_ENGINE = "list"
+# "shuffle" visits the entities in a uniformly random order, "legacy" in the
+# order the simulator used before, which keeps old seeds reproducible, and
+# "front_to_back" from the first to the last entity of every lane
+DEFAULT_UPDATE_ORDER = "shuffle"
+# Random number generator backend ("bbs", "pcg64" or "philox"). With a
+# buffer size greater than 0 the numbers are drawn in blocks of that size
+DEFAULT_RNG_BACKEND = "bbs"
+DEFAULT_RNG_BUFFER_SIZE = 0
+# "poisson" and "platoon" compute the arrivals of the whole simulation up
+# front, "sampled" draws them on every tick as the simulator used to
+DEFAULT_ARRIVALS = "poisson"
+DEFAULT_PLATOON_SIZE = 3
+# With common random numbers the arrivals of every waiting area and lane,
+# the pedestrian velocities and the update order draw from streams of their
+# own, so runs of different configs with the same seed share them
+DEFAULT_COMMON_RANDOM_NUMBERS = False
+DEFAULT_SIMULATION_TIME = 3600
+# Jump over the ticks in which nothing but the stop light countdown can
+# change, with the same outcome as running them
+DEFAULT_FAST_FORWARD = True
 
+# The .env file is only read once per process. Settings already in the
+# environment take precedence over it, so reading it again changes nothing
+@lru_cache(maxsize=None)
+def _load_env_file():
+    load_dotenv()
+
+# Sizes are (rows, cols). A config is a value: it is frozen, equal to and
+# hashed as any config with the same settings, and pickled as the tuple of
+# them. Runs build what they change from it, such as their own stop light
+# with new_stop_light, so a config can be shared by every run of a sweep.
+# Use dataclasses.replace for a config with other settings
+@dataclass(frozen=True, slots=True)
 class Config:
+    crosswalk_size: Tuple[int, int]
+    vehicle_lane_size: Tuple[int, int]
+    waiting_area_size: Tuple[int, int]
+    vehicle_size: Tuple[int, int]
+    stop_light_cycle: int
+    green_light_time: int
+    pedestrian_arrival_rate: float
+    vehicle_arrival_rate: float
+    grid_engine: str = DEFAULT_GRID_ENGINE
+    update_order: str = DEFAULT_UPDATE_ORDER
+    rng_backend: str = DEFAULT_RNG_BACKEND
+    rng_buffer_size: int = DEFAULT_RNG_BUFFER_SIZE
+    arrivals: str = DEFAULT_ARRIVALS
+    platoon_size: int = DEFAULT_PLATOON_SIZE
+    simulation_time: int = DEFAULT_SIMULATION_TIME
+    common_random_numbers: bool = DEFAULT_COMMON_RANDOM_NUMBERS
+    fast_forward: bool = DEFAULT_FAST_FORWARD
+    # Where the stop light of a run starts, green with the whole green light
+    # time ahead unless the config comes from a run that was under way
+    stop_light_state: StopLightState = "green"
+    stop_light_time_to_change: Optional[int] = None
+    _digest: str = field(init=False, repr=False, compare=False)
+
     @classmethod
     def new_from_env_file(cls) -> "Config":
-        load_dotenv()
-
-        crosswalk_rows = int(os.environ.get("CROSSWALK_ROWS", DEFAULT_CROSSWALK_ROWS))
-        crosswalk_cols = int(os.environ.get("CROSSWALK_COLS", DEFAULT_CROSSWALK_COLS))
-        waiting_area_cols = int(os.environ.get("WAITING_AREA_COLS", DEFAULT_WAITING_AREA_COLS))
-        vehicle_lanes = int(os.environ.get("VEHICLE_LANES", DEFAULT_VEHICLE_LANES))
-        vehicle_rows = int(os.environ.get("VEHICLE_ROWS", DEFAULT_VEHICLE_ROWS))
-        vehicle_cols = int(os.environ.get("VEHICLE_COLS", DEFAULT_VEHICLE_COLS))
-        stop_light_cycle = int(os.environ.get("STOP_LIGHT_CYCLE", DEFAULT_STOP_LIGHT_CYCLE))
-        green_light_time = int(os.environ.get("GREEN_LIGHT_TIME", DEFAULT_GREEN_LIGHT_TIME))
-        pedestrian_stop_light = StopLight(stop_light_cycle, green_light_time, "green")
-        pedestrian_arrival_rate = float(os.environ.get("PEDESTRIAN_ARRIVAL_RATE", DEFAULT_PEDESTRIAN_ARRIVAL_RATE))
-        vehicle_arrival_rate = float(os.environ.get("VEHICLE_ARRIVAL_RATE", DEFAULT_VEHICLE_ARRIVAL_RATE))
+        _load_env_file()
+        return cls.from_settings(os.environ)
+
+    # The config of settings named as the environment variables, with the
+    # defaults for the ones missing
+    @classmethod
+    def from_settings(cls, settings: Mapping[str, str]) -> "Config":
+        crosswalk_rows = int(settings.get("CROSSWALK_ROWS", DEFAULT_CROSSWALK_ROWS))
+        crosswalk_cols = int(settings.get("CROSSWALK_COLS", DEFAULT_CROSSWALK_COLS))
+        waiting_area_cols = int(settings.get("WAITING_AREA_COLS", DEFAULT_WAITING_AREA_COLS))
+        vehicle_lanes = int(settings.get("VEHICLE_LANES", DEFAULT_VEHICLE_LANES))
+        vehicle_rows = int(settings.get("VEHICLE_ROWS", DEFAULT_VEHICLE_ROWS))
+        vehicle_cols = int(settings.get("VEHICLE_COLS", DEFAULT_VEHICLE_COLS))
+        stop_light_cycle = int(settings.get("STOP_LIGHT_CYCLE", DEFAULT_STOP_LIGHT_CYCLE))
+        green_light_time = int(settings.get("GREEN_LIGHT_TIME", DEFAULT_GREEN_LIGHT_TIME))
+        pedestrian_arrival_rate = float(settings.get("PEDESTRIAN_ARRIVAL_RATE", DEFAULT_PEDESTRIAN_ARRIVAL_RATE))
+        vehicle_arrival_rate = float(settings.get("VEHICLE_ARRIVAL_RATE", DEFAULT_VEHICLE_ARRIVAL_RATE))
+        grid_engine = settings.get("GRID_ENGINE", DEFAULT_GRID_ENGINE)
+        update_order = settings.get("UPDATE_ORDER", DEFAULT_UPDATE_ORDER)
+        rng_backend = settings.get("RNG_BACKEND", DEFAULT_RNG_BACKEND)
+        rng_buffer_size = int(settings.get("RNG_BUFFER_SIZE", DEFAULT_RNG_BUFFER_SIZE))
+        arrivals = settings.get("ARRIVALS", DEFAULT_ARRIVALS)
+        platoon_size = int(settings.get("PLATOON_SIZE", DEFAULT_PLATOON_SIZE))
+        simulation_time = int(settings.get("SIMULATION_TIME", DEFAULT_SIMULATION_TIME))
+        common_random_numbers = settings.get("COMMON_RANDOM_NUMBERS", str(int(DEFAULT_COMMON_RANDOM_NUMBERS))) == "1"
+        fast_forward = settings.get("FAST_FORWARD", str(int(DEFAULT_FAST_FORWARD))) == "1"
 
         vehicle_lane_cols = crosswalk_cols // vehicle_lanes
-        crosswalk_prototype = Rectangle(crosswalk_rows, crosswalk_cols)
-        vehicle_lane_prototype = Rectangle(2*vehicle_rows+crosswalk_prototype.rows, vehicle_lane_cols)
-        waiting_area_prototype = Rectangle(crosswalk_rows, waiting_area_cols)
-        vehicle_prototype = Rectangle(vehicle_rows, vehicle_cols)
-
-        return cls(crosswalk_prototype,
-                   vehicle_lane_prototype, 
-                   waiting_area_prototype, 
-                   vehicle_prototype, 
-                   pedestrian_stop_light,
-                   pedestrian_arrival_rate, 
-                   vehicle_arrival_rate)
-
-    def __init__(self,
-                 crosswalk_prot: Rectangle,
-                 vehicle_lane_prot: Rectangle,
-                 waiting_area_prot: Rectangle,
-                 vehicle_prot: Rectangle,
-                 pedestrian_stop_light: StopLight,
-                 pedestrian_arrival_rate: float,
-                 vehicle_arrival_rate: float):
-        self.crosswalk_prot = crosswalk_prot
-        self.vehicle_lane_prot = vehicle_lane_prot
-        self.waiting_area_prot = waiting_area_prot
-        self.vehicle_prot = vehicle_prot
-        self.pedestrian_stop_light = pedestrian_stop_light
-        self.pedestrian_arrival_rate = pedestrian_arrival_rate
-        self.vehicle_arrival_rate = vehicle_arrival_rate
+
+        return cls((crosswalk_rows, crosswalk_cols),
+                   (2*vehicle_rows + crosswalk_rows, vehicle_lane_cols),
+                   (crosswalk_rows, waiting_area_cols),
+                   (vehicle_rows, vehicle_cols),
+                   stop_light_cycle,
+                   green_light_time,
+                   pedestrian_arrival_rate,
+                   vehicle_arrival_rate,
+                   grid_engine,
+                   update_order,
+                   rng_backend,
+                   rng_buffer_size,
+                   arrivals,
+                   platoon_size,
+                   simulation_time,
+                   common_random_numbers,
+                   fast_forward)
+
+    # Settings of other numeric types, such as the numpy floats of the sweep,
+    # are stored as plain ones, so equal configs pickle and hash the same
+    def __post_init__(self):
+        # Checked here rather than by the stop light, as sweeps build configs
+        # from settings of their own
+        if not 0 < self.green_light_time < self.stop_light_cycle:
+            raise ValueError(f"The green light time, {self.green_light_time}, has to be shorter than "
+                             f"the stop light cycle, {self.stop_light_cycle}")
+        for name in ("crosswalk_size", "vehicle_lane_size", "waiting_area_size", "vehicle_size"):
+            object.__setattr__(self, name, tuple(int(n) for n in getattr(self, name)))
+        object.__setattr__(self, "pedestrian_arrival_rate", float(self.pedestrian_arrival_rate))
+        object.__setattr__(self, "vehicle_arrival_rate", float(self.vehicle_arrival_rate))
+        if self.stop_light_time_to_change is None:
+            light = StopLight(self.stop_light_cycle, self.green_light_time, self.stop_light_state)
+            object.__setattr__(self, "stop_light_time_to_change", light.time_to_change)
+        content = json.dumps(self.to_dict(), sort_keys=True)
+        object.__setattr__(self, "_digest", hashlib.sha256(content.encode()).hexdigest())
+
+    # The stop light of a run, which changes as it runs
+    def new_stop_light(self) -> StopLight:
+        light = StopLight(self.stop_light_cycle, self.green_light_time, self.stop_light_state)
+        light._time_to_change = self.stop_light_time_to_change
+        return light
+
+    # Hash of to_dict, the same in every process and version of Python, so
+    # it can name files and key caches
+    @property
+    def digest(self) -> str:
+        return self._digest
+
+    def __hash__(self) -> int:
+        return int(self._digest[:16], 16)
+
+    def __reduce__(self):
+        return (type(self), tuple(getattr(self, f.name) for f in fields(self) if f.init))
+
+    @property
+    def crosswalk_prot(self) -> Rectangle:
+        return Rectangle(*self.crosswalk_size)
+
+    @property
+    def vehicle_lane_prot(self) -> Rectangle:
+        return Rectangle(*self.vehicle_lane_size)
+
+    @property
+    def waiting_area_prot(self) -> Rectangle:
+        return Rectangle(*self.waiting_area_size)
+
+    @property
+    def vehicle_prot(self) -> Rectangle:
+        return Rectangle(*self.vehicle_size)
 
     @property
     def total_cols(self) -> int:
-        return self.crosswalk_prot.cols + 2*self.waiting_area_prot.cols
+        return self.crosswalk_size[1] + 2*self.waiting_area_size[1]
     
     @property
     def total_rows(self) -> int:
-        return self.vehicle_lane_prot.rows
+        return self.vehicle_lane_size[0]
 
     @property
     def walking_zone_prot(self) -> Rectangle:
-        return Rectangle(self.crosswalk_prot.rows, self.total_cols)
+        return Rectangle(self.crosswalk_size[0], self.total_cols)
     
     def show(self):
-        print(f"Crosswalk rows: {self.crosswalk_prot.rows}")
-        print(f"Crosswalk cols: {self.crosswalk_prot.cols}")
-        print(f"Stop light cycle: {self.pedestrian_stop_light._cycle}")
-        print(f"Green light time: {self.pedestrian_stop_light._green_light_time}")
+        print(f"Crosswalk rows: {self.crosswalk_size[0]}")
+        print(f"Crosswalk cols: {self.crosswalk_size[1]}")
+        print(f"Stop light cycle: {self.stop_light_cycle}")
+        print(f"Green light time: {self.green_light_time}")
         print(f"Pedestrian arrival rate: {self.pedestrian_arrival_rate}")
         print(f"Vehicle arrival rate: {self.vehicle_arrival_rate}")
+        print(f"Grid engine: {self.grid_engine}")
+        print(f"Update order: {self.update_order}")
+        print(f"Random generator: {self.rng_backend} (buffer size {self.rng_buffer_size})")
+        print(f"Arrivals: {self.arrivals}")
+        print(f"Common random numbers: {self.common_random_numbers}")
+        print(f"Fast forward: {self.fast_forward}")
 
-    def duplicate(self):
-        return Config(self.crosswalk_prot,
-                      self.vehicle_lane_prot,
-                      self.waiting_area_prot,
-                      self.vehicle_prot,
-                      self.pedestrian_stop_light,
-                      self.pedestrian_arrival_rate,
-                      self.vehicle_arrival_rate)
\ No newline at end of file
+    # Every setting that can change the outcome of a run, in plain types.
+    # Fast forwarding doesn't
+    def to_dict(self) -> Dict[str, Any]:
+        settings = {
+            "crosswalk": list(self.crosswalk_size),
+            "vehicle_lane": list(self.vehicle_lane_size),
+            "waiting_area": list(self.waiting_area_size),
+            "vehicle": list(self.vehicle_size),
+            "stop_light": [self.stop_light_cycle, self.green_light_time, self.stop_light_state,
+                           self.stop_light_time_to_change],
+            "pedestrian_arrival_rate": self.pedestrian_arrival_rate,
+            "vehicle_arrival_rate": self.vehicle_arrival_rate,
+            "grid_engine": self.grid_engine,
+            "update_order": self.update_order,
+            "rng_backend": self.rng_backend,
+            "rng_buffer_size": self.rng_buffer_size,
+            "arrivals": self.arrivals,
+            "platoon_size": self.platoon_size,
+            "simulation_time": self.simulation_time,
+        }
+        # Only when on, so runs stored before the setting existed keep their keys
+        if self.common_random_numbers:
+            settings["common_random_numbers"] = True
+        return settings
+
+    # The config that to_dict was made from, with the stop light where it was
+    @classmethod
+    def from_dict(cls, settings: Dict[str, Any]) -> "Config":
+        cycle, green_light_time, state, time_to_change = settings["stop_light"]
+        return cls(tuple(settings["crosswalk"]),
+                   tuple(settings["vehicle_lane"]),
+                   tuple(settings["waiting_area"]),
+                   tuple(settings["vehicle"]),
+                   cycle,
+                   green_light_time,
+                   settings["pedestrian_arrival_rate"],
+                   settings["vehicle_arrival_rate"],
+                   settings["grid_engine"],
+                   settings["update_order"],
+                   settings["rng_backend"],
+                   settings["rng_buffer_size"],
+                   settings["arrivals"],
+                   settings["platoon_size"],
+                   settings["simulation_time"],
+                   settings.get("common_random_numbers", False),
+                   stop_light_state=state,
+                   stop_light_time_to_change=time_to_change)
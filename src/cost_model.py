@@ -0,0 +1,64 @@
+import json
+import os
+from typing import List, Dict
+
+import numpy as np
+
+from config import Config
+
+# Past runtimes kept to fit the model, the oldest are dropped past the limit
+DEFAULT_RUNTIMES_FILE = "results/runtimes.json"
+MAX_RECORDS = 5000
+# Records needed before the fitted weights replace the default ones
+MIN_RECORDS_TO_FIT = 8
+
+def _features(pedestrian_arrival_rate: float, vehicle_arrival_rate: float, vehicle_lanes: int) -> List[float]:
+    return [1.0, pedestrian_arrival_rate, vehicle_lanes * vehicle_arrival_rate]
+
+def _vehicle_lanes(config: Config) -> int:
+    return config.crosswalk_prot.cols // config.vehicle_lane_prot.cols
+
+# Estimates the time a run of a config takes, as a linear function of the
+# arrivals per tick times the ticks simulated. The weights are fitted to
+# the runtimes of past runs, and until there are enough of those every
+# arrival is taken to cost as much as an empty tick
+class CostModel:
+    def __init__(self, records: List[Dict[str, float]] = None):
+        self._records = records or []
+        self._weights = np.ones(3)
+        self._fit()
+
+    @classmethod
+    def load(cls, file_name: str = DEFAULT_RUNTIMES_FILE) -> "CostModel":
+        if not os.path.exists(file_name):
+            return cls()
+        with open(file_name) as f:
+            return cls(json.load(f))
+
+    def save(self, file_name: str = DEFAULT_RUNTIMES_FILE):
+        with open(file_name, "w") as f:
+            json.dump(self._records[-MAX_RECORDS:], f)
+
+    def _fit(self):
+        if len(self._records) < MIN_RECORDS_TO_FIT:
+            return
+        x = np.array([_features(r["pedestrian_arrival_rate"], r["vehicle_arrival_rate"], r["vehicle_lanes"])
+                      for r in self._records])
+        y = np.array([r["seconds"] / r["simulation_time"] for r in self._records])
+        weights, *_ = np.linalg.lstsq(x, y, rcond=None)
+        # Negative weights only come from noise, and would put the busiest
+        # configs last
+        self._weights = np.maximum(weights, 0) + 1e-9
+
+    def predict(self, config: Config) -> float:
+        x = _features(config.pedestrian_arrival_rate, config.vehicle_arrival_rate, _vehicle_lanes(config))
+        return config.simulation_time * float(np.dot(self._weights, x))
+
+    def record(self, config: Config, seconds: float):
+        self._records.append({
+            "pedestrian_arrival_rate": float(config.pedestrian_arrival_rate),
+            "vehicle_arrival_rate": float(config.vehicle_arrival_rate),
+            "vehicle_lanes": _vehicle_lanes(config),
+            "simulation_time": config.simulation_time,
+            "seconds": seconds,
+        })
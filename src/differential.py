@@ -0,0 +1,229 @@
+import os
+import dataclasses
+import sys
+import csv
+import json
+import math
+import time
+import hashlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from automata import Automata
+from config import Config
+from generator.tp_generator import set_seed
+from benchmark import SCENARIOS, CORNERS, scenario_config
+from running_stats import RunningStats, t_quantile
+from run_scenario import (PEDESTRIAN_ARRIVAL_RATES, VEHICLE_ARRIVAL_RATES, SEED, SWEEP_ENGINE,
+                          run_sweep, run_lockstep_sweep)
+
+# Traces of the reference implementation, recorded with `differential.py record`
+DIFF_REFERENCE = os.environ.get("DIFF_REFERENCE", "benchmarks/reference_traces.npz")
+DIFF_TICKS = int(os.environ.get("DIFF_TICKS", 1800))
+# Ticks between two points of a trace. With more than one the fast forward
+# can jump over the ticks in between
+DIFF_STRIDE = int(os.environ.get("DIFF_STRIDE", 1))
+
+# The statistical mode runs DIFF_RUNS runs at every pair of the indices of
+# the sweep in DIFF_INDICES, for both scenarios, and compares their mean
+# conflicts with the ones of the results CSV, which are the mean of
+# DIFF_REFERENCE_RUNS runs each
+DIFF_INDICES = [int(i) for i in os.environ.get("DIFF_INDICES", "0,14,29").split(",")]
+DIFF_RUNS = int(os.environ.get("DIFF_RUNS", 5))
+DIFF_REFERENCE_RUNS = int(os.environ.get("DIFF_REFERENCE_RUNS", 3))
+# Chance of flagging an engine that follows the reference distribution,
+# split among the points compared
+DIFF_ALPHA = float(os.environ.get("DIFF_ALPHA", 0.01))
+
+# Every case is a run of one of the scenarios at a corner of the sweep, with
+# a stream of its own
+class Case(NamedTuple):
+    name: str
+    scenario: str
+    pedestrian_arrival_rate: float
+    vehicle_arrival_rate: float
+    stream: int
+
+CASES = [Case(f"{scenario}_{corner}", scenario, *rates, stream)
+         for scenario in SCENARIOS
+         for stream, (corner, rates) in enumerate(CORNERS.items())]
+
+# What is compared at every point of a trace
+FIELDS = ("conflicts", "entities", "grid_hash")
+
+# Hash of what is on the grid, the same for every grid engine
+def grid_hash(automata: Automata) -> int:
+    h = hashlib.blake2b(digest_size=8)
+    for (row, col), entity in automata._grid.cells():
+        h.update(f"{row},{col},{entity!r},{entity.facing},{entity.is_crossing()};".encode())
+    return int.from_bytes(h.digest(), "little")
+
+def case_config(case: Case, ticks: int) -> Config:
+    config = scenario_config(case.scenario, case.pedestrian_arrival_rate, case.vehicle_arrival_rate)
+    return dataclasses.replace(config, simulation_time=ticks)
+
+def record_trace(case: Case, ticks: int = DIFF_TICKS, stride: int = DIFF_STRIDE) -> Dict[str, np.ndarray]:
+    set_seed(SEED, case.stream)
+    automata = Automata(case_config(case, ticks))
+    trace: Dict[str, list] = {field: [] for field in FIELDS}
+    for tick in range(stride, ticks + 1, stride):
+        automata.advance_to(tick)
+        trace["conflicts"].append(automata._conflicts)
+        trace["entities"].append(automata._grid.entity_count)
+        trace["grid_hash"].append(grid_hash(automata))
+    return {"conflicts": np.array(trace["conflicts"], dtype=np.int64),
+            "entities": np.array(trace["entities"], dtype=np.int64),
+            "grid_hash": np.array(trace["grid_hash"], dtype=np.uint64)}
+
+# Seconds of a run of the case without tracing it
+def time_case(case: Case, ticks: int = DIFF_TICKS) -> float:
+    set_seed(SEED, case.stream)
+    start = time.perf_counter()
+    Automata(case_config(case, ticks)).advance_to(ticks)
+    return time.perf_counter() - start
+
+def record(path: str = DIFF_REFERENCE, ticks: int = DIFF_TICKS, stride: int = DIFF_STRIDE):
+    arrays = {}
+    meta = {"ticks": ticks, "stride": stride, "seed": SEED, "cases": {}}
+    for case in CASES:
+        for field, values in record_trace(case, ticks, stride).items():
+            arrays[f"{case.name}/{field}"] = values
+        meta["cases"][case.name] = {"config": case_config(case, ticks).to_dict(), "seconds": time_case(case, ticks)}
+        print(f"Recorded {case.name}", flush=True)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez_compressed(path, meta=np.str_(json.dumps(meta)), **arrays)
+    print(f"Reference traces saved in {path}")
+
+class Divergence(NamedTuple):
+    tick: int
+    field: str
+    reference: int
+    candidate: int
+
+def first_divergence(reference: Dict[str, np.ndarray], candidate: Dict[str, np.ndarray], stride: int) -> Optional[Divergence]:
+    first = None
+    for field in FIELDS:
+        differ = np.flatnonzero(reference[field] != candidate[field])
+        if len(differ) > 0 and (first is None or differ[0] < first[0]):
+            first = (int(differ[0]), field)
+    if first is None:
+        return None
+    i, field = first
+    return Divergence((i + 1) * stride, field, int(reference[field][i]), int(candidate[field][i]))
+
+# Replays the reference cases with the engine and backends set in the
+# environment. Returns whether every trace is identical
+def compare(path: str = DIFF_REFERENCE) -> bool:
+    with np.load(path) as data:
+        meta = json.loads(data["meta"].item())
+        reference = {name: data[name] for name in data.files if name != "meta"}
+    ticks, stride = meta["ticks"], meta["stride"]
+    if meta["seed"] != SEED:
+        raise ValueError(f"The reference was recorded with seed {meta['seed']}, set SEED={meta['seed']}")
+
+    identical = True
+    reference_seconds = candidate_seconds = 0.0
+    for case in CASES:
+        recorded = meta["cases"][case.name]
+        changed = {name: (value, recorded["config"].get(name))
+                   for name, value in case_config(case, ticks).to_dict().items()
+                   if value != recorded["config"].get(name)}
+        trace = record_trace(case, ticks, stride)
+        divergence = first_divergence({field: reference[f"{case.name}/{field}"] for field in FIELDS}, trace, stride)
+        seconds = time_case(case, ticks)
+        reference_seconds += recorded["seconds"]
+        candidate_seconds += seconds
+
+        settings = ", ".join(f"{name} {old} -> {new}" for name, (new, old) in changed.items()) or "same settings"
+        speedup = f"speedup {recorded['seconds'] / seconds:.2f}x"
+        if divergence is None:
+            print(f"{case.name}: identical for {ticks} ticks, {speedup} ({settings})")
+        else:
+            identical = False
+            values = (f"{divergence.reference:016x} -> {divergence.candidate:016x}" if divergence.field == "grid_hash"
+                      else f"{divergence.reference} -> {divergence.candidate}")
+            print(f"{case.name}: diverges at tick {divergence.tick} on {divergence.field}, "
+                  f"{values}, {speedup} ({settings})")
+    print(f"Overall speedup {reference_seconds / candidate_seconds:.2f}x, "
+          f"{'identical' if identical else 'DIVERGED'}")
+    return identical
+
+class PointComparison(NamedTuple):
+    scenario: str
+    pedestrian_rate_hr: int
+    vehicle_rate_hr: int
+    reference: float
+    mean: float
+    t: float
+
+# Mean conflicts of the results CSV of the scenario at (i, j) of the sweep
+def _reference_means(scenario: str) -> Dict[Tuple[int, int], float]:
+    with open(f"results/{scenario}.csv") as f:
+        rows = list(csv.DictReader(f))
+    means = {}
+    for k, row in enumerate(rows):
+        i, j = divmod(k, len(VEHICLE_ARRIVAL_RATES))
+        if (int(row["pedestrian_arrival_rate"]) != int(PEDESTRIAN_ARRIVAL_RATES[i]*2*3600) or
+                int(row["vehicle_arrival_rate"]) != int(VEHICLE_ARRIVAL_RATES[j]*6*3600)):
+            raise ValueError(f"Row {k} of results/{scenario}.csv is not the point ({i}, {j}) of the sweep")
+        means[(i, j)] = float(row["conflicts"])
+    return means
+
+# For engines that aren't meant to reproduce the reference run by run, as
+# the lockstep one: their mean conflicts have to agree with the ones of the
+# results CSV at every point compared, with a Welch t test taking the
+# variance of the reference runs to be the one of the engine's
+def statistical(runs: int = DIFF_RUNS, alpha: float = DIFF_ALPHA) -> bool:
+    if runs < 2:
+        raise ValueError(f"The statistical mode needs at least 2 runs per point, got {runs}")
+    points = [(i, j) for i in DIFF_INDICES for j in DIFF_INDICES]
+    critical = t_quantile(1 - alpha / (2 * len(points) * len(SCENARIOS)), runs - 1)
+    comparisons: List[PointComparison] = []
+    start = time.perf_counter()
+    for scenario in SCENARIOS:
+        reference = _reference_means(scenario)
+        configs = [scenario_config(scenario, PEDESTRIAN_ARRIVAL_RATES[i], VEHICLE_ARRIVAL_RATES[j]) for i, j in points]
+        if SWEEP_ENGINE == "lockstep":
+            results = run_lockstep_sweep(configs, runs=runs, store=None)
+        else:
+            results = run_sweep(configs, runs=runs, store=None)
+        stats = [RunningStats() for _ in points]
+        for result in results:
+            stats[result.index].push(result.conflicts)
+
+        for (i, j), config, s in zip(points, configs, stats):
+            se = math.sqrt(s.variance * (1 / s.count + 1 / DIFF_REFERENCE_RUNS))
+            difference = s.mean - reference[(i, j)]
+            t = 0.0 if difference == 0 else difference / se if se > 0 else math.inf
+            comparisons.append(PointComparison(scenario,
+                                               int(config.pedestrian_arrival_rate*2*3600),
+                                               int(config.vehicle_arrival_rate*6*3600),
+                                               reference[(i, j)], s.mean, t))
+    seconds = time.perf_counter() - start
+
+    for c in comparisons:
+        flag = " OUTSIDE" if abs(c.t) > critical else ""
+        print(f"{c.scenario} {c.pedestrian_rate_hr} cap/hr, {c.vehicle_rate_hr} veh/hr: "
+              f"reference {c.reference:.1f}, engine {c.mean:.1f}, t {c.t:+.2f}{flag}")
+    bias = sum(c.mean - c.reference for c in comparisons) / len(comparisons)
+    equivalent = all(abs(c.t) <= critical for c in comparisons)
+    print(f"{SWEEP_ENGINE} engine, {runs} runs per point in {seconds:.0f} s: mean difference {bias:+.2f} conflicts, "
+          f"|t| <= {critical:.2f} {'everywhere' if equivalent else 'NOT everywhere'}")
+    return equivalent
+
+MODES = ("record", "compare", "statistical")
+
+def main():
+    mode = sys.argv[1] if len(sys.argv) > 1 else "compare"
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode}, expected one of {list(MODES)}")
+    if mode == "record":
+        record()
+    elif mode == "compare":
+        sys.exit(0 if compare() else 1)
+    else:
+        sys.exit(0 if statistical() else 1)
+
+if __name__ == "__main__":
+    main()
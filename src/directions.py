@@ -2,6 +2,11 @@ from typing import Literal
 
 Direction = Literal["East", "West", "North", "South"]
 
+DIRECTIONS = ("East", "West", "North", "South")
+
+def direction_code(direction: Direction) -> int:
+    return DIRECTIONS.index(direction)
+
 def opposite_direction(direction: Direction) -> Direction:
     if direction == "East":
         return "West"
@@ -10,4 +15,4 @@ def opposite_direction(direction: Direction) -> Direction:
     elif direction == "North":
         return "South"
     else:
-        return "North"
\ No newline at end of file
+        return "North"
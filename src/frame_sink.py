@@ -0,0 +1,110 @@
+import os
+import shutil
+import subprocess
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, Type
+
+import numpy as np
+
+DEFAULT_ANIMATION_FILE = "animation.mp4"
+# A frame per tick, 200 ms each as the old ArtistAnimation
+DEFAULT_ANIMATION_FPS = 5
+
+# Writes the frames of an animation to a file as they come, one RGB array
+# of shape (height, width, 3) at a time, so nothing grows with the number
+# of frames. The file is opened with the first frame, which sets the size
+class FrameSink(ABC):
+    def __init__(self, path: str, fps: int):
+        self._path = path
+        self._fps = fps
+        self._size = None
+        self._closed = False
+        self.frames = 0
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def write(self, frame: np.ndarray):
+        if self._closed:
+            raise ValueError(f"The animation {self._path} is already saved")
+        height, width, _ = frame.shape
+        if self._size is None:
+            self._size = (width, height)
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            self._open(width, height)
+        elif self._size != (width, height):
+            raise ValueError(f"Frame of {width}x{height}, expected {self._size[0]}x{self._size[1]}")
+        self._write(np.ascontiguousarray(frame[..., :3], dtype=np.uint8))
+        self.frames += 1
+
+    def close(self):
+        if self._size is not None and not self._closed:
+            self._close()
+        self._closed = True
+
+    @abstractmethod
+    def _open(self, width: int, height: int):
+        pass
+
+    @abstractmethod
+    def _write(self, frame: np.ndarray):
+        pass
+
+    @abstractmethod
+    def _close(self):
+        pass
+
+# Raw frames piped to ffmpeg, which encodes them as they arrive
+class FFmpegSink(FrameSink):
+    def _open(self, width: int, height: int):
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise RuntimeError(f"ffmpeg is needed to write {self._path}, install it or write a .gif instead")
+        # yuv420p, the pixel format most players read, needs an even size
+        self._process = subprocess.Popen(
+            [ffmpeg, "-y", "-loglevel", "error",
+             "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(self._fps), "-i", "-",
+             "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-vcodec", "h264", "-pix_fmt", "yuv420p", self._path],
+            stdin=subprocess.PIPE)
+
+    def _write(self, frame: np.ndarray):
+        self._process.stdin.write(frame.tobytes())
+
+    def _close(self):
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed writing {self._path} with exit code {self._process.returncode}")
+
+# GIF written a frame at a time with the frame writer of Pillow. Every
+# frame has a palette of its own, as entities of colors that aren't in the
+# first frame show up later on
+class GifSink(FrameSink):
+    def _open(self, width: int, height: int):
+        self._file: BinaryIO = open(self._path, "wb")
+
+    def _write(self, frame: np.ndarray):
+        from PIL import Image, GifImagePlugin
+
+        duration = 1000 // self._fps
+        indexed = Image.fromarray(frame).quantize(colors=256)
+        if self.frames == 0:
+            header, _ = GifImagePlugin.getheader(indexed, info={"loop": 0, "duration": duration, "optimize": False})
+            self._file.writelines(header)
+        self._file.writelines(GifImagePlugin.getdata(indexed, duration=duration, include_color_table=True))
+
+    def _close(self):
+        self._file.write(b";")
+        self._file.close()
+
+# Sinks by the extension of the file they write
+FRAME_SINKS: Dict[str, Type[FrameSink]] = {
+    ".mp4": FFmpegSink,
+    ".gif": GifSink,
+}
+
+def open_sink(path: str, fps: int = DEFAULT_ANIMATION_FPS) -> FrameSink:
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FRAME_SINKS:
+        raise ValueError(f"Unknown animation format {extension or path}, expected one of {list(FRAME_SINKS)}")
+    return FRAME_SINKS[extension](path, fps)
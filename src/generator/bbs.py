@@ -1,33 +1,111 @@
-import sympy
-import numpy as np
-
-class BlumBlumShub:
-    @staticmethod
-    def _next_usable_prime(x: int) -> int:
-        p = sympy.nextprime(x)
-        while (p % 4 != 3):
-                p = sympy.nextprime(p)
-        return p
-
-    # We define two big numbers and find the appropiate
-    # parameters based on them
-    p = _next_usable_prime(8*10**8)
-    q = _next_usable_prime(4*10**8)
+import math
+from typing import List
+
+from .generator import Generator
+
+# Draws reserved for each substream. A run of the simulator draws a few
+# million numbers at most, far from this
+SUBSTREAM_STRIDE = 2**40
+
+class BlumBlumShub(Generator):
+    # Smallest primes congruent to 3 mod 4 after 8*10**8 and 4*10**8
+    # respectively. They used to be searched with sympy.nextprime on
+    # every import
+    p = 800000011
+    q = 400000043
     M = p * q
+    # Carmichael function of M, the exponents of the states can be reduced
+    # modulo it
+    carmichael = math.lcm(p - 1, q - 1)
 
     def __init__(self, seed):
         self._curr = seed
 
-    def generate(self, amount: int) -> np.array:
-        arr = [0] * amount
-        for i in range(amount):
-            arr[i] = next(self)
-        return np.array(arr)
-
-    def __next__(self) -> float:
+    def random(self) -> float:
         self._curr = pow(self._curr, 2, self.M)
 
         return self._curr / self.M
 
+    def __next__(self) -> float:
+        return self.random()
+
     def __iter__(self):
-        return self
\ No newline at end of file
+        return self
+
+    # Skips the next n draws. The state after i draws is x0^(2^i) mod M, so
+    # it can be computed directly in O(log n) multiplications
+    def jump(self, n: int):
+        if n < 0:
+            raise ValueError(f"Cannot jump backwards {n} draws")
+        if math.gcd(self._curr, self.M) != 1:
+            raise ValueError(f"Cannot jump from state {self._curr}, it is not coprime with M")
+        self._curr = pow(self._curr, pow(2, n, self.carmichael), self.M)
+
+    def skip(self, amount: int):
+        self.jump(amount)
+
+    def jumped(self, n: int) -> "BlumBlumShub":
+        generator = type(self)(self._curr)
+        generator.jump(n)
+        return generator
+
+    # The orbits of M are only about 2^42 draws long, a few strides, so
+    # substreams are taken from the orbit of the state modulo the longer M of
+    # SubstreamBlumBlumShub instead. Streamless generators keep the orbit of
+    # these primes, which old seeds depend on, and spawning leaves them where
+    # they are
+    def substream(self, index: int) -> "BlumBlumShub":
+        return SubstreamBlumBlumShub(self._curr).substream(index)
+
+    def spawn(self, k: int) -> List["BlumBlumShub"]:
+        return SubstreamBlumBlumShub(self._curr).spawn(k)
+
+class SubstreamBlumBlumShub(BlumBlumShub):
+    # p = 2*p1 + 1 and p1 = 2*p2 + 1 with p, p1 and p2 all prime, the first
+    # such p2 after 2**40 and after 2**40 + 2**38, and the same for q. The
+    # orbits of M are then p2*q2 draws long, about 2^80, for every seed but
+    # a few, and knowing the factors of p - 1 and p1 - 1 gives their length
+    p2, q2 = 1099511629421, 1374389536109
+    p1, q1 = 2*p2 + 1, 2*q2 + 1
+    p, q = 2*p1 + 1, 2*q1 + 1
+    M = p * q
+    carmichael = math.lcm(p - 1, q - 1)
+
+    # Draws before the states of this generator repeat. After one squaring
+    # the state has an odd order m, which divides p1*q1, and squaring it
+    # again repeats after the multiplicative order of 2 modulo m
+    @property
+    def period(self) -> int:
+        if math.gcd(self._curr, self.M) != 1:
+            raise ValueError(f"State {self._curr} is not coprime with M, it has no period")
+        state = pow(self._curr, 2, self.M)
+        order = self.p1 * self.q1
+        for factor in (self.p1, self.q1):
+            if pow(state, order // factor, self.M) == 1:
+                order //= factor
+        if order == 1:
+            return 1
+        # The Carmichael function of m, 2*p2, 2*q2 or 2*p2*q2, is a
+        # multiple of the order of 2
+        period = math.lcm(*((factor - 1) for factor in (self.p1, self.q1) if order % factor == 0))
+        for factor in (2, self.p2, self.q2):
+            while period % factor == 0 and pow(2, period // factor, order) == 1:
+                period //= factor
+        return period
+
+    # The draws from index*SUBSTREAM_STRIDE to the next stride, which don't
+    # overlap with the ones of any other substream as long as all of them fit
+    # in one period, and each takes fewer than SUBSTREAM_STRIDE draws
+    def substream(self, index: int) -> "SubstreamBlumBlumShub":
+        period = self.period
+        if (index + 1) * SUBSTREAM_STRIDE > period:
+            raise ValueError(f"Substream {index} would wrap around the orbit of state {self._curr}, "
+                             f"which repeats after {period} draws")
+        return self.jumped(index * SUBSTREAM_STRIDE)
+
+    # Splits the rest of the stream in k substreams and moves this generator
+    # past all of them
+    def spawn(self, k: int) -> List["SubstreamBlumBlumShub"]:
+        children = [self.substream(i) for i in range(k)]
+        self.jump(k * SUBSTREAM_STRIDE)
+        return children
@@ -0,0 +1,39 @@
+from typing import List
+import numpy as np
+
+from .generator import Generator
+
+# Draws the numbers of another generator in blocks of block_size and hands
+# them out one at a time. The numbers come out in the same order as they
+# would from the source, only the cost of drawing them is paid in bulk
+class BufferedGenerator(Generator):
+    def __init__(self, source: Generator, block_size: int = 4096):
+        assert block_size > 0
+        self._source = source
+        self._block_size = block_size
+        self._buffer: List[float] = []
+        self._pos = 0
+
+    def _refill(self):
+        self._buffer = self._source.generate(self._block_size).tolist()
+        self._pos = 0
+
+    def random(self) -> float:
+        if self._pos == len(self._buffer):
+            self._refill()
+        value = self._buffer[self._pos]
+        self._pos += 1
+        return value
+
+    def generate(self, amount: int) -> np.ndarray:
+        head = self._buffer[self._pos:self._pos + amount]
+        self._pos += len(head)
+        if len(head) == amount:
+            return np.array(head)
+        return np.concatenate([np.array(head), self._source.generate(amount - len(head))])
+
+    def substream(self, index: int) -> "BufferedGenerator":
+        return BufferedGenerator(self._source.substream(index), self._block_size)
+
+    def spawn(self, k: int) -> List["BufferedGenerator"]:
+        return [BufferedGenerator(source, self._block_size) for source in self._source.spawn(k)]
@@ -1,14 +1,43 @@
 from abc import ABC, abstractmethod
+from typing import List
+import numpy as np
 
 class Generator(ABC):
     @abstractmethod
     def random(self) -> float:
         pass
 
-    @abstractmethod
     def randint(self, a: int, b: int) -> int:
-        pass
+        value = self.random()
+        value = (b - a) * value + a
+        return int(value)
 
-    @abstractmethod
     def poi(self, l: float) -> int:
-        pass
\ No newline at end of file
+        # Algorithm taken from https://en.wikipedia.org/wiki/Poisson_distribution#Random_variate_generation
+
+        L = np.exp(-l)
+        k = 0
+        p = 1
+        while True:
+            k += 1
+            p *= self.random()
+            if p <= L:
+                return k - 1
+
+    def generate(self, amount: int) -> np.ndarray:
+        arr = [0] * amount
+        for i in range(amount):
+            arr[i] = self.random()
+        return np.array(arr)
+
+    # Moves past the next amount draws as if they were drawn
+    def skip(self, amount: int):
+        self.generate(amount)
+
+    # Generator of an independent stream derived from this one, identified
+    # by index. It doesn't advance this generator
+    def substream(self, index: int) -> "Generator":
+        raise NotImplementedError(f"{type(self).__name__} doesn't support substreams")
+
+    def spawn(self, k: int) -> List["Generator"]:
+        raise NotImplementedError(f"{type(self).__name__} doesn't support substreams")
@@ -0,0 +1,36 @@
+from typing import List, Union
+import numpy as np
+
+from .generator import Generator
+
+BIT_GENERATORS = {
+    "pcg64": np.random.PCG64,
+    "philox": np.random.Philox,
+}
+
+class NumpyGenerator(Generator):
+    def __init__(self, seed: Union[int, np.random.SeedSequence], bit_generator: str = "pcg64"):
+        if bit_generator not in BIT_GENERATORS:
+            raise ValueError(f"Unknown bit generator {bit_generator}, expected one of {list(BIT_GENERATORS)}")
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self._seed_sequence = seed
+        self._bit_generator = bit_generator
+        self._rng = np.random.Generator(BIT_GENERATORS[bit_generator](seed))
+
+    def random(self) -> float:
+        return self._rng.random()
+
+    def poi(self, l: float) -> int:
+        return int(self._rng.poisson(l))
+
+    def generate(self, amount: int) -> np.ndarray:
+        return self._rng.random(amount)
+
+    def substream(self, index: int) -> "NumpyGenerator":
+        seed = np.random.SeedSequence(self._seed_sequence.entropy,
+                                      spawn_key=self._seed_sequence.spawn_key + (index,))
+        return NumpyGenerator(seed, self._bit_generator)
+
+    def spawn(self, k: int) -> List["NumpyGenerator"]:
+        return [NumpyGenerator(seed, self._bit_generator) for seed in self._seed_sequence.spawn(k)]
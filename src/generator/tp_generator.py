@@ -1,32 +1,145 @@
+import copy
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
 import numpy as np
 
+from .generator import Generator
 from .bbs import BlumBlumShub
+from .numpy_generator import NumpyGenerator
+from .buffered_generator import BufferedGenerator
 
-gen = BlumBlumShub(4 * 10 ** 7)
+BACKENDS = {
+    "bbs": BlumBlumShub,
+    "pcg64": lambda seed: NumpyGenerator(seed, "pcg64"),
+    "philox": lambda seed: NumpyGenerator(seed, "philox"),
+}
 
-def set_seed(seed: int):
-    global gen
-    gen = BlumBlumShub(seed)
+DEFAULT_SEED = 4 * 10 ** 7
 
-def random() -> float:
-    return next(gen)
+# Sources of random numbers that get a stream of their own with common
+# random numbers. A source is its name and which of its instances draws,
+# as the lane of the vehicle arrivals. Every draw of the simulation has a
+# source, since any draw left on a shared stream would shift the ones
+# after it as soon as two configs diverge
+UPDATE_ORDER = "update_order"
+PEDESTRIAN_VELOCITY = "pedestrian_velocity"
+PEDESTRIAN_ARRIVALS = "pedestrian_arrivals"
+VEHICLE_ARRIVALS = "vehicle_arrivals"
+PEDESTRIAN_PLACEMENT = "pedestrian_placement"
+LATERAL_MOVEMENT = "lateral_movement"
+# Looks of the pedestrians and vehicles, which don't change the outcome
+APPEARANCE = "appearance"
+SOURCES = (UPDATE_ORDER, PEDESTRIAN_VELOCITY, PEDESTRIAN_ARRIVALS, VEHICLE_ARRIVALS,
+           PEDESTRIAN_PLACEMENT, LATERAL_MOVEMENT, APPEARANCE)
+MAX_SOURCE_INSTANCES = 64
+Source = Tuple[str, int]
+# The sources of the run seeded with stream s draw from the streams after
+# it, so the streams of two runs with common random numbers have to be
+# STREAMS_PER_RUN apart
+STREAMS_PER_RUN = 1 + len(SOURCES) * MAX_SOURCE_INSTANCES
 
-def randint(a: int, b: int) -> int:
-    value = random()
-    value = (b - a) * value + a
-    return int(value)
+def new_generator(backend: str, seed: int, buffer_size: int = 0, stream: int = None) -> Generator:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown random generator backend {backend}, expected one of {list(BACKENDS)}")
+    generator = BACKENDS[backend](seed)
+    if stream is not None:
+        generator = generator.substream(stream)
+    if buffer_size > 0:
+        generator = BufferedGenerator(generator, buffer_size)
+    return generator
 
-def choice(seq: list):
-    return seq[randint(0, len(seq) - 1)]
+# Where the random numbers of a run come from: the seed and stream, the
+# backend and the generator drawn from, and with common random numbers the
+# streams of every source. Each run owns one and makes it the active state
+# of the module while it runs, so runs in the same process don't draw from
+# each other's generators
+class RandomState:
+    def __init__(self, seed: int = DEFAULT_SEED, stream: Optional[int] = None, backend: str = "bbs",
+                 buffer_size: int = 0, common_random_numbers: bool = False, gen: Optional[Generator] = None):
+        self.seed = seed
+        self.stream = stream
+        self.backend = backend
+        self.buffer_size = buffer_size
+        self.common_random_numbers = common_random_numbers
+        self.gen = gen if gen is not None else new_generator(backend, seed, buffer_size, stream)
+        self._sources: Dict[Source, Generator] = {}
 
-def poi(l: float) -> int:
-    # Algorithm taken from https://en.wikipedia.org/wiki/Poisson_distribution#Random_variate_generation
+    # A new state of its own that draws with the backend and common random
+    # numbers given. With the backend of this one it carries on from a copy
+    # of its generators, so drawing from either leaves the other as it is,
+    # and with another it starts from the same seed and stream
+    def configured(self, backend: str, buffer_size: int = 0, common_random_numbers: bool = False) -> "RandomState":
+        if (backend, buffer_size) != (self.backend, self.buffer_size):
+            return RandomState(self.seed, self.stream, backend, buffer_size, common_random_numbers)
+        state = RandomState(self.seed, self.stream, backend, buffer_size, common_random_numbers, copy.deepcopy(self.gen))
+        if common_random_numbers == self.common_random_numbers:
+            state._sources = copy.deepcopy(self._sources)
+        return state
 
-    L = np.exp(-l)
-    k = 0
-    p = 1
-    while True:
-        k += 1
-        p *= random()
-        if p <= L:
-            return k - 1
\ No newline at end of file
+    # A state drawing the same way from another seed and stream
+    def reseeded(self, seed: int, stream: Optional[int] = None) -> "RandomState":
+        return RandomState(seed, stream, self.backend, self.buffer_size, self.common_random_numbers)
+
+    # With common random numbers every source draws from its own stream, so
+    # runs with the same seed and stream draw the same numbers for the same
+    # source whatever the others draw. Without them every source draws from
+    # the generator of the state
+    def generator_of(self, source: Optional[Source] = None) -> Generator:
+        if source is None or not self.common_random_numbers:
+            return self.gen
+        if source not in self._sources:
+            name, instance = source
+            if not 0 <= instance < MAX_SOURCE_INSTANCES:
+                raise ValueError(f"Instance {instance} of {name} out of range, expected less than {MAX_SOURCE_INSTANCES}")
+            stream = (self.stream or 0) + 1 + SOURCES.index(name) * MAX_SOURCE_INSTANCES + instance
+            self._sources[source] = new_generator(self.backend, self.seed, self.buffer_size, stream)
+        return self._sources[source]
+
+# The state the module functions draw from
+_state = RandomState()
+
+# With a stream, the generator is positioned at that substream of the seed,
+# so runs with the same seed and different streams never share draws. Runs
+# built after it take the new state, the ones already built keep theirs
+def set_seed(seed: int, stream: int = None):
+    global _state
+    _state = _state.reseeded(seed, stream)
+
+def current_state() -> RandomState:
+    return _state
+
+# Makes state the active one until the block ends
+@contextmanager
+def using(state: RandomState) -> Iterator[RandomState]:
+    global _state
+    previous = _state
+    _state = state
+    try:
+        yield state
+    finally:
+        _state = previous
+
+def generator_of(source: Optional[Source] = None) -> Generator:
+    return _state.generator_of(source)
+
+# The draws of a source come from its own stream with common random
+# numbers, and from the generator of the active state otherwise
+
+def random(source: Optional[Source] = None) -> float:
+    return _state.generator_of(source).random()
+
+def randint(a: int, b: int, source: Optional[Source] = None) -> int:
+    return _state.generator_of(source).randint(a, b)
+
+def choice(seq: list, source: Optional[Source] = None):
+    return seq[randint(0, len(seq) - 1, source)]
+
+def poi(l: float, source: Optional[Source] = None) -> int:
+    return _state.generator_of(source).poi(l)
+
+def generate(amount: int, source: Optional[Source] = None) -> np.ndarray:
+    return _state.generator_of(source).generate(amount)
+
+def skip(amount: int, source: Optional[Source] = None):
+    if amount > 0:
+        _state.generator_of(source).skip(amount)
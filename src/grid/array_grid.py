@@ -0,0 +1,182 @@
+from typing import TypeVar, Optional, Callable, Tuple, List, Dict, Union
+import numpy as np
+
+from directions import direction_code
+from rectangle import Rectangle
+from .grid import Grid
+from .cell_filter import CellFilter, EMPTY, kind_of
+
+T = TypeVar("T")
+
+Filter = Union[CellFilter, Callable[[T], bool]]
+
+def _area_index(area: Rectangle) -> Tuple[slice, slice]:
+    return slice(area.start_row, area.end_row + 1), slice(area.start_col, area.end_col + 1)
+
+# Grid that keeps the occupancy in typed arrays instead of a list of lists
+# of objects. Every entity gets an integer id while it is on the grid, and
+# the directional queries the occupancy index can't answer are answered by
+# slicing those arrays. The simulation asks none of those, the index takes
+# all of its queries, so the arrays are only kept up to date, and reading
+# and writing single cells of them costs more than indexing lists. It is
+# slower than the list grid, and kept as a second grid the differential
+# harness checks the list one against
+class ArrayGrid(Grid[T]):
+    def _allocate(self, rows: int, cols: int):
+        self._ids = np.zeros((rows, cols), dtype=np.int32)
+        self._kinds = np.zeros((rows, cols), dtype=np.int8)
+        self._facings = np.full((rows, cols), -1, dtype=np.int8)
+        self._crossing = np.zeros((rows, cols), dtype=bool)
+        self._rows = rows
+        self._cols = cols
+
+        # Id 0 is reserved for empty cells
+        self._entities: List[Optional[T]] = [None]
+        self._cells_per_id: List[int] = [0]
+        self._id_of: Dict[int, int] = {}
+        self._free_ids: List[int] = []
+
+    # The ids are keyed by the identity of the entities, which a copy of the
+    # grid doesn't keep, so they are indexed again on unpickling
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._id_of = {id(v): entity_id for entity_id, v in enumerate(self._entities) if v is not None}
+
+    def is_fill(self, row: int, col: int) -> bool:
+        if row < 0 or row >= self._rows:
+            return False
+        if col < 0 or col >= self._cols:
+            return False
+
+        return self._ids.item(row, col) != EMPTY
+
+    def _acquire_id(self, v: T, cells: int = 1) -> int:
+        entity_id = self._id_of.get(id(v))
+        if entity_id is None:
+            if self._free_ids:
+                entity_id = self._free_ids.pop()
+                self._entities[entity_id] = v
+            else:
+                entity_id = len(self._entities)
+                self._entities.append(v)
+                self._cells_per_id.append(0)
+            self._id_of[id(v)] = entity_id
+        self._cells_per_id[entity_id] += cells
+        return entity_id
+
+    def _release_id(self, entity_id: int, cells: int = 1):
+        self._cells_per_id[entity_id] -= cells
+        if self._cells_per_id[entity_id] == 0:
+            del self._id_of[id(self._entities[entity_id])]
+            self._entities[entity_id] = None
+            self._free_ids.append(entity_id)
+
+    def _place(self, row: int, col: int, v: T):
+        self._ids[row, col] = self._acquire_id(v)
+        self._kinds[row, col] = kind_of(v)
+        self._facings[row, col] = direction_code(v.facing)
+        self._crossing[row, col] = bool(v.is_crossing())
+
+    def _remove(self, row: int, col: int):
+        self._release_id(self._ids.item(row, col))
+        self._ids[row, col] = EMPTY
+        self._kinds[row, col] = EMPTY
+        self._facings[row, col] = -1
+        self._crossing[row, col] = False
+
+    def _place_area(self, area: Rectangle, v: T):
+        index = _area_index(area)
+        self._ids[index] = self._acquire_id(v, area.rows * area.cols)
+        self._kinds[index] = kind_of(v)
+        self._facings[index] = direction_code(v.facing)
+        self._crossing[index] = bool(v.is_crossing())
+
+    def _remove_area(self, area: Rectangle):
+        index = _area_index(area)
+        self._release_id(self._ids.item(area.upper_left), area.rows * area.cols)
+        self._ids[index] = EMPTY
+        self._kinds[index] = EMPTY
+        self._facings[index] = -1
+        self._crossing[index] = False
+
+    def _check_free(self, area: Rectangle):
+        inside = (area.start_row >= 0 and area.end_row < self._rows and
+                  area.start_col >= 0 and area.end_col < self._cols)
+        if not inside or self._ids[_area_index(area)].any():
+            super()._check_free(area)
+
+    def refresh_area(self, area: Rectangle):
+        super().refresh_area(area)
+        self._crossing[_area_index(area)] = bool(self.get_value(*area.upper_left).is_crossing())
+
+    def refresh(self, row: int, col: int):
+        super().refresh(row, col)
+        self._crossing[row, col] = bool(self.get_value(row, col).is_crossing())
+
+    def get_value(self, row: int, col: int) -> T:
+        if not self.is_fill(row, col):
+            raise Exception(f"Element not found at row {row}, col {col}")
+        return self._entities[self._ids.item(row, col)]
+
+    # Returns the position, inside the given cells, of the first one that
+    # is filled and matches f
+    def _first_match(self, index: Tuple, f: Filter) -> Optional[int]:
+        ids = self._ids[index]
+        if isinstance(f, CellFilter):
+            mask = f.mask(self._kinds[index], self._facings[index], self._crossing[index])
+        else:
+            for i in np.flatnonzero(ids):
+                if f(self._entities[ids[i]]):
+                    return int(i)
+            return None
+
+        if mask.size == 0:
+            return None
+        i = int(mask.argmax())
+        return i if mask[i] else None
+
+    def _scan_next_in_row(self, row: int, col: int, f: Filter, max_checks: int) -> Optional[int]:
+        if row < 0 or row >= self._rows:
+            return None
+
+        start = max(0, col + 1)
+        end = min(self._cols, col + max_checks + 1)
+        i = self._first_match((row, slice(start, end)), f)
+        return None if i is None else start + i
+
+    def _scan_prev_in_row(self, row: int, col: int, f: Filter, max_checks: int) -> Optional[int]:
+        if row < 0 or row >= self._rows:
+            return None
+
+        start = max(0, col - max_checks)
+        end = min(self._cols, col)
+        if start >= end:
+            return None
+        i = self._first_match((row, slice(end - 1, start - 1 if start > 0 else None, -1)), f)
+        return None if i is None else end - 1 - i
+
+    def _scan_next_in_col(self, row: int, col: int, f: Filter, max_checks: int) -> Optional[int]:
+        if col < 0 or col >= self._cols:
+            return None
+
+        start = max(0, row + 1)
+        end = min(self._rows, row + max_checks + 1)
+        i = self._first_match((slice(start, end), col), f)
+        return None if i is None else start + i
+
+    def _scan_prev_in_col(self, row: int, col: int, f: Filter, max_checks: int) -> Optional[int]:
+        if col < 0 or col >= self._cols:
+            return None
+
+        start = max(0, row - max_checks)
+        end = min(self._rows, row)
+        if start >= end:
+            return None
+        i = self._first_match((slice(end - 1, start - 1 if start > 0 else None, -1), col), f)
+        return None if i is None else end - 1 - i
+
+    def cells(self) -> List[Tuple[Tuple[int, int], T]]:
+        if self._stats is not None:
+            self._stats.count_scan("cells", self._rows * self._cols)
+        rows, cols = np.nonzero(self._ids)
+        return [((int(i), int(j)), self._entities[self._ids[i, j]]) for i, j in zip(rows, cols)]
@@ -0,0 +1,85 @@
+from abc import ABC, abstractmethod
+from typing import Hashable, Optional, Tuple
+import numpy as np
+
+from directions import Direction, direction_code
+from .occupancy_index import ANY
+
+EMPTY = 0
+PEDESTRIAN = 1
+VEHICLE = 2
+
+VEHICLES = "vehicles"
+
+def kind_of(entity) -> int:
+    if entity.is_vehicle():
+        return VEHICLE
+    return PEDESTRIAN
+
+def crossing_key(facing: Direction) -> Hashable:
+    return ("crossing", facing)
+
+# Keys an entity is kept under in the occupancy index of a grid
+def entity_index_keys(entity) -> Tuple[Hashable, ...]:
+    if entity.is_vehicle():
+        if entity.is_crossing():
+            return (ANY, VEHICLES, crossing_key(entity.facing))
+        return (ANY, VEHICLES)
+    if entity.is_crossing():
+        return (ANY, crossing_key(entity.facing))
+    return (ANY,)
+
+# Filters used by the directional queries of the grids. Calling one
+# evaluates it on a single entity, as the plain Grid does, while
+# mask() evaluates it on a whole slice of an ArrayGrid at once. Filters
+# with a key are answered by the occupancy index of the grid instead
+class CellFilter(ABC):
+    key: Optional[Hashable] = None
+
+    @abstractmethod
+    def __call__(self, entity) -> bool:
+        pass
+
+    @abstractmethod
+    def mask(self, kinds: np.ndarray, facings: np.ndarray, crossing: np.ndarray) -> np.ndarray:
+        pass
+
+class CrossingFacing(CellFilter):
+    def __init__(self, facing: Direction):
+        self.facing = facing
+        self.key = crossing_key(facing)
+        self._facing_code = direction_code(facing)
+
+    def __call__(self, entity) -> bool:
+        return entity.is_crossing() and entity.facing == self.facing
+
+    def mask(self, kinds: np.ndarray, facings: np.ndarray, crossing: np.ndarray) -> np.ndarray:
+        return crossing & (facings == self._facing_code)
+
+    def __repr__(self) -> str:
+        return f"CrossingFacing({self.facing})"
+
+class IsVehicle(CellFilter):
+    key = VEHICLES
+
+    def __call__(self, entity) -> bool:
+        return entity.is_vehicle()
+
+    def mask(self, kinds: np.ndarray, facings: np.ndarray, crossing: np.ndarray) -> np.ndarray:
+        return kinds == VEHICLE
+
+    def __repr__(self) -> str:
+        return "IsVehicle()"
+
+def index_key(f) -> Optional[Hashable]:
+    if f is None:
+        return ANY
+    return getattr(f, "key", None)
+
+_crossing_facing = {}
+
+# Shared CrossingFacing instances, the hot paths ask for them on every query
+def crossing_facing(facing: Direction) -> CrossingFacing:
+    if facing not in _crossing_facing:
+        _crossing_facing[facing] = CrossingFacing(facing)
+    return _crossing_facing[facing]
@@ -1,7 +1,11 @@
-from typing import TypeVar, Generic, Optional, Callable, Tuple, List
+from typing import TypeVar, Generic, Optional, Callable, Tuple, List, Dict, Hashable
 
-from generator.tp_generator import choice
 from rectangle import Point, Rectangle
+from .scheduler import UpdateScheduler, ShuffleScheduler
+from .occupancy_index import OccupancyIndex
+from .cell_filter import index_key
+from instrumentation import RunStats
+from terminal import Line, TerminalRenderer, print_lines
 
 class CellAlreadyFill(Exception):
     def __init__(self, row: int, col: int, v = None):
@@ -15,67 +19,186 @@ class CellAlreadyFill(Exception):
 T = TypeVar("T")
 
 class Grid(Generic[T]):
-    def __init__(self, rows: int, cols: int):
+    # Every value is kept in the registry of entities visited by apply at
+    # the cell it was first placed on, or at the anchor of its area.
+    # index_keys gives the keys each value is kept under in the occupancy
+    # index
+    def __init__(self,
+                 rows: int,
+                 cols: int,
+                 scheduler: UpdateScheduler[T] = None,
+                 index_keys: Callable[[T], Tuple[Hashable, ...]] = None):
+        self._allocate(rows, cols)
+        self._registry: Dict[T, Point] = {}
+        self._scheduler = scheduler or ShuffleScheduler()
+        self._index = OccupancyIndex[T](rows, cols, index_keys)
+        # Changes made to the grid so far, so callers can tell whether
+        # anything changed between two points in time
+        self._changes = 0
+        self._stats: Optional[RunStats] = None
+
+    # Counts the queries the grid answers into stats from now on
+    def instrument(self, stats: Optional[RunStats]):
+        self._stats = stats
+
+    def _allocate(self, rows: int, cols: int):
         self._grid = [[None for i in range(cols)] for j in range(rows)]
+        self._rows = rows
+        self._cols = cols
 
     def is_fill(self, row: int, col: int) -> bool:
-        if row < 0 or row >= self.rows:
+        if row < 0 or row >= self._rows:
             return False
-        if col < 0 or col >= self.cols:
+        if col < 0 or col >= self._cols:
             return False
         
         return self._grid[row][col] is not None
 
-    def _plot_col_numbers(self, bounds: Rectangle):
-        print("  ", end="")
-        for col in range(bounds.start_col, bounds.end_col+1):
-            if col % 2 == 0:
-                print("\033[91m", end="")
-            else:
-                print("\033[94m", end="")
-            print(f"{col: >2}", end="")
-            print("\033[0m", end="")
-        print()
-
-    def _plot_row_number(self, row: int):
-        if row % 2 == 0:
-            print("\033[91m", end="")
-        else:
-            print("\033[94m", end="")
-        print(f"{row: ^2}", end="")
-        print("\033[0m", end="")
+    @staticmethod
+    def _plot_number(n: int, format_spec: str) -> str:
+        color = "\033[91m" if n % 2 == 0 else "\033[94m"
+        return f"{color}{n:{format_spec}}\033[0m"
 
-    def plot(self, f: Callable[[Point, Optional[T]], Optional[str]], bounds: Rectangle = None):
+    # The plot as lines of cells: the column numbers, then every row of the
+    # bounds after its number
+    def plot_lines(self, f: Callable[[Point, Optional[T]], Optional[str]], bounds: Rectangle = None) -> List[Line]:
         if bounds is None:
             bounds = Rectangle(self.rows, self.cols)
 
-        self._plot_col_numbers(bounds)
-
+        lines = [["  "] + [self._plot_number(col, " >2") for col in range(bounds.start_col, bounds.end_col+1)]]
         for row in range(bounds.start_row, bounds.end_row+1):
-            self._plot_row_number(row)
-            
+            line = [self._plot_number(row, "^2")]
             for col in range(bounds.start_col, bounds.end_col+1):
-                if not bounds.is_inside((row, col)):
-                    continue
                 if self.is_fill(row, col):
-                    s = f((row, col), self.get_value(row, col))
+                    line.append(f((row, col), self.get_value(row, col)))
                 else:
-                    s = f((row, col), None)
-                print(s, end="")
-            print()
-        
+                    line.append(f((row, col), None))
+            lines.append(line)
+        return lines
+
+    # Draws the plot on renderer, which only writes what changed since the
+    # last one, or prints it whole in a single write
+    def plot(self, f: Callable[[Point, Optional[T]], Optional[str]], bounds: Rectangle = None,
+             renderer: Optional[TerminalRenderer] = None):
+        lines = self.plot_lines(f, bounds)
+        if renderer is not None:
+            renderer.draw(lines)
+        else:
+            print_lines(lines)
+
+    def _place(self, row: int, col: int, v: T):
+        self._grid[row][col] = v
+
+    def _remove(self, row: int, col: int):
+        self._grid[row][col] = None
 
     def fill(self, row: int, col: int, v: T):
         if self.is_fill(row, col):
-            raise CellAlreadyFill(row, col, self._grid[row][col])
+            raise CellAlreadyFill(row, col, self.get_value(row, col))
             
-        self._grid[row][col] = v
+        self._place(row, col, v)
+        self._index.add(row, col, v)
+        self._changes += 1
+        if v not in self._registry:
+            self._registry[v] = (row, col)
 
     def clear(self, row: int, col: int):
         if not self.is_fill(row, col):
             raise Exception(f"Attempted to clear an empty cell ({row}, {col})")
         
-        self._grid[row][col] = None
+        v = self.get_value(row, col)
+        self._remove(row, col)
+        self._index.remove(row, col)
+        self._changes += 1
+        if self._registry.get(v) == (row, col):
+            del self._registry[v]
+
+    def move(self, row: int, col: int, new_row: int, new_col: int):
+        if not self.is_fill(row, col):
+            raise Exception(f"Attempted to move an empty cell ({row}, {col})")
+        if self.is_fill(new_row, new_col):
+            raise CellAlreadyFill(new_row, new_col, self.get_value(new_row, new_col))
+
+        v = self.get_value(row, col)
+        self._place(new_row, new_col, v)
+        self._remove(row, col)
+        self._index.move(row, col, new_row, new_col, v)
+        self._changes += 1
+        if v in self._registry:
+            self._registry[v] = (new_row, new_col)
+
+    # Areas hold a single value in all of their cells, so entities bigger
+    # than a cell, like vehicles, are one value on the grid and every cell
+    # they take up resolves to them
+
+    def _place_area(self, area: Rectangle, v: T):
+        for row, col in area.points():
+            self._place(row, col, v)
+
+    def _remove_area(self, area: Rectangle):
+        for row, col in area.points():
+            self._remove(row, col)
+
+    def _check_free(self, area: Rectangle):
+        for row, col in area.points():
+            if not (0 <= row < self._rows and 0 <= col < self._cols):
+                raise Exception(f"Attempted to fill an out of bounds cell ({row}, {col})")
+            if self.is_fill(row, col):
+                raise CellAlreadyFill(row, col, self.get_value(row, col))
+
+    def fill_area(self, area: Rectangle, v: T, anchor: Point):
+        self._check_free(area)
+        self._place_area(area, v)
+        self._index.add_area(area, v)
+        self._changes += 1
+        self._registry[v] = anchor
+
+    def clear_area(self, area: Rectangle):
+        for row, col in area.points():
+            if not self.is_fill(row, col):
+                raise Exception(f"Attempted to clear an empty cell ({row}, {col})")
+
+        v = self.get_value(*area.upper_left)
+        self._remove_area(area)
+        self._index.remove_area(area)
+        self._changes += 1
+        if v in self._registry and area.is_inside(self._registry[v]):
+            del self._registry[v]
+
+    # Displaces the value filling area, only the cells it enters and the
+    # ones it leaves are updated. Returns the displaced area
+    def move_area(self, area: Rectangle, d_row: int, d_col: int) -> Rectangle:
+        v = self.get_value(*area.upper_left)
+        new_area = area.displaced(d_row, d_col)
+        entered = new_area.minus(area)
+        for part in entered:
+            self._check_free(part)
+
+        for part in entered:
+            self._place_area(part, v)
+            self._index.add_area(part, v)
+        for part in area.minus(new_area):
+            self._remove_area(part)
+            self._index.remove_area(part)
+        self._changes += 1
+        if v in self._registry:
+            row, col = self._registry[v]
+            self._registry[v] = (row + d_row, col + d_col)
+        return new_area
+
+    def refresh_area(self, area: Rectangle):
+        self._index.refresh_area(area, self.get_value(*area.upper_left))
+        self._changes += 1
+
+    # Called when an entity changes an attribute that the grid keeps a copy
+    # of, such as its crossing flag
+    def refresh(self, row: int, col: int):
+        self._index.refresh(row, col, self.get_value(row, col))
+        self._changes += 1
+
+    @property
+    def changes(self) -> int:
+        return self._changes
 
     def get_value(self, row: int, col: int) -> T:
         if not self.is_fill(row, col):
@@ -84,86 +207,151 @@ class Grid(Generic[T]):
 
     @property
     def rows(self):
-        return len(self._grid)
+        return self._rows
 
     @property
     def cols(self):
-        return len(self._grid[0])
+        return self._cols
 
-    def calc_dist_to_next(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[int]:
-        if f is None:
-            f = lambda x: True
-        max_checks = max_checks or self.cols - col
-        
+    def _scan_next_in_row(self, row: int, col: int, f: Callable[[T], bool], max_checks: int) -> Optional[int]:
         for i in range(col+1, min(self.cols, col+max_checks+1)):
             if self.is_fill(row, i) and f(self.get_value(row, i)):
-                return i - col - 1
+                return i
         return None
-    
-    def calc_dist_to_prev(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[int]:
-        if f is None:
-            f = lambda x: True
-        max_checks = max_checks or col
 
+    def _scan_prev_in_row(self, row: int, col: int, f: Callable[[T], bool], max_checks: int) -> Optional[int]:
         for i in range(col-1, max(-1, col-max_checks-1), -1):
             if self.is_fill(row, i) and f(self.get_value(row, i)):
-                return col - i - 1
+                return i
         return None
-    
-    def calc_dist_to_vertically_next(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[int]:
-        if f is None:
-            f = lambda x: True
-        max_checks = max_checks or self.rows - row
 
+    def _scan_next_in_col(self, row: int, col: int, f: Callable[[T], bool], max_checks: int) -> Optional[int]:
         for i in range(row+1, min(self.rows, row+max_checks+1)):
             if self.is_fill(i, col) and f(self.get_value(i, col)):
-                return i - row - 1
+                return i
         return None
-    
-    def calc_dist_to_vertically_prev(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[int]:
-        if f is None:
-            f = lambda x: True
-        max_checks = max_checks or row
 
+    def _scan_prev_in_col(self, row: int, col: int, f: Callable[[T], bool], max_checks: int) -> Optional[int]:
         for i in range(row-1, max(-1, row-max_checks-1), -1):
             if self.is_fill(i, col) and f(self.get_value(i, col)):
-                return row - i - 1
-            
+                return i
         return None
+
+    # The _next/_prev helpers return the column (or row) of the first cell
+    # matching f, looking it up in the occupancy index when f has a key it
+    # covers and scanning the cells otherwise. Instrumented grids count the
+    # cells a scan visits, up to the match or the last one it checks
+
+    def _next_in_row(self, row: int, col: int, f: Callable[[T], bool], max_checks: int) -> Optional[int]:
+        key = index_key(f)
+        if key is not None and self._index.covers(key):
+            if self._stats is not None:
+                self._stats.count_index_query("next_in_row")
+            return self._index.next_in_row(key, row, col, max_checks)
+        i = self._scan_next_in_row(row, col, f, max_checks)
+        if self._stats is not None:
+            last = min(self.cols - 1, col + max_checks) if i is None else i
+            self._stats.count_scan("next_in_row", max(0, last - col))
+        return i
+
+    def _prev_in_row(self, row: int, col: int, f: Callable[[T], bool], max_checks: int) -> Optional[int]:
+        key = index_key(f)
+        if key is not None and self._index.covers(key):
+            if self._stats is not None:
+                self._stats.count_index_query("prev_in_row")
+            return self._index.prev_in_row(key, row, col, max_checks)
+        i = self._scan_prev_in_row(row, col, f, max_checks)
+        if self._stats is not None:
+            last = max(0, col - max_checks) if i is None else i
+            self._stats.count_scan("prev_in_row", max(0, col - last))
+        return i
+
+    def _next_in_col(self, row: int, col: int, f: Callable[[T], bool], max_checks: int) -> Optional[int]:
+        key = index_key(f)
+        if key is not None and self._index.covers(key):
+            if self._stats is not None:
+                self._stats.count_index_query("next_in_col")
+            return self._index.next_in_col(key, row, col, max_checks)
+        i = self._scan_next_in_col(row, col, f, max_checks)
+        if self._stats is not None:
+            last = min(self.rows - 1, row + max_checks) if i is None else i
+            self._stats.count_scan("next_in_col", max(0, last - row))
+        return i
+
+    def _prev_in_col(self, row: int, col: int, f: Callable[[T], bool], max_checks: int) -> Optional[int]:
+        key = index_key(f)
+        if key is not None and self._index.covers(key):
+            if self._stats is not None:
+                self._stats.count_index_query("prev_in_col")
+            return self._index.prev_in_col(key, row, col, max_checks)
+        i = self._scan_prev_in_col(row, col, f, max_checks)
+        if self._stats is not None:
+            last = max(0, row - max_checks) if i is None else i
+            self._stats.count_scan("prev_in_col", max(0, row - last))
+        return i
+
+    def calc_dist_to_next(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[int]:
+        max_checks = max_checks or self.cols - col
+        i = self._next_in_row(row, col, f, max_checks)
+        return None if i is None else i - col - 1
     
-    def get_prev(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[T]:
+    def calc_dist_to_prev(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[int]:
         max_checks = max_checks or col
-
-        dist = self.calc_dist_to_prev(row, col, f, max_checks)
-        if dist is None:
-            return None
-        return self.get_value(row, col - dist - 1)
+        i = self._prev_in_row(row, col, f, max_checks)
+        return None if i is None else col - i - 1
     
-    def get_vertically_prev(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[T]:
+    def calc_dist_to_vertically_next(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[int]:
+        max_checks = max_checks or self.rows - row
+        i = self._next_in_col(row, col, f, max_checks)
+        return None if i is None else i - row - 1
+    
+    def calc_dist_to_vertically_prev(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[int]:
         max_checks = max_checks or row
+        i = self._prev_in_col(row, col, f, max_checks)
+        return None if i is None else row - i - 1
 
-        dist = self.calc_dist_to_vertically_prev(row, col, f, max_checks)
-        if dist is None:
-            return None
-        return self.get_value(row - dist - 1, col)
-    
-    def get_next(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[T]:
+    # The find_ methods return the distance to the first entity matching f
+    # together with the entity itself
+
+    def find_next(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[Tuple[int, T]]:
         max_checks = max_checks or self.cols - col
+        i = self._next_in_row(row, col, f, max_checks)
+        return None if i is None else (i - col - 1, self.get_value(row, i))
+
+    def find_prev(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[Tuple[int, T]]:
+        max_checks = max_checks or col
+        i = self._prev_in_row(row, col, f, max_checks)
+        return None if i is None else (col - i - 1, self.get_value(row, i))
+
+    def find_vertically_next(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[Tuple[int, T]]:
+        max_checks = max_checks or self.rows - row
+        i = self._next_in_col(row, col, f, max_checks)
+        return None if i is None else (i - row - 1, self.get_value(i, col))
 
-        dist = self.calc_dist_to_next(row, col, f, max_checks)
-        if dist is None:
-            return None
-        return self.get_value(row, col + dist + 1)
+    def find_vertically_prev(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[Tuple[int, T]]:
+        max_checks = max_checks or row
+        i = self._prev_in_col(row, col, f, max_checks)
+        return None if i is None else (row - i - 1, self.get_value(i, col))
+    
+    def get_prev(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[T]:
+        found = self.find_prev(row, col, f, max_checks)
+        return None if found is None else found[1]
+    
+    def get_vertically_prev(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[T]:
+        found = self.find_vertically_prev(row, col, f, max_checks)
+        return None if found is None else found[1]
+    
+    def get_next(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[T]:
+        found = self.find_next(row, col, f, max_checks)
+        return None if found is None else found[1]
     
     def get_vertically_next(self, row: int, col: int, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[T]:
-        max_checks = max_checks or self.rows
-
-        dist = self.calc_dist_to_vertically_next(row, col, f, max_checks)
-        if dist is None:
-            return None
-        return self.get_value(row + dist + 1, col)
+        found = self.find_vertically_next(row, col, f, max_checks or self.rows)
+        return None if found is None else found[1]
     
-    def _get_cells_with_value(self) -> List[Tuple[Tuple[int, int], T]]:
+    def cells(self) -> List[Tuple[Tuple[int, int], T]]:
+        if self._stats is not None:
+            self._stats.count_scan("cells", self.rows * self.cols)
         values = []
         for i in range(self.rows):
             for j in range(self.cols):
@@ -171,17 +359,24 @@ class Grid(Generic[T]):
                     values.append(((i, j), self.get_value(i, j)))
         return values
     
-    def apply(self, f: Callable[[T, Tuple[int, int]], None]):
-        values = self._get_cells_with_value()
+    @property
+    def entity_count(self) -> int:
+        return len(self._registry)
 
-        while len(values) > 0:
-            cell = choice(values)
-            values.remove(cell)
-            pos, value = cell
+    def entities(self) -> List[Tuple[Tuple[int, int], T]]:
+        return [(pos, v) for v, pos in self._registry.items()]
+
+    def apply(self, f: Callable[[T, Tuple[int, int]], None]):
+        for pos, value in self._scheduler.order(self):
             f(value, pos)
 
+    # Draws the random numbers that times calls to apply would, without
+    # visiting the entities
+    def skip_apply(self, times: int = 1):
+        self._scheduler.skip(self, times)
+
     def apply_ordered(self, bounds: Rectangle, f: Callable[[T, Tuple[int, int]], None]):
-        for i in range(bounds.start_row, bounds.end_row+1):
-            for j in range(bounds.start_col, bounds.end_col+1):
-                if self.is_fill(i, j):
-                    f(self.get_value(i, j), (i, j))
+        values = [cell for cell in self.entities() if bounds.is_inside(cell[0])]
+        values.sort(key=lambda cell: cell[0])
+        for pos, value in values:
+            f(value, pos)
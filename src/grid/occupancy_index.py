@@ -0,0 +1,124 @@
+from collections import defaultdict
+from typing import TypeVar, Generic, Callable, Dict, Hashable, Tuple, List, Optional, Set
+
+from rectangle import Rectangle
+
+T = TypeVar("T")
+
+ANY = "any"
+
+# Bitsets of a new key. A class rather than a lambda, so the index can be
+# pickled
+class _EmptyBitsets:
+    def __init__(self, size: int):
+        self._size = size
+
+    def __call__(self) -> List[int]:
+        return [0] * self._size
+
+# Bitsets of the filled cells of every row and column, one per key. Each
+# value is indexed under the keys given by the keys function, so finding
+# the next or previous cell with a key is a couple of integer operations
+# instead of a scan of the row or column
+class OccupancyIndex(Generic[T]):
+    def __init__(self, rows: int, cols: int, keys: Callable[[T], Tuple[Hashable, ...]] = None):
+        self._rows = rows
+        self._cols = cols
+        self._keys = keys
+        self._row_bits: Dict[Hashable, List[int]] = defaultdict(_EmptyBitsets(rows))
+        self._col_bits: Dict[Hashable, List[int]] = defaultdict(_EmptyBitsets(cols))
+        self._cell_keys: Dict[Tuple[int, int], Tuple[Hashable, ...]] = {}
+
+    # Whether the cells with the given key are indexed. Without a keys
+    # function only ANY is
+    def covers(self, key: Hashable) -> bool:
+        return key == ANY or self._keys is not None
+
+    def add(self, row: int, col: int, v: T):
+        keys = (ANY,) if self._keys is None else self._keys(v)
+        self._cell_keys[(row, col)] = keys
+        row_bit = 1 << row
+        col_bit = 1 << col
+        for key in keys:
+            self._row_bits[key][row] |= col_bit
+            self._col_bits[key][col] |= row_bit
+
+    def remove(self, row: int, col: int):
+        row_mask = ~(1 << row)
+        col_mask = ~(1 << col)
+        for key in self._cell_keys.pop((row, col)):
+            self._row_bits[key][row] &= col_mask
+            self._col_bits[key][col] &= row_mask
+
+    # Areas are added with one mask per row and column they cover
+    def add_area(self, area: Rectangle, v: T):
+        keys = (ANY,) if self._keys is None else self._keys(v)
+        self._cell_keys.update(dict.fromkeys(area.points(), keys))
+        self._set_area_bits(area, keys, True)
+
+    def remove_area(self, area: Rectangle):
+        keys: Set[Hashable] = set().union(*map(self._cell_keys.pop, area.points()))
+        self._set_area_bits(area, keys, False)
+
+    def _set_area_bits(self, area: Rectangle, keys, value: bool):
+        row_mask = ((1 << area.cols) - 1) << area.start_col
+        col_mask = ((1 << area.rows) - 1) << area.start_row
+        for key in keys:
+            row_bits = self._row_bits[key]
+            col_bits = self._col_bits[key]
+            for row in range(area.start_row, area.end_row + 1):
+                row_bits[row] = row_bits[row] | row_mask if value else row_bits[row] & ~row_mask
+            for col in range(area.start_col, area.end_col + 1):
+                col_bits[col] = col_bits[col] | col_mask if value else col_bits[col] & ~col_mask
+
+    def refresh_area(self, area: Rectangle, v: T):
+        self.remove_area(area)
+        self.add_area(area, v)
+
+    def move(self, row: int, col: int, new_row: int, new_col: int, v: T):
+        self.remove(row, col)
+        self.add(new_row, new_col, v)
+
+    def refresh(self, row: int, col: int, v: T):
+        self.remove(row, col)
+        self.add(row, col, v)
+
+    @staticmethod
+    def _lowest(bits: int, start: int, end: int) -> Optional[int]:
+        if start > end:
+            return None
+        bits = (bits >> start) & ((1 << (end - start + 1)) - 1)
+        if bits == 0:
+            return None
+        return start + (bits & -bits).bit_length() - 1
+
+    @staticmethod
+    def _highest(bits: int, start: int, end: int) -> Optional[int]:
+        if start > end:
+            return None
+        bits = (bits >> start) & ((1 << (end - start + 1)) - 1)
+        if bits == 0:
+            return None
+        return start + bits.bit_length() - 1
+
+    # Column of the first cell with the key in (col, col + max_checks]
+    def next_in_row(self, key: Hashable, row: int, col: int, max_checks: int) -> Optional[int]:
+        if row < 0 or row >= self._rows or key not in self._row_bits:
+            return None
+        return self._lowest(self._row_bits[key][row], max(col + 1, 0), min(col + max_checks, self._cols - 1))
+
+    # Column of the last cell with the key in [col - max_checks, col)
+    def prev_in_row(self, key: Hashable, row: int, col: int, max_checks: int) -> Optional[int]:
+        if row < 0 or row >= self._rows or key not in self._row_bits:
+            return None
+        return self._highest(self._row_bits[key][row], max(col - max_checks, 0), min(col - 1, self._cols - 1))
+
+    def next_in_col(self, key: Hashable, row: int, col: int, max_checks: int) -> Optional[int]:
+        if col < 0 or col >= self._cols or key not in self._col_bits:
+            return None
+        return self._lowest(self._col_bits[key][col], max(row + 1, 0), min(row + max_checks, self._rows - 1))
+
+    def prev_in_col(self, key: Hashable, row: int, col: int, max_checks: int) -> Optional[int]:
+        if col < 0 or col >= self._cols or key not in self._col_bits:
+            return None
+        return self._highest(self._col_bits[key][col], max(row - max_checks, 0), min(row - 1, self._rows - 1))
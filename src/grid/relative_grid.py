@@ -1,4 +1,4 @@
-from typing import TypeVar, Generic, Optional, Callable
+from typing import TypeVar, Generic, Optional, Callable, Tuple
 
 from .grid import Grid, CellAlreadyFill
 
@@ -63,9 +63,6 @@ class RelativeGrid(Generic[T]):
         return 0 <= row < self._grid.rows and 0 <= col < self._grid.cols
 
     def get_prev(self, displacement: RelativePosition, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[T]:
-        if f is None:
-            f = lambda _: True
-
         row, col = displacement.apply(self._facing, self._center)
         if self._facing == "East":
             return self._grid.get_prev(row, col, f, max_checks)
@@ -77,9 +74,6 @@ class RelativeGrid(Generic[T]):
             return self._grid.get_vertically_prev(row, col, f, max_checks)
         
     def get_next(self, displacement: RelativePosition, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[T]:
-        if f is None:
-            f = lambda _: True
-
         row, col = displacement.apply(self._facing, self._center)
         if self._facing == "East":
             return self._grid.get_next(row, col, f, max_checks)
@@ -92,8 +86,6 @@ class RelativeGrid(Generic[T]):
         
         
     def calc_dist_to_next(self, displacement: RelativePosition, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[int]:
-        if f is None:
-            f = lambda _: True
         row, col = displacement.apply(self._facing, self._center)
         if self._facing == "East":
             return self._grid.calc_dist_to_next(row, col, f, max_checks)
@@ -105,8 +97,6 @@ class RelativeGrid(Generic[T]):
             return self._grid.calc_dist_to_vertically_next(row, col, f, max_checks)
         
     def calc_dist_to_prev(self, displacement: RelativePosition, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[int]:
-        if f is None:
-            f = lambda _: True
         row, col = displacement.apply(self._facing, self._center)
         if self._facing == "East":
             return self._grid.calc_dist_to_prev(row, col, f, max_checks)
@@ -117,14 +107,72 @@ class RelativeGrid(Generic[T]):
         elif self._facing == "South":
             return self._grid.calc_dist_to_vertically_prev(row, col, f, max_checks)
         
+    # Distance to the next entity matching f together with the entity
+    def find_next(self, displacement: RelativePosition, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[Tuple[int, T]]:
+        row, col = displacement.apply(self._facing, self._center)
+        if self._facing == "East":
+            return self._grid.find_next(row, col, f, max_checks)
+        elif self._facing == "West":
+            return self._grid.find_prev(row, col, f, max_checks)
+        elif self._facing == "North":
+            return self._grid.find_vertically_prev(row, col, f, max_checks)
+        elif self._facing == "South":
+            return self._grid.find_vertically_next(row, col, f, max_checks)
+
+    def find_prev(self, displacement: RelativePosition, f: Callable[[T], bool] = None, max_checks: int = None) -> Optional[Tuple[int, T]]:
+        row, col = displacement.apply(self._facing, self._center)
+        if self._facing == "East":
+            return self._grid.find_prev(row, col, f, max_checks)
+        elif self._facing == "West":
+            return self._grid.find_next(row, col, f, max_checks)
+        elif self._facing == "North":
+            return self._grid.find_vertically_next(row, col, f, max_checks)
+        elif self._facing == "South":
+            return self._grid.find_vertically_prev(row, col, f, max_checks)
+
     def calc_dist_to_zone(self, displacement: RelativePosition, zone: Rectangle) -> Optional[int]:
         row, col = displacement.apply(self._facing, self._center)
         return zone.distance_to((row, col))
 
+    # Area spanned between the center and the displaced position
+    def area(self, displacement: RelativePosition) -> Rectangle:
+        return Rectangle.spanning(self._center, displacement.apply(self._facing, self._center))
+
+    # Fills area with obj, anchored at the center
+    def fill_area(self, area: Rectangle, obj: T):
+        for corner in (area.upper_left, area.lower_right):
+            if not self._bounds.is_inside(corner):
+                raise Exception(f"Attempted to fill an out of bounds area {area} - Bounds: {self._bounds}")
+
+        self._grid.fill_area(area, obj, self._center)
+
+    def clear_area(self, area: Rectangle):
+        self._grid.clear_area(area)
+
+    def refresh_area(self, area: Rectangle):
+        self._grid.refresh_area(area)
+
+    # Moves area together with the center, returns the displaced area
+    def move_area(self, area: Rectangle, displacement: RelativePosition) -> Rectangle:
+        if displacement.is_still():
+            return area
+
+        if not self.is_inbounds(displacement):
+            raise Exception(f"Attempted to move out of bounds cell {displacement.apply(self._facing, self._center)} - Bounds: {self._bounds}")
+
+        row, col = displacement.apply(self._facing, self._center)
+        new_area = self._grid.move_area(area, row - self._center[0], col - self._center[1])
+        self._center = (row, col)
+        return new_area
+
     def clear(self, displacement: RelativePosition = RelativePosition.still()):
         row, col = displacement.apply(self._facing, self._center)
         self._grid.clear(row, col)
 
+    def refresh(self, displacement: RelativePosition = RelativePosition.still()):
+        row, col = displacement.apply(self._facing, self._center)
+        self._grid.refresh(row, col)
+
     def move(self, displacement: RelativePosition):
         if displacement.is_still():
             return
@@ -139,13 +187,11 @@ class RelativeGrid(Generic[T]):
         if self.is_fill(displacement):
             raise CellAlreadyFill(*displacement.apply(self._facing, self._center))
         
-        me = self._grid.get_value(self._center[0], self._center[1])
         row, col = displacement.apply(self._facing, self._center)
         try:
-            self._grid.fill(row, col, me)
+            self._grid.move(self._center[0], self._center[1], row, col)
         except CellAlreadyFill:
             displacement.decrease()
             return self.move(displacement)
 
-        self._grid.clear(self._center[0], self._center[1])
         self._center = (row, col)
\ No newline at end of file
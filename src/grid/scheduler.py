@@ -0,0 +1,90 @@
+from abc import ABC, abstractmethod
+from typing import TypeVar, Generic, Callable, Iterator, Tuple, Any, TYPE_CHECKING
+
+from directions import direction_code
+from generator.tp_generator import randint, choice, skip, UPDATE_ORDER
+from rectangle import Point
+
+if TYPE_CHECKING:
+    from .grid import Grid
+
+T = TypeVar("T")
+
+ORDER_SOURCE = (UPDATE_ORDER, 0)
+
+# Decides the order in which Grid.apply visits the entities. The order is
+# produced lazily, since the visited entities may draw random numbers too
+# and the draws of both have to interleave the same way on every run
+class UpdateScheduler(ABC, Generic[T]):
+    @abstractmethod
+    def order(self, grid: "Grid[T]") -> Iterator[Tuple[Point, T]]:
+        pass
+
+    # Draws the random numbers that times orders of the grid would, without
+    # producing them
+    def skip(self, grid: "Grid[T]", times: int):
+        pass
+
+# Uniformly random order built with a Fisher-Yates shuffle of the registry,
+# drawing one number per position
+class ShuffleScheduler(UpdateScheduler[T]):
+    def order(self, grid: "Grid[T]") -> Iterator[Tuple[Point, T]]:
+        values = grid.entities()
+        n = len(values)
+        for i in range(n - 1):
+            j = randint(i, n, ORDER_SOURCE)
+            values[i], values[j] = values[j], values[i]
+            yield values[i]
+        if n > 0:
+            yield values[-1]
+
+    def skip(self, grid: "Grid[T]", times: int):
+        skip(times * max(grid.entity_count - 1, 0), ORDER_SOURCE)
+
+# Compatibility mode: reproduces the order of the original Grid.apply, which
+# picked cells with choice() out of a row-major scan of every filled cell,
+# every cell of a vehicle included, and removed them from the list one at
+# a time. Only the cell a value is registered at runs it.
+# Runs seeded before the registry existed give the same results with it,
+# at the cost of its quadratic time and of the bias of choice(), which
+# never picks the last cell while more than one is left
+class LegacyScheduler(UpdateScheduler[T]):
+    def order(self, grid: "Grid[T]") -> Iterator[Tuple[Point, T]]:
+        registered = {id(v): pos for pos, v in grid.entities()}
+        values = grid.cells()
+        while len(values) > 0:
+            cell = choice(values, ORDER_SOURCE)
+            values.remove(cell)
+            pos, value = cell
+            if registered.get(id(value)) == pos:
+                yield cell
+
+    # One draw per filled cell, the last one included
+    def skip(self, grid: "Grid[T]", times: int):
+        skip(times * len(grid.cells()), ORDER_SOURCE)
+
+# Deterministic order given by sorting the entities with a key
+class OrderedScheduler(UpdateScheduler[T]):
+    def __init__(self, key: Callable[[Point, T], Any]):
+        self._key = key
+
+    def order(self, grid: "Grid[T]") -> Iterator[Tuple[Point, T]]:
+        values = grid.entities()
+        values.sort(key=lambda cell: self._key(*cell))
+        return iter(values)
+
+def _front_to_back_key(pos: Point, entity) -> Tuple[int, int]:
+    row, col = pos
+    progress = {
+        "East": col,
+        "West": -col,
+        "North": -row,
+        "South": row,
+    }[entity.facing]
+    return direction_code(entity.facing), -progress
+
+# Updates the entities of each facing starting from the one furthest ahead,
+# so every entity of a lane moves after the ones in front of it
+class FrontToBackScheduler(OrderedScheduler[T]):
+    def __init__(self):
+        super().__init__(_front_to_back_key)
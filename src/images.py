@@ -1,29 +1,74 @@
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, NamedTuple
 import matplotlib.pyplot as plt
-from matplotlib.image import AxesImage
-
-squares = {
-    "⬛": plt.imread("resources/squares/black.png"),
-    "🟦": plt.imread("resources/squares/blue.png"),
-    "🟫": plt.imread("resources/squares/brown.png"),
-    "🟩": plt.imread("resources/squares/green.png"),
-    "🟥": plt.imread("resources/squares/red.png"),
-    "⬜": plt.imread("resources/squares/white.png"),
-    "🟪": plt.imread("resources/squares/purple.png"),
-    "🟨": plt.imread("resources/squares/yellow.png"),
-    "🟧": plt.imread("resources/squares/orange.png"),
-    "🔳": plt.imread("resources/squares/waiting_zone.png"),
+import numpy as np
+
+RESOURCES_DIR = Path(__file__).resolve().parent.parent / "resources"
+
+SQUARE_FILES = {
+    "⬛": "squares/black.png",
+    "🟦": "squares/blue.png",
+    "🟫": "squares/brown.png",
+    "🟩": "squares/green.png",
+    "🟥": "squares/red.png",
+    "⬜": "squares/white.png",
+    "🟪": "squares/purple.png",
+    "🟨": "squares/yellow.png",
+    "🟧": "squares/orange.png",
+    "🔳": "squares/waiting_zone.png",
 }
 
-faces = {
-    "😀": plt.imread("resources/faces/smiling.png"),
-    "😁": plt.imread("resources/faces/smiling2.png"),
-    "🤔": plt.imread("resources/faces/thinking.png"),
-    "😶": plt.imread("resources/faces/without_mouth.png"),
-    "🙄": plt.imread("resources/faces/white_eyes.png"),
-    "😎": plt.imread("resources/faces/sunglasses.png"),
-    "😐": plt.imread("resources/faces/neutral.png"),
-    "😰": plt.imread("resources/faces/anxiety.png"),
+FACE_FILES = {
+    "😀": "faces/smiling.png",
+    "😁": "faces/smiling2.png",
+    "🤔": "faces/thinking.png",
+    "😶": "faces/without_mouth.png",
+    "🙄": "faces/white_eyes.png",
+    "😎": "faces/sunglasses.png",
+    "😐": "faces/neutral.png",
+    "😰": "faces/anxiety.png",
 }
 
-def place_image(ax: plt.Axes, img, x, y) -> AxesImage:
-    return ax.imshow(img, extent=[x, x + 1, y, y + 1])
\ No newline at end of file
+# Images are read the first time they are needed, relative to the
+# repository instead of the working directory
+@lru_cache(maxsize=None)
+def _load_image(path: str):
+    return plt.imread(RESOURCES_DIR / path)
+
+def square(emoji: str):
+    return _load_image(SQUARE_FILES[emoji])
+
+def face(emoji: str):
+    return _load_image(FACE_FILES[emoji])
+
+# Side in pixels of a cell of a raster
+SPRITE_PIXELS = int(os.environ.get("SPRITE_PIXELS", 32))
+
+# Every sprite resampled to pixels x pixels, stacked in a single RGBA array
+# and found by its emoji in index
+class SpriteAtlas(NamedTuple):
+    pixels: int
+    sprites: np.ndarray
+    index: Dict[str, int]
+
+# Sprites larger than the cell by a whole factor are averaged over the
+# pixels that fall in each one, the rest take the nearest pixel
+def _resample(img: np.ndarray, pixels: int) -> np.ndarray:
+    if img.shape[2] == 3:
+        img = np.concatenate([img, np.ones(img.shape[:2] + (1,), dtype=img.dtype)], axis=2)
+    rows, cols, _ = img.shape
+    if rows % pixels == 0 and cols % pixels == 0:
+        return img.reshape(pixels, rows // pixels, pixels, cols // pixels, 4).mean(axis=(1, 3))
+    row_idx = ((np.arange(pixels) + 0.5) * rows / pixels).astype(int)
+    col_idx = ((np.arange(pixels) + 0.5) * cols / pixels).astype(int)
+    return img[np.ix_(row_idx, col_idx)]
+
+# The files are upside down, as imshow drew each of them with the y axis
+# pointing down
+@lru_cache(maxsize=None)
+def sprite_atlas(pixels: int = SPRITE_PIXELS) -> SpriteAtlas:
+    files = {**SQUARE_FILES, **FACE_FILES}
+    sprites = np.stack([_resample(_load_image(path)[::-1], pixels) for path in files.values()]).astype(np.float32)
+    return SpriteAtlas(pixels, sprites, {emoji: i for i, emoji in enumerate(files)})
@@ -0,0 +1,111 @@
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+DEFAULT_INSTRUMENT_DIR = "results/instrumentation"
+# Allocation sites kept in a tracemalloc capture
+TRACEMALLOC_TOP = 50
+
+# Phases of a tick of Automata.update, in the order they run
+PHASES = ("light", "waiting_areas", "think", "move", "lanes", "plotter")
+
+PROFILERS = ("cprofile", "tracemalloc")
+
+# Opt-in counters of a run: the time spent in every phase of a tick, the
+# queries the grid answers from its occupancy index or by scanning cells,
+# and the entities on the grid. A run without them only pays a None check
+# per tick and per grid query
+class RunStats:
+    def __init__(self):
+        self.ticks = 0
+        self.skipped_ticks = 0
+        self.phase_seconds: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.index_queries: Dict[str, int] = defaultdict(int)
+        self.scan_queries: Dict[str, int] = defaultdict(int)
+        self.scanned_cells: Dict[str, int] = defaultdict(int)
+        self.entity_ticks = 0
+        self.max_entities = 0
+
+    def run_tick(self, phases: Sequence[Tuple[str, Callable[[], None]]], entity_count: Callable[[], int]):
+        for name, phase in phases:
+            start = time.perf_counter()
+            phase()
+            self.phase_seconds[name] += time.perf_counter() - start
+        self.ticks += 1
+        entities = entity_count()
+        self.entity_ticks += entities
+        self.max_entities = max(self.max_entities, entities)
+
+    # Ticks skipped by the fast forward still count their entities, which
+    # stay the same all along
+    def skip_ticks(self, ticks: int, skip: Callable[[int], None], entity_count: Callable[[], int]):
+        start = time.perf_counter()
+        skip(ticks)
+        self.phase_seconds["fast_forward"] = self.phase_seconds.get("fast_forward", 0.0) + time.perf_counter() - start
+        self.skipped_ticks += ticks
+        self.entity_ticks += ticks * entity_count()
+
+    def count_index_query(self, query: str):
+        self.index_queries[query] += 1
+
+    # Cells are the ones a scan visits up to its first match
+    def count_scan(self, query: str, cells: int):
+        self.scan_queries[query] += 1
+        self.scanned_cells[query] += cells
+
+    def to_dict(self) -> dict:
+        ticks = self.ticks + self.skipped_ticks
+        return {
+            "ticks": ticks,
+            "skipped_ticks": self.skipped_ticks,
+            "phase_seconds": self.phase_seconds,
+            "index_queries": dict(self.index_queries),
+            "scan_queries": dict(self.scan_queries),
+            "scanned_cells": dict(self.scanned_cells),
+            "mean_entities": self.entity_ticks / ticks if ticks > 0 else 0.0,
+            "max_entities": self.max_entities,
+        }
+
+def save_json(data: dict, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+# Captures what runs inside it with cProfile, written as a .prof file that
+# pstats and snakeviz read, or with tracemalloc, written as the lines that
+# allocated the most. Nothing is captured without a profiler
+@contextmanager
+def capture(profiler: Optional[str], path: str) -> Iterator[None]:
+    if profiler is None:
+        yield
+        return
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler {profiler}, expected one of {list(PROFILERS)}")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    if profiler == "cprofile":
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(f"{path}.prof")
+        return
+
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(f"{path}.tracemalloc.txt", "w") as f:
+            f.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n")
+            for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]:
+                f.write(f"{stat}\n")
@@ -0,0 +1,471 @@
+from typing import List, Tuple, Optional
+import numpy as np
+
+from config import Config
+from rectangle import Rectangle
+from directions import direction_code
+
+# Contents of the cells of the stacked grids
+EMPTY = 0
+# Pedestrian that hasn't started crossing
+WAITING = 1
+CROSSING_EAST = 2
+CROSSING_WEST = 3
+VEHICLE = 4
+
+# Kinds of the entity slots
+FREE_SLOT = 0
+PEDESTRIAN_SLOT = 1
+VEHICLE_SLOT = 2
+
+EAST = direction_code("East")
+WEST = direction_code("West")
+NORTH = direction_code("North")
+SOUTH = direction_code("South")
+
+# One step forward and one to the right for every facing, by direction
+# code, as RelativePosition.apply moves them
+FORWARD = np.array([[0, 1], [0, -1], [-1, 0], [1, 0]])
+RIGHT = np.array([[1, 0], [-1, 0], [0, 1], [0, -1]])
+
+# The constants of the scalar entities
+PEDESTRIAN_RUNNING_VELOCITY = 6
+PEDESTRIAN_LOOK_BEHIND = 6
+VELOCITY_THRESHOLDS = np.array([0.273, 0.793, 0.93, 0.978])
+VEHICLE_VELOCITY = 10
+MAX_WAITING_PEDESTRIANS = 100
+
+UPDATE_ORDERS = ("shuffle", "front_to_back")
+
+# Changed whenever a change to the lockstep engine alters the outcome of
+# seeded runs. Its runs never share stored results with the ones of Automata
+ENGINE_VERSION = "lockstep-1"
+
+# Runs one replica of Automata per pair of arrival rates, all of them on the
+# geometry of the same config, advancing them together: the grids are
+# stacked in (replica, row, col) arrays and every step of a tick works on
+# all the replicas at once.
+#
+# The outcome of a replica follows the same distribution as the one of
+# Automata, not the same numbers, since the random numbers are drawn for
+# all the replicas at a time from a NumPy generator. Thinking only reads
+# the grid, so all the entities think at once. Moving doesn't, so the
+# entities still move one at a time in the order of the scheduler, but the
+# k-th one of every replica moves in the same step
+class LockstepAutomata:
+    def __init__(self,
+                 config: Config,
+                 pedestrian_arrival_rates: np.ndarray,
+                 vehicle_arrival_rates: np.ndarray,
+                 seed: Optional[int] = None):
+        if config.update_order not in UPDATE_ORDERS:
+            raise ValueError(f"Unknown update order {config.update_order} for the lockstep engine, expected one of {list(UPDATE_ORDERS)}")
+        if config.common_random_numbers:
+            raise ValueError("Common random numbers aren't supported by the lockstep engine")
+        if config.arrivals not in ("sampled", "poisson", "platoon"):
+            raise ValueError(f"Unknown arrivals {config.arrivals}, expected sampled, poisson or platoon")
+
+        self._config = config
+        self._light = config.new_stop_light()
+        self._rng = np.random.default_rng(seed)
+        self._pedestrian_rates = np.asarray(pedestrian_arrival_rates, dtype=float)
+        self._vehicle_rates = np.asarray(vehicle_arrival_rates, dtype=float)
+        if self._pedestrian_rates.shape != self._vehicle_rates.shape or self._pedestrian_rates.ndim != 1:
+            raise ValueError("Expected one pedestrian and one vehicle arrival rate per replica")
+        self._replicas = len(self._pedestrian_rates)
+        self._rows = config.total_rows
+        self._cols = config.total_cols
+
+        self.build_zones()
+        self.build_waiting_areas()
+        self.build_vehicle_lanes()
+
+        shape = (self._replicas, self._rows, self._cols)
+        self._codes = np.zeros(shape, dtype=np.int8)
+        self._ids = np.zeros(shape, dtype=np.int32)
+
+        # Enough slots for a pedestrian in every cell of the walking zone and
+        # every vehicle that fits in the lanes
+        lane_capacity = config.vehicle_lane_prot.rows // config.vehicle_prot.rows + 1
+        slots = self._walking_zone.rows * self._walking_zone.cols + len(self._lanes) * lane_capacity
+        slots_shape = (self._replicas, slots)
+        self._kind = np.zeros(slots_shape, dtype=np.int8)
+        self._row = np.zeros(slots_shape, dtype=np.int32)
+        self._col = np.zeros(slots_shape, dtype=np.int32)
+        self._facing = np.zeros(slots_shape, dtype=np.int8)
+        self._vel = np.zeros(slots_shape, dtype=np.int32)
+        self._crossing = np.zeros(slots_shape, dtype=bool)
+        self._lane = np.zeros(slots_shape, dtype=np.int32)
+        self._desired_forward = np.zeros(slots_shape, dtype=np.int32)
+        self._desired_right = np.zeros(slots_shape, dtype=np.int32)
+        # Order in which the entities were placed, it breaks the ties of the
+        # front to back order as the insertion order of the registry does
+        self._placed_at = np.zeros(slots_shape, dtype=np.int64)
+        self._placed = 0
+
+        self._waiting = np.zeros((self._replicas, len(self._waiting_areas)), dtype=np.int64)
+        self._waiting_vehicles = np.zeros((self._replicas, len(self._lanes)), dtype=np.int64)
+        self._conflicts = np.zeros(self._replicas, dtype=np.int64)
+        self._epoch = 0
+
+    def build_zones(self):
+        config = self._config
+        self._crosswalk_zone = Rectangle(config.crosswalk_prot.rows, config.crosswalk_prot.cols)
+        self._crosswalk_zone.move_down(config.vehicle_prot.rows)
+        self._crosswalk_zone.move_right(config.waiting_area_prot.cols)
+
+        if config.waiting_area_prot.cols > 0:
+            walking_zone = Rectangle(config.crosswalk_prot.rows, config.crosswalk_prot.cols + 2)
+            walking_zone.move_right(config.waiting_area_prot.cols - 1)
+        else:
+            walking_zone = Rectangle(config.crosswalk_prot.rows, config.crosswalk_prot.cols)
+        walking_zone.move_down(config.vehicle_prot.rows)
+        self._walking_zone = walking_zone
+
+    # Cells of every waiting area, in the order WaitingArea probes them
+    def build_waiting_areas(self):
+        zone = self._walking_zone
+        self._waiting_areas: List[np.ndarray] = []
+        for center, facing in ((zone.upper_left, EAST), (zone.lower_right, WEST)):
+            self._waiting_areas.append(np.array([np.add(center, RIGHT[facing] * i) for i in range(zone.rows)]))
+        self._waiting_area_facings = [EAST, WEST]
+
+    def build_vehicle_lanes(self):
+        config = self._config
+        width = config.vehicle_prot.cols
+        length = config.vehicle_prot.rows
+        lanes_amount = config.crosswalk_prot.cols // config.vehicle_lane_prot.cols
+
+        # Per lane: its zone, facing, whether its vehicles turn, the cells
+        # that have to be empty to place a vehicle and where it is placed
+        self._lanes: List[Tuple[Rectangle, int, bool, np.ndarray, np.ndarray, np.ndarray]] = []
+        for i in range(lanes_amount):
+            zone = config.vehicle_lane_prot.duplicate()
+            zone.move_right(config.waiting_area_prot.cols + i*zone.cols)
+            if i < lanes_amount//2:
+                facing, origin = SOUTH, zone.upper_right
+            else:
+                facing, origin = NORTH, zone.lower_left
+            turning = i == 0 or i == lanes_amount - 1
+
+            forward, right = FORWARD[facing], RIGHT[facing]
+            spawn_check = np.array([np.add(origin, right*col + forward*step)
+                                    for col in range(zone.cols)
+                                    for step in range(1, width + 1)])
+            spawn_check = spawn_check[self._inside_grid(spawn_check[:, 0], spawn_check[:, 1])]
+            vehicle_origin = np.add(origin, right * ((zone.cols - width) // 2))
+            driver = vehicle_origin + forward * (length - 1)
+            self._lanes.append((zone, facing, turning, spawn_check, driver, self._footprint(facing, driver)))
+
+        # Footprint cells and cells in front of a vehicle, relative to its
+        # driver, for every facing
+        self._footprints = np.zeros((4, width * length, 2), dtype=np.int32)
+        self._ahead = np.zeros((4, width, VEHICLE_VELOCITY, 2), dtype=np.int32)
+        for facing in range(4):
+            self._footprints[facing] = self._footprint(facing, np.zeros(2, dtype=np.int32))
+            for col in range(width):
+                for step in range(1, VEHICLE_VELOCITY + 1):
+                    self._ahead[facing, col, step - 1] = RIGHT[facing]*col + FORWARD[facing]*step
+        self._footprint_low = self._footprints.min(axis=1)
+        self._footprint_high = self._footprints.max(axis=1)
+        self._lane_bounds = np.array([[zone.start_row, zone.end_row, zone.start_col, zone.end_col]
+                                      for zone, *_ in self._lanes]).reshape(-1, 4)
+
+    def _footprint(self, facing: int, driver: np.ndarray) -> np.ndarray:
+        return np.array([driver + RIGHT[facing]*col - FORWARD[facing]*step
+                         for col in range(self._config.vehicle_prot.cols)
+                         for step in range(self._config.vehicle_prot.rows)])
+
+    @property
+    def replicas(self) -> int:
+        return self._replicas
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    @property
+    def conflicts(self) -> np.ndarray:
+        return self._conflicts
+
+    def _inside_grid(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        return (rows >= 0) & (rows < self._rows) & (cols >= 0) & (cols < self._cols)
+
+    @staticmethod
+    def _inside(zone: Rectangle, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        return (rows >= zone.start_row) & (rows <= zone.end_row) & (cols >= zone.start_col) & (cols <= zone.end_col)
+
+    # Contents of the cells (rows, cols) of the replicas r, cells outside of
+    # the grid are empty
+    def _code_at(self, r: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        inside = self._inside_grid(rows, cols)
+        codes = self._codes[r, np.clip(rows, 0, self._rows - 1), np.clip(cols, 0, self._cols - 1)]
+        return np.where(inside, codes, EMPTY)
+
+    def _arrivals(self, rates: np.ndarray) -> np.ndarray:
+        if self._config.arrivals == "platoon":
+            size = self._config.platoon_size
+            return size * self._rng.poisson(rates / size)
+        return self._rng.poisson(rates)
+
+    def _free_slots(self, r: np.ndarray) -> np.ndarray:
+        free = self._kind[r] == FREE_SLOT
+        if not free[np.arange(len(r)), free.argmax(axis=1)].all():
+            raise Exception("Ran out of entity slots")
+        return free.argmax(axis=1)
+
+    def _new_pedestrians(self, r: np.ndarray, rows: np.ndarray, cols: np.ndarray, facing: int):
+        s = self._free_slots(r)
+        self._kind[r, s] = PEDESTRIAN_SLOT
+        self._row[r, s] = rows
+        self._col[r, s] = cols
+        self._facing[r, s] = facing
+        # Same distribution as Pedestrian._generate_velocity
+        self._vel[r, s] = 2 + np.searchsorted(VELOCITY_THRESHOLDS, self._rng.random(len(r)), side="right")
+        self._crossing[r, s] = False
+        self._placed_at[r, s] = self._placed + np.arange(len(r))
+        self._placed += len(r)
+        self._codes[r, rows, cols] = WAITING
+        self._ids[r, rows, cols] = s
+
+    def _update_waiting_areas(self):
+        for a, cells in enumerate(self._waiting_areas):
+            waiting = self._waiting[:, a]
+            arrivals = self._arrivals(self._pedestrian_rates)
+            full = waiting == MAX_WAITING_PEDESTRIANS
+            waiting[:] = np.where(full, waiting, waiting + np.minimum(MAX_WAITING_PEDESTRIANS - waiting, arrivals))
+
+            # Every pedestrian is placed in a random cell, or the first free
+            # one after it
+            n_cells = len(cells)
+            while True:
+                free = self._codes[:, cells[:, 0], cells[:, 1]] == EMPTY
+                r = np.flatnonzero((waiting > 0) & free.any(axis=1))
+                if len(r) == 0:
+                    break
+                probes = (self._rng.integers(0, n_cells, len(r))[:, None] + np.arange(n_cells)) % n_cells
+                first_free = free[r[:, None], probes].argmax(axis=1)
+                cell = cells[probes[np.arange(len(r)), first_free]]
+                self._new_pedestrians(r, cell[:, 0], cell[:, 1], self._waiting_area_facings[a])
+                waiting[r] -= 1
+
+    def _update_vehicle_lanes(self):
+        for lane, (_, facing, _, spawn_check, driver, footprint) in enumerate(self._lanes):
+            self._waiting_vehicles[:, lane] += self._arrivals(self._vehicle_rates)
+            clear = (self._codes[:, spawn_check[:, 0], spawn_check[:, 1]] == EMPTY).all(axis=1)
+            r = np.flatnonzero((self._waiting_vehicles[:, lane] > 0) & clear)
+            if len(r) == 0:
+                continue
+            s = self._free_slots(r)
+            self._kind[r, s] = VEHICLE_SLOT
+            self._row[r, s] = driver[0]
+            self._col[r, s] = driver[1]
+            self._facing[r, s] = facing
+            self._vel[r, s] = VEHICLE_VELOCITY
+            self._crossing[r, s] = False
+            self._lane[r, s] = lane
+            self._placed_at[r, s] = self._placed + np.arange(len(r))
+            self._placed += len(r)
+            self._codes[r[:, None], footprint[:, 0], footprint[:, 1]] = VEHICLE
+            self._ids[r[:, None], footprint[:, 0], footprint[:, 1]] = s[:, None]
+            self._waiting_vehicles[r, lane] -= 1
+
+    # Keys giving the order of the scheduler, smallest first
+    def _order_keys(self) -> np.ndarray:
+        if self._config.update_order == "shuffle":
+            return self._rng.random(self._kind.shape)
+
+        # Front to back: by facing, then by progress along it, then by when
+        # they were placed
+        facing = self._facing.astype(np.int64)
+        progress = np.choose(facing, [self._col, -self._col, -self._row, self._row]).astype(np.int64)
+        span = 2 * (self._rows + self._cols) + 1
+        return ((facing * span + (span // 2 - progress)) << 32) + self._placed_at
+
+    # Whether the cells in front of the vehicles are taken, and whether the
+    # first one taken in some column is a pedestrian
+    def _look_ahead(self, r: np.ndarray, s: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        ahead = self._ahead[self._facing[r, s]]
+        rows = self._row[r, s][:, None, None] + ahead[..., 0]
+        cols = self._col[r, s][:, None, None] + ahead[..., 1]
+        codes = self._code_at(r[:, None, None], rows, cols)
+        filled = codes != EMPTY
+        first = np.take_along_axis(codes, filled.argmax(axis=2)[..., None], axis=2)[..., 0]
+        is_pedestrian = (first >= WAITING) & (first <= CROSSING_WEST)
+        return filled.any(axis=(1, 2)), (filled.any(axis=2) & is_pedestrian).any(axis=1)
+
+    def _think_vehicles(self):
+        r, s = np.nonzero(self._kind == VEHICLE_SLOT)
+        entity_ahead, _ = self._look_ahead(r, s)
+        turning = np.array([lane[2] for lane in self._lanes], dtype=bool)[self._lane[r, s]]
+        # Straight vehicles wait for the pedestrians to have red before
+        # entering the crosswalk, turning ones don't
+        go = ~entity_ahead & (turning | self._crossing[r, s] | self._light.is_red())
+        self._desired_forward[r, s] = np.where(go, VEHICLE_VELOCITY, 0)
+        self._desired_right[r, s] = 0
+
+    def _think_pedestrians(self, keys: np.ndarray):
+        r, s = np.nonzero(self._kind == PEDESTRIAN_SLOT)
+        n = len(r)
+        row, col, facing = self._row[r, s], self._col[r, s], self._facing[r, s]
+        forward, right = FORWARD[facing], RIGHT[facing]
+        same = np.where(facing == EAST, CROSSING_EAST, CROSSING_WEST)
+        opposite = np.where(facing == EAST, CROSSING_WEST, CROSSING_EAST)
+        red = self._light.is_red()
+        in_crosswalk = self._inside(self._crosswalk_zone, row, col)
+
+        # Pedestrians in the crosswalk run when the light turns red. Whether
+        # the others see them running depends on who thinks first
+        vel_before = self._vel.copy()
+        if red:
+            self._vel[r[in_crosswalk], s[in_crosswalk]] = PEDESTRIAN_RUNNING_VELOCITY
+        vel = self._vel[r, s]
+
+        steps = np.arange(1, max(PEDESTRIAN_RUNNING_VELOCITY, PEDESTRIAN_LOOK_BEHIND) + 1)
+
+        def window(rows, cols, direction, sign=1):
+            return (rows[:, None] + sign * direction[:, 0, None] * steps,
+                    cols[:, None] + sign * direction[:, 1, None] * steps)
+
+        ahead_row, ahead_col = row + forward[:, 0], col + forward[:, 1]
+        ahead = self._code_at(r, ahead_row, ahead_col)
+        can_move_forward = ~self._inside(self._walking_zone, ahead_row, ahead_col) | (ahead != same)
+
+        rows, cols = window(row, col, forward)
+        blocking = (self._code_at(r[:, None], rows, cols) == same[:, None]) & (steps <= vel[:, None])
+        forward_amount = np.where(blocking.any(axis=1), blocking.argmax(axis=1), vel)
+
+        def can_do_lateral_movement(side: int) -> np.ndarray:
+            lat_row, lat_col = row + side * right[:, 0], col + side * right[:, 1]
+            possible = ((ahead != EMPTY)
+                        & self._inside(self._walking_zone, lat_row, lat_col)
+                        & self._inside_grid(lat_row, lat_col)
+                        & (self._code_at(r, lat_row, lat_col) == EMPTY))
+
+            rows, cols = window(lat_row, lat_col, forward)
+            incoming = (self._code_at(r[:, None], rows, cols) == opposite[:, None]) & (steps <= vel[:, None])
+            possible &= ~incoming.any(axis=1)
+
+            rows, cols = window(lat_row, lat_col, forward, -1)
+            behind = (self._code_at(r[:, None], rows, cols) == same[:, None]) & (steps <= PEDESTRIAN_LOOK_BEHIND)
+            first = behind.argmax(axis=1)
+            prev = self._ids[r, np.clip(rows[np.arange(n), first], 0, self._rows - 1),
+                             np.clip(cols[np.arange(n), first], 0, self._cols - 1)]
+            prev_vel = np.where(keys[r, prev] < keys[r, s], self._vel[r, prev], vel_before[r, prev])
+            return possible & (~behind.any(axis=1) | (prev_vel < vel))
+
+        can_move_left = can_do_lateral_movement(-1)
+        can_move_right = can_do_lateral_movement(1)
+        to_left = self._rng.random(n) > 0.5
+        lateral = np.select([can_move_left & ~can_move_right,
+                             can_move_right & ~can_move_left,
+                             can_move_left & can_move_right],
+                            [-1, 1, np.where(to_left, -1, 1)], 0)
+
+        thinking = ~red | in_crosswalk
+        self._desired_forward[r, s] = np.where(thinking & can_move_forward, forward_amount, 0)
+        self._desired_right[r, s] = np.where(thinking & ~can_move_forward, lateral, 0)
+
+    def _remove_pedestrians(self, r: np.ndarray, s: np.ndarray):
+        self._codes[r, self._row[r, s], self._col[r, s]] = EMPTY
+        self._kind[r, s] = FREE_SLOT
+
+    def _move_pedestrians(self, r: np.ndarray, s: np.ndarray):
+        row, col, facing = self._row[r, s], self._col[r, s], self._facing[r, s]
+        forward, right = FORWARD[facing], RIGHT[facing]
+        amount, lateral = self._desired_forward[r, s], self._desired_right[r, s]
+        target_row = row + forward[:, 0]*amount + right[:, 0]*lateral
+        target_col = col + forward[:, 1]*amount + right[:, 1]*lateral
+
+        inbounds = self._inside(self._walking_zone, target_row, target_col) & self._inside_grid(target_row, target_col)
+        same = np.where(facing == EAST, CROSSING_EAST, CROSSING_WEST).astype(np.int8)
+        self._crossing[r[inbounds], s[inbounds]] = True
+        self._codes[r[inbounds], row[inbounds], col[inbounds]] = same[inbounds]
+
+        leaving = ~inbounds | ~self._inside(self._crosswalk_zone, target_row, target_col)
+        self._remove_pedestrians(r[leaving], s[leaving])
+
+        # Walk up to the furthest free cell on the way to the target, the
+        # ones in between don't matter
+        steps = np.arange(1, PEDESTRIAN_RUNNING_VELOCITY + 1)
+        rows = row[:, None] + forward[:, 0, None]*steps
+        cols = col[:, None] + forward[:, 1, None]*steps
+        free = (self._code_at(r[:, None], rows, cols) == EMPTY) & (steps <= amount[:, None])
+        walked = np.where(free, steps, 0).max(axis=1)
+        sidestep = (lateral != 0) & (self._code_at(r, target_row, target_col) == EMPTY)
+        new_row = np.where(lateral != 0, np.where(sidestep, target_row, row), row + forward[:, 0]*walked)
+        new_col = np.where(lateral != 0, np.where(sidestep, target_col, col), col + forward[:, 1]*walked)
+
+        moving = ~leaving & ((new_row != row) | (new_col != col))
+        r, s, row, col = r[moving], s[moving], row[moving], col[moving]
+        new_row, new_col = new_row[moving], new_col[moving]
+        self._codes[r, row, col] = EMPTY
+        self._codes[r, new_row, new_col] = same[moving]
+        self._ids[r, new_row, new_col] = s
+        self._row[r, s] = new_row
+        self._col[r, s] = new_col
+
+    def _move_vehicles(self, r: np.ndarray, s: np.ndarray):
+        facing, amount = self._facing[r, s], self._desired_forward[r, s]
+        row, col = self._row[r, s], self._col[r, s]
+        _, pedestrian_ahead = self._look_ahead(r, s)
+
+        # A vehicle that would run into a pedestrian stops, and it is a
+        # conflict if it would have entered the crosswalk
+        move_row = row + FORWARD[facing, 0]*amount
+        move_col = col + FORWARD[facing, 1]*amount
+        zone = self._crosswalk_zone
+        enters_crosswalk = ((move_row + self._footprint_low[facing, 0] <= zone.end_row)
+                            & (zone.start_row <= move_row + self._footprint_high[facing, 0])
+                            & (move_col + self._footprint_low[facing, 1] <= zone.end_col)
+                            & (zone.start_col <= move_col + self._footprint_high[facing, 1]))
+        np.add.at(self._conflicts, r[pedestrian_ahead & enters_crosswalk], 1)
+
+        bounds = self._lane_bounds[self._lane[r, s]]
+        inbounds = ((move_row >= bounds[:, 0]) & (move_row <= bounds[:, 1])
+                    & (move_col >= bounds[:, 2]) & (move_col <= bounds[:, 3])
+                    & self._inside_grid(move_row, move_col))
+        going = ~pedestrian_ahead
+        footprint = self._footprints[facing]
+        self._codes[r[going, None], row[going, None] + footprint[going, :, 0], col[going, None] + footprint[going, :, 1]] = EMPTY
+
+        leaving = going & ~inbounds
+        self._kind[r[leaving], s[leaving]] = FREE_SLOT
+
+        moving = going & inbounds
+        r, s = r[moving], s[moving]
+        new_row, new_col, footprint = move_row[moving], move_col[moving], footprint[moving]
+        self._codes[r[:, None], new_row[:, None] + footprint[..., 0], new_col[:, None] + footprint[..., 1]] = VEHICLE
+        self._ids[r[:, None], new_row[:, None] + footprint[..., 0], new_col[:, None] + footprint[..., 1]] = s[:, None]
+        self._row[r, s] = new_row
+        self._col[r, s] = new_col
+        self._crossing[r, s] = True
+
+    def _move(self, keys: np.ndarray):
+        movers = (self._kind != FREE_SLOT) & ((self._desired_forward != 0) | (self._desired_right != 0))
+        counts = movers.sum(axis=1)
+        if counts.max(initial=0) == 0:
+            return
+        order = np.argsort(np.where(movers, keys, np.inf), axis=1, kind="stable")
+        for k in range(counts.max()):
+            r = np.flatnonzero(counts > k)
+            s = order[r, k]
+            pedestrian = self._kind[r, s] == PEDESTRIAN_SLOT
+            self._move_pedestrians(r[pedestrian], s[pedestrian])
+            self._move_vehicles(r[~pedestrian], s[~pedestrian])
+
+    def update(self):
+        self._light.update()
+        self._update_waiting_areas()
+
+        keys = self._order_keys()
+        self._think_pedestrians(keys)
+        self._think_vehicles()
+        self._move(keys if self._config.update_order == "front_to_back" else self._order_keys())
+
+        self._update_vehicle_lanes()
+        self._epoch += 1
+
+    def advance_to(self, epoch: int):
+        while self._epoch < epoch:
+            self.update()
@@ -1,20 +1,48 @@
 import time
 from automata import Automata
+from instrumentation import DEFAULT_INSTRUMENT_DIR, capture, save_json
+from frame_sink import DEFAULT_ANIMATION_FILE, DEFAULT_ANIMATION_FPS
+from terminal import DEFAULT_TERMINAL_FPS, TerminalRenderer
+from dotenv import load_dotenv
 import os
 
-def clear_output():
-    os.system('cls' if os.name == 'nt' else 'clear')
+load_dotenv()
+
+# Counters and profiles of the animated run, as INSTRUMENT, PROFILE and
+# INSTRUMENT_DIR in run_scenario.py
+INSTRUMENT = os.environ.get("INSTRUMENT", "0") == "1"
+PROFILE = os.environ.get("PROFILE") or None
+INSTRUMENT_DIR = os.environ.get("INSTRUMENT_DIR", DEFAULT_INSTRUMENT_DIR)
+# The animation is written as it runs, an .mp4 through ffmpeg or a .gif
+ANIMATION_FILE = os.environ.get("ANIMATION_FILE", DEFAULT_ANIMATION_FILE)
+ANIMATION_FPS = int(os.environ.get("ANIMATION_FPS", DEFAULT_ANIMATION_FPS))
+ANIMATION_TICKS = int(os.environ.get("ANIMATION_TICKS", 600))
+# Ticks run per second, 0 to run them as fast as they go, and frames drawn
+# per second on the terminal, whatever the speed of the ticks
+SIMULATION_SPEED = float(os.environ.get("SIMULATION_SPEED", 5))
+TERMINAL_FPS = float(os.environ.get("TERMINAL_FPS", DEFAULT_TERMINAL_FPS))
+# The entities of every tick are recorded to TRAJECTORY_FILE when it is
+# set, to be replayed by replay.py
+TRAJECTORY_FILE = os.environ.get("TRAJECTORY_FILE") or None
 
 def main():
-    automata = Automata(animate=True)
-    for i in range(600):
-        automata.update()
-        clear_output()
-        automata.show()
-        time.sleep(0.2)
+    automata = Automata(animate=True, instrument=INSTRUMENT, animation_file=ANIMATION_FILE,
+                        animation_fps=ANIMATION_FPS, trajectory_file=TRAJECTORY_FILE)
+    renderer = TerminalRenderer(fps=TERMINAL_FPS)
+    start = time.monotonic()
+    with capture(PROFILE, os.path.join(INSTRUMENT_DIR, "animation")):
+        for i in range(ANIMATION_TICKS):
+            automata.update()
+            if renderer.due() or i == ANIMATION_TICKS - 1:
+                automata.show(renderer)
+            if SIMULATION_SPEED > 0:
+                time.sleep(max(0.0, start + (i + 1) / SIMULATION_SPEED - time.monotonic()))
+    renderer.close()
+    automata.close_trajectory()
+    if INSTRUMENT:
+        save_json(automata.stats(), os.path.join(INSTRUMENT_DIR, "animation.json"))
 
-    print("Saving animation, this may take a while...")
-    automata.save_mp4("animation.mp4")
+    print(f"Animation saved in {automata.save_animation()}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
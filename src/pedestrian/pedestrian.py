@@ -1,16 +1,13 @@
 from typing import List
-import matplotlib.pyplot as plt
-from matplotlib.image import AxesImage
-
-from images import faces, place_image
 
 from directions import Direction
 from grid.relative_grid import RelativeGrid
-from generator.tp_generator import random, choice
+from grid.cell_filter import crossing_facing
+from generator.tp_generator import random, choice, PEDESTRIAN_VELOCITY, LATERAL_MOVEMENT, APPEARANCE
 from relative_position import forward, left, right, still, RelativePosition
 from directions import opposite_direction
 from stoplight import StopLight
-from rectangle import Rectangle
+from rectangle import Point, Rectangle
 
 from road_entity import RoadEntity
 
@@ -28,7 +25,7 @@ class Pedestrian(RoadEntity):
         if repr is not None:
             self._repr = repr
         else:
-            self._repr = choice(["😀", "😁", "🤔", "😶", "🙄", "😎", "😐"])
+            self._repr = choice(["😀", "😁", "🤔", "😶", "🙄", "😎", "😐"], (APPEARANCE, 0))
 
     @property
     def facing(self) -> Direction:
@@ -44,7 +41,7 @@ class Pedestrian(RoadEntity):
         return self._repr
 
     def _generate_velocity(self) -> int:
-        p = random()
+        p = random((PEDESTRIAN_VELOCITY, 0))
         
         if p > 0.978:
             return 6
@@ -61,8 +58,7 @@ class Pedestrian(RoadEntity):
         if not self._rel_grid.is_inbounds(forward(1)):
             return True
         
-        dist_to_next =  self._rel_grid.calc_dist_to_next(still(), lambda ent: ent.is_crossing() and\
-                                                         ent.facing == self.facing, 1)
+        dist_to_next =  self._rel_grid.calc_dist_to_next(still(), crossing_facing(self.facing), 1)
         return dist_to_next is None
     
     def can_do_lateral_movement(self, to_right: bool) -> bool:
@@ -77,17 +73,14 @@ class Pedestrian(RoadEntity):
         if self._rel_grid.is_fill(displacement):
             return False
         
-        dist = self._rel_grid.calc_dist_to_next(displacement, lambda ent: ent.is_crossing() and\
-                                                ent.facing == opposite_direction(self.facing), self._vel)
+        dist = self._rel_grid.calc_dist_to_next(displacement, crossing_facing(opposite_direction(self.facing)), self._vel)
         if dist is not None:
             return False
         
-        dist_to_prev = self._rel_grid.calc_dist_to_prev(displacement, lambda ent: ent.is_crossing() and\
-                                                        ent.facing == self.facing, 6)
-        if dist_to_prev is None:
+        found = self._rel_grid.find_prev(displacement, crossing_facing(self.facing), 6)
+        if found is None:
             return True
-        prev = self._rel_grid.get_prev(displacement, lambda ent: ent.is_crossing() and\
-                                       ent.facing == self.facing, 6)
+        _, prev = found
         
         return prev._vel < self._vel
     
@@ -98,14 +91,13 @@ class Pedestrian(RoadEntity):
         return self.can_do_lateral_movement(True)
 
     def _get_pos_forward(self) -> RelativePosition:
-        dist_to_next = self._rel_grid.calc_dist_to_next(still(), lambda ent: ent.is_crossing() and\
-                                                        ent.facing == self.facing)
+        dist_to_next = self._rel_grid.calc_dist_to_next(still(), crossing_facing(self.facing))
         if dist_to_next is None or dist_to_next > self._vel:
             return forward(self._vel)
         return forward(dist_to_next)
     
     def _get_pos_left_right_random(self) -> RelativePosition:
-        p = random()
+        p = random((LATERAL_MOVEMENT, 0))
         if p > 0.5:
             return left(1)
         else:
@@ -142,7 +134,9 @@ class Pedestrian(RoadEntity):
             return False
         if self._desired_displacement.is_still():
             return False
-        self._crossing = True
+        if not self._crossing:
+            self._crossing = True
+            self._rel_grid.refresh()
         if not self._rel_grid.new_displaced(self._desired_displacement).is_in(crosswalk_zone):
             self._rel_grid.clear()
             return False
@@ -156,6 +150,8 @@ class Pedestrian(RoadEntity):
         self._rel_grid.move(self._desired_displacement)
         return False
     
-    def plot_in_ax(self, ax: plt.Axes) -> List[AxesImage]:
-        img = place_image(ax, faces[self._repr], self._rel_grid._center[1], self._rel_grid._center[0])
-        return [img]
\ No newline at end of file
+    def cells(self) -> List[Point]:
+        return [self._rel_grid._center]
+
+    def footprint(self) -> Rectangle:
+        return Rectangle.spanning(self._rel_grid._center, self._rel_grid._center)
\ No newline at end of file
@@ -1,25 +1,28 @@
 from typing import Optional
 
 from pedestrian.pedestrian import Pedestrian
-from generator.tp_generator import poi, randint
+from generator.tp_generator import randint, Source
+from arrivals.arrival_schedule import ArrivalSchedule
 from grid.relative_grid import RelativeGrid
 from relative_position import right
 from stoplight import StopLight
 
 
 class WaitingArea:
-    def __init__(self, arrival_rate: float, rel_grid: RelativeGrid, max_size: int = 100):
+    def __init__(self, arrivals: ArrivalSchedule, rel_grid: RelativeGrid, max_size: int = 100, placement: Optional[Source] = None):
         self._rel_grid = rel_grid
+        self._placement = placement
         self._waiting_pedestrians = 0
-        self._arrival_rate = arrival_rate
+        self._arrivals = arrivals
         self._total_generated_pedestrians = 0
         self._max_size = max_size
 
     def _generate_pedestrians(self):
         if self._waiting_pedestrians == self._max_size:
+            self._arrivals.skip()
             return
         
-        new_pedestrians = min(self._max_size - self._waiting_pedestrians, poi(self._arrival_rate))
+        new_pedestrians = min(self._max_size - self._waiting_pedestrians, self._arrivals.next())
         self._waiting_pedestrians += new_pedestrians
         self._total_generated_pedestrians += new_pedestrians
 
@@ -33,7 +36,7 @@ class WaitingArea:
     def _place_pedestrian(self):
         rows = self._rel_grid.rows
         
-        possible_pos = randint(0, rows)
+        possible_pos = randint(0, rows, self._placement)
         while self._rel_grid.is_fill(right(possible_pos)):
             possible_pos = (possible_pos + 1) % rows
 
@@ -46,6 +49,21 @@ class WaitingArea:
         while self._waiting_pedestrians > 0 and self._can_place_pedestrian():
             self._place_pedestrian()
 
+    # Ticks, up to limit, in which the area is sure to place no pedestrian
+    # as long as the grid doesn't change. Arrivals that can't be placed
+    # only queue up. The schedule is looked up before the grid, which is
+    # the costly check
+    def idle_ticks(self, limit: int) -> int:
+        ticks = 0 if self._waiting_pedestrians > 0 else self._arrivals.idle_ticks(limit)
+        if ticks == limit or self._can_place_pedestrian():
+            return ticks
+        return self._arrivals.known_ticks(limit)
+
+    # The same as ticks updates that place no pedestrian
+    def skip(self, ticks: int):
+        for _ in range(ticks):
+            self._generate_pedestrians()
+
     def update(self, pedestrian_stop_light: Optional[StopLight] = None):
         self._generate_pedestrians()
         if pedestrian_stop_light is None or pedestrian_stop_light.is_green():
@@ -1,17 +1,24 @@
+import os
+import shutil
 import matplotlib.pyplot as plt
-from matplotlib.image import AxesImage
-from matplotlib.animation import ArtistAnimation, FuncAnimation
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import numpy as np
 
-from typing import List
+from typing import List, Optional
 
 from rectangle import Rectangle, Point
 from config import Config
 from grid.grid import Grid
-from road_entity import RoadEntity
-from images import squares, place_image
+from sprite_raster import SpriteRaster
+from terminal import Line, TerminalRenderer
+from frame_sink import DEFAULT_ANIMATION_FILE, DEFAULT_ANIMATION_FPS, FrameSink, open_sink
 
+# Frames are rendered as they are added and streamed to animation_file, so
+# an animation of any length takes the memory of a single frame
 class Plotter:
-    def __init__(self, grid: Grid, config: Config, animate: bool = True):
+    def __init__(self, grid: Grid, config: Config, animate: bool = True,
+                 animation_file: Optional[str] = None, fps: int = DEFAULT_ANIMATION_FPS):
         self._config = config
         self._grid = grid
         self._bounds = Rectangle(self._config.crosswalk_prot.rows + self._config.vehicle_prot.rows,
@@ -36,21 +43,23 @@ class Plotter:
 
         self._animate = animate
         if animate:
-            self._imgs: List[List[AxesImage]] = []
-            fig, ax = plt.subplots(figsize=(16, 9))
-            self._fig = fig
-            self._ax: plt.Axes = ax
+            # A canvas of its own, that renders the same with any backend
+            self._fig = Figure(figsize=(16, 9))
+            self._canvas = FigureCanvasAgg(self._fig)
+            self._ax: plt.Axes = self._fig.subplots()
             self.configure_plot()
-            self._background = self.get_background_imgs()
+            self._raster = SpriteRaster(self._bounds, self.get_backgound_emoji_at)
+            self.configure_frame()
+            self._sink: FrameSink = open_sink(animation_file or DEFAULT_ANIMATION_FILE, fps)
 
-    def get_background_imgs(self) -> List[AxesImage]:
-        imgs = []
-        for row in range(self._bounds.start_row, self._bounds.end_row + 1):
-            for col in range(self._bounds.start_col, self._bounds.end_col + 1):
-                background_emoji_str = self.get_backgound_emoji_at((row, col))
-                img = place_image(self._ax, squares[background_emoji_str], col, row)
-                imgs.append(img)
-        return imgs
+    # The grid plotted from now on, as the ones replayed from a trajectory
+    @property
+    def grid(self) -> Grid:
+        return self._grid
+
+    @grid.setter
+    def grid(self, grid: Grid):
+        self._grid = grid
 
     def configure_plot(self):
         self._ax.set_xlim(self._bounds.start_col, self._bounds.end_col+1)
@@ -58,17 +67,57 @@ class Plotter:
         self._ax.set_xticks(range(self._bounds.start_col, self._bounds.end_col + 1))
         self._ax.set_yticks(range(self._bounds.start_row, self._bounds.end_row + 2))
         self._ax.grid(True, color="black")
+        self._ax.set_aspect("equal")
         self._fig.tight_layout()
 
+    # The figure is drawn once, without the grid. Every frame writes the
+    # raster of the grid scaled into the axes of it, and the grid lines over
+    # that with the coverage they had on the white axes
+    def configure_frame(self):
+        self._canvas.draw()
+        self._frame = np.array(self._canvas.buffer_rgba())[..., :3]
+        height = self._frame.shape[0]
+        (left, top), (right, bottom) = self._ax.transData.transform(
+            [(self._bounds.start_col, self._bounds.start_row), (self._bounds.end_col + 1, self._bounds.end_row + 1)])
+        self._box = (slice(int(round(height - top)), int(round(height - bottom))),
+                     slice(int(round(left)), int(round(right))))
+
+        raster_rows, raster_cols, _ = self._raster.shape
+        box_rows = self._box[0].stop - self._box[0].start
+        box_cols = self._box[1].stop - self._box[1].start
+        self._raster_rows = ((np.arange(box_rows) + 0.5) * raster_rows / box_rows).astype(int)
+        self._raster_cols = ((np.arange(box_cols) + 0.5) * raster_cols / box_cols).astype(int)
+
+        # What is left of a pixel under a line, out of 256
+        keep = self._frame[self._box].min(axis=2).astype(np.uint16) + 1
+        self._line_pixels = np.nonzero(keep < 256)
+        self._line_keep = keep[self._line_pixels][:, None]
+
     def add_frame(self):
-        imgs_frames = []
+        self._sink.write(self.render_frame())
+
+    # RGB array of the figure with the grid as it is now, written over by
+    # the next frame
+    def render_frame(self) -> np.ndarray:
+        box = self._frame[self._box]
+        raster = self._raster.render(self._grid)
+        np.take(raster.take(self._raster_rows, axis=0), self._raster_cols, axis=1, out=box)
+        box[self._line_pixels] = (box[self._line_pixels] * self._line_keep) >> 8
+        return self._frame
 
-        self._grid.apply_ordered(self._bounds, lambda obj, _: imgs_frames.extend(obj.plot_in_ax(self._ax)))
-        self._imgs.append(imgs_frames)
-    
-    def save_mp4(self, filename: str):
-        anim = ArtistAnimation(self._fig, self._imgs, interval=200, blit=True)
-        anim.save(filename, writer='ffmpeg')
+    # Ends the animation, moved to filename if it isn't where it was written
+    def save(self, filename: Optional[str] = None) -> str:
+        self._sink.close()
+        path = self._sink.path
+        if self._sink.frames == 0:
+            raise ValueError("The animation has no frames")
+        if filename is not None and os.path.abspath(filename) != os.path.abspath(path):
+            if os.path.splitext(filename)[1].lower() != os.path.splitext(path)[1].lower():
+                raise ValueError(f"The animation was written as {path}, it can't be saved as {filename}")
+            os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+            shutil.move(path, filename)
+            path = filename
+        return path
 
     def get_backgound_emoji_at(self, point: Point) -> str:
         _, col = point
@@ -80,8 +129,11 @@ class Plotter:
         else:
             return f"{'⬛'}"
 
-    def plot(self):
-        self._grid.plot(self._plot_object, self._bounds)
+    def plot(self, renderer: Optional[TerminalRenderer] = None):
+        self._grid.plot(self._plot_object, self._bounds, renderer)
+
+    def plot_lines(self) -> List[Line]:
+        return self._grid.plot_lines(self._plot_object, self._bounds)
 
     def _plot_object(self, point: Point, obj) -> str:
         _, col = point
@@ -1,4 +1,5 @@
-from typing import Tuple
+from itertools import product
+from typing import Tuple, Iterator, List
 
 RowNumber = int
 ColNumber = int
@@ -16,6 +17,12 @@ class Rectangle:
         new_rect._lower_right = (lower_right[0], lower_right[1])
         return new_rect
     
+    # Smallest rectangle containing both points
+    @classmethod
+    def spanning(cls, a: Point, b: Point):
+        return cls._new_with_points((min(a[0], b[0]), min(a[1], b[1])),
+                                    (max(a[0], b[0]), max(a[1], b[1])))
+
     def is_inside(self, point: Point) -> bool:
         x, y = point
         x1, y1 = self._upper_left
@@ -66,6 +73,37 @@ class Rectangle:
         return (self._lower_right[0], self._upper_left[1])
     
 
+    def intersects(self, other: "Rectangle") -> bool:
+        return (self.start_row <= other.end_row and other.start_row <= self.end_row and
+                self.start_col <= other.end_col and other.start_col <= self.end_col)
+
+    # Row-major iteration over the points of the rectangle
+    def points(self) -> Iterator[Point]:
+        return product(range(self._upper_left[0], self._lower_right[0] + 1),
+                       range(self._upper_left[1], self._lower_right[1] + 1))
+
+    # Parts of the rectangle outside of other, as disjoint rectangles
+    def minus(self, other: "Rectangle") -> List["Rectangle"]:
+        if not self.intersects(other):
+            return [self.duplicate()]
+
+        parts = []
+        if self.start_row < other.start_row:
+            parts.append(Rectangle._new_with_points(self.upper_left, (other.start_row - 1, self.end_col)))
+        if self.end_row > other.end_row:
+            parts.append(Rectangle._new_with_points((other.end_row + 1, self.start_col), self.lower_right))
+        start_row = max(self.start_row, other.start_row)
+        end_row = min(self.end_row, other.end_row)
+        if self.start_col < other.start_col:
+            parts.append(Rectangle._new_with_points((start_row, self.start_col), (end_row, other.start_col - 1)))
+        if self.end_col > other.end_col:
+            parts.append(Rectangle._new_with_points((start_row, other.end_col + 1), (end_row, self.end_col)))
+        return parts
+
+    def displaced(self, rows: int, cols: int) -> "Rectangle":
+        return Rectangle._new_with_points((self._upper_left[0] + rows, self._upper_left[1] + cols),
+                                          (self._lower_right[0] + rows, self._lower_right[1] + cols))
+
     def move_up(self, rows: int):
         self._upper_left = (self._upper_left[0] - rows, self._upper_left[1])
         self._lower_right = (self._lower_right[0] - rows, self._lower_right[1])
@@ -0,0 +1,33 @@
+import os
+
+from dotenv import load_dotenv
+
+from frame_sink import DEFAULT_ANIMATION_FPS
+from terminal import DEFAULT_TERMINAL_FPS, TerminalRenderer
+from trajectory import DEFAULT_TRAJECTORY_FILE, Trajectory, replay
+
+load_dotenv()
+
+TRAJECTORY_FILE = os.environ.get("TRAJECTORY_FILE", DEFAULT_TRAJECTORY_FILE)
+# The replay is drawn on the terminal, as in main.py, and written to
+# ANIMATION_FILE only when it is set
+ANIMATION_FILE = os.environ.get("ANIMATION_FILE") or None
+ANIMATION_FPS = int(os.environ.get("ANIMATION_FPS", DEFAULT_ANIMATION_FPS))
+SIMULATION_SPEED = float(os.environ.get("SIMULATION_SPEED", 5))
+TERMINAL_FPS = float(os.environ.get("TERMINAL_FPS", DEFAULT_TERMINAL_FPS))
+REPLAY_TERMINAL = os.environ.get("REPLAY_TERMINAL", "1") == "1"
+# First and last ticks replayed, all of them by default
+REPLAY_START = int(os.environ["REPLAY_START"]) if os.environ.get("REPLAY_START") else None
+REPLAY_END = int(os.environ["REPLAY_END"]) if os.environ.get("REPLAY_END") else None
+
+def main():
+    trajectory = Trajectory(TRAJECTORY_FILE)
+    renderer = TerminalRenderer(fps=TERMINAL_FPS) if REPLAY_TERMINAL else None
+    animation = replay(trajectory, renderer, ANIMATION_FILE, ANIMATION_FPS, SIMULATION_SPEED, REPLAY_START, REPLAY_END)
+    if renderer is not None:
+        renderer.close()
+    if animation is not None:
+        print(f"Animation saved in {animation}")
+
+if __name__ == "__main__":
+    main()
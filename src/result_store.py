@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+from typing import Optional, Dict, Any, Union
+
+import numpy as np
+
+from config import Config
+
+DEFAULT_STORE_DIR = "results/store"
+
+# Key of a run: the hash of everything that decides its outcome, that is
+# the config, the seed and stream of the generator and the version of the
+# simulation engine
+def run_key(config: Config, seed: int, stream: Optional[int], engine_version: Union[int, str]) -> str:
+    content = json.dumps({
+        "config": config.to_dict(),
+        "seed": seed,
+        "stream": stream,
+        "engine_version": engine_version,
+    }, sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+# Raw results of every run of the sweeps, one npz file per run named after
+# its key. Runs are written as they finish, through a temporary file so an
+# interrupted sweep never leaves a partial one behind, and a sweep started
+# again only runs what is missing
+class ResultStore:
+    def __init__(self, directory: str = DEFAULT_STORE_DIR):
+        self._directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, key[:2], f"{key}.npz")
+
+    def has(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.has(key):
+            return None
+        with np.load(self._path(key)) as data:
+            return {name: data[name].item() for name in data.files}
+
+    def put(self, key: str, config: Config, seed: int, stream: Optional[int], conflicts: int, seconds: float):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f,
+                     pedestrian_arrival_rate=np.float64(config.pedestrian_arrival_rate),
+                     vehicle_arrival_rate=np.float64(config.vehicle_arrival_rate),
+                     seed=np.int64(seed),
+                     stream=np.int64(-1 if stream is None else stream),
+                     conflicts=np.int64(conflicts),
+                     seconds=np.float64(seconds),
+                     config=np.str_(json.dumps(config.to_dict(), sort_keys=True)))
+        os.replace(tmp_path, path)
@@ -1,10 +1,8 @@
 from abc import ABC, abstractmethod
-import matplotlib.pyplot as plt
-from matplotlib.image import AxesImage
 from typing import List
 
 from orientable import Orientable
-from rectangle import Rectangle
+from rectangle import Point, Rectangle
 from stoplight import StopLight
 
 class RoadEntity(Orientable, ABC):
@@ -26,7 +24,13 @@ class RoadEntity(Orientable, ABC):
 
     def is_pedestrian(self) -> bool:
         return not self.is_vehicle()
-    
+
+    # Cells taken by the entity
     @abstractmethod
-    def plot_in_ax(self, ax: plt.Axes) -> List[AxesImage]:
-        pass
\ No newline at end of file
+    def cells(self) -> List[Point]:
+        pass
+
+    # Smallest rectangle holding the cells of the entity
+    @abstractmethod
+    def footprint(self) -> Rectangle:
+        pass
@@ -1,10 +1,19 @@
 import time
+import dataclasses
+import queue
+from collections import deque
 import numpy as np
-from automata import Automata
-from typing import List, Tuple
-from generator.tp_generator import set_seed
+from automata import Automata, ENGINE_VERSION
+from lockstep_automata import LockstepAutomata, ENGINE_VERSION as LOCKSTEP_ENGINE_VERSION
+from typing import Deque, List, Tuple, Iterator, NamedTuple, Optional, Union
+from generator.tp_generator import set_seed, STREAMS_PER_RUN
 from multiprocessing import Pool
 from config import Config
+from cost_model import CostModel, DEFAULT_RUNTIMES_FILE
+from result_store import ResultStore, DEFAULT_STORE_DIR, run_key
+from running_stats import RunningStats
+from instrumentation import DEFAULT_INSTRUMENT_DIR, PROFILERS, capture, save_json
+from sweep_spec import SWEEP_AXES, SweepSpec, build_sweep, load_spec
 from dotenv import load_dotenv
 import os
 
@@ -22,77 +31,449 @@ RUNS_PER_SCENARIO = int(os.environ.get("RUNS_PER_SCENARIO", 3))
 # Data is recorded every 3600 time steps
 SIMULATION_TIME = int(os.environ.get("SIMULATION_TIME", 3600))
 
+# Every run draws from its own substream of the generator seeded with SEED,
+# run j of config i from substream i*STREAMS_PER_SCENARIO + j, so adding runs
+# doesn't change the streams of the ones already stored.
+# With LEGACY_SEEDS=1, run j of config i is seeded with SEED + i*RUNS_PER_SCENARIO + j
+# instead, as before substreams existed.
+# Configs with common random numbers share the streams of their runs
+# instead: run j of every config draws from substream j*STREAMS_PER_RUN and
+# the ones of its sources after it, so neighbouring configs differ by their
+# rates and not by the noise of the draws
+SEED = int(os.environ.get("SEED", 9*10**6))
+LEGACY_SEEDS = os.environ.get("LEGACY_SEEDS", "0") == "1"
+STREAMS_PER_SCENARIO = 1000
+
 N_PROCESSES = None if "N_PROCESSES" not in os.environ else int(os.environ["N_PROCESSES"])
+# Runtimes of past runs, used to start the longest runs of a sweep first
+RUNTIMES_FILE = os.environ.get("RUNTIMES_FILE", DEFAULT_RUNTIMES_FILE)
+# Raw results of every run, runs already in it are not run again
+RESULT_STORE = os.environ.get("RESULT_STORE", DEFAULT_STORE_DIR)
+
+# With SWEEP_ENGINE=lockstep the runs are done by LockstepAutomata, up to
+# LOCKSTEP_REPLICAS of them at once per process. Its results follow the same
+# distribution as the ones of Automata but aren't the same numbers, and a
+# run is only reproduced when it is done in the same batch as before
+SWEEP_ENGINES = ("scalar", "lockstep")
+SWEEP_ENGINE = os.environ.get("SWEEP_ENGINE", "scalar")
+LOCKSTEP_REPLICAS = int(os.environ.get("LOCKSTEP_REPLICAS", 1024))
+
+# With INSTRUMENT=1 every run writes its counters (the time of each phase
+# of a tick, the grid queries and the entities) to INSTRUMENT_DIR, as a JSON
+# file named after its key in the store. With PROFILE=cprofile or
+# PROFILE=tracemalloc every run is captured there as well
+INSTRUMENT = os.environ.get("INSTRUMENT", "0") == "1"
+PROFILE = os.environ.get("PROFILE") or None
+INSTRUMENT_DIR = os.environ.get("INSTRUMENT_DIR", DEFAULT_INSTRUMENT_DIR)
+# When set, the entities of every tick of every run are recorded to
+# TRAJECTORY_DIR, named after the key of the run in the store
+TRAJECTORY_DIR = os.environ.get("TRAJECTORY_DIR") or None
+
+# With ADAPTIVE_RUNS=1 every config is run RUNS_PER_SCENARIO times first, and
+# then again until the confidence interval of its mean conflicts is narrower
+# than CI_HALF_WIDTH conflicts, or than CI_RELATIVE_HALF_WIDTH times the mean,
+# on each side, or MAX_RUNS_PER_SCENARIO runs are done
+ADAPTIVE_RUNS = os.environ.get("ADAPTIVE_RUNS", "0") == "1"
+MAX_RUNS_PER_SCENARIO = int(os.environ.get("MAX_RUNS_PER_SCENARIO", 30))
+CI_HALF_WIDTH = float(os.environ.get("CI_HALF_WIDTH", 0.5))
+CI_RELATIVE_HALF_WIDTH = float(os.environ.get("CI_RELATIVE_HALF_WIDTH", 0.05))
+CI_CONFIDENCE = float(os.environ.get("CI_CONFIDENCE", 0.95))
+
+# A TOML file with the settings and the axes of the sweep, and how its
+# points are laid out, see sweeps/. Without it the sweep is over the rates below
+SWEEP_SPEC = os.environ.get("SWEEP_SPEC") or None
 
 # The simulation will run for 30 different pedestrian and vehicle arrival rates,
 # making a total of 900 scenarios
 PEDESTRIAN_ARRIVAL_RATES = np.linspace(INITIAL_PEDESTRIAN_ARRIVAL_RATE_HR/(2*3600), FINAL_PEDESTRIAN_ARRIVAL_RATE_HR/(2*3600), 30)
 VEHICLE_ARRIVAL_RATES = np.linspace(INITIAL_VEHICLE_ARRIVAL_RATE_HR/(6*3600), FINAL_VEHICLE_ARRIVAL_RATE_HR/(6*3600), 30)
 
-def print_simulation_config():
+def print_simulation_config(spec: Optional[SweepSpec] = None):
     print("Running with the following configuration:")
-    print(f"Initial pedestrian arrival rate: {INITIAL_PEDESTRIAN_ARRIVAL_RATE_HR} cap/hr")
-    print(f"Final pedestrian arrival rate: {FINAL_PEDESTRIAN_ARRIVAL_RATE_HR} cap/hr")
-    print(f"Initial vehicle arrival rate: {INITIAL_VEHICLE_ARRIVAL_RATE_HR} veh/hr")
-    print(f"Final vehicle arrival rate: {FINAL_VEHICLE_ARRIVAL_RATE_HR} veh/hr")
+    if spec is None:
+        print(f"Initial pedestrian arrival rate: {INITIAL_PEDESTRIAN_ARRIVAL_RATE_HR} cap/hr")
+        print(f"Final pedestrian arrival rate: {FINAL_PEDESTRIAN_ARRIVAL_RATE_HR} cap/hr")
+        print(f"Initial vehicle arrival rate: {INITIAL_VEHICLE_ARRIVAL_RATE_HR} veh/hr")
+        print(f"Final vehicle arrival rate: {FINAL_VEHICLE_ARRIVAL_RATE_HR} veh/hr")
     print(f"Runs per scenario: {RUNS_PER_SCENARIO}")
-    print(f"Simulation time: {SIMULATION_TIME} steps")
-    print(f"Green light time: {os.environ['GREEN_LIGHT_TIME']} seconds")
-    print(f"Crosswalk width: {float(os.environ['CROSSWALK_ROWS']) / 2: .1f} meters")
+    if spec is None or "SIMULATION_TIME" not in spec.settings:
+        print(f"Simulation time: {SIMULATION_TIME} steps")
+    if spec is None:
+        print(f"Green light time: {os.environ['GREEN_LIGHT_TIME']} seconds")
+        print(f"Crosswalk width: {float(os.environ['CROSSWALK_ROWS']) / 2: .1f} meters")
+    else:
+        points = f"{spec.points} points" if spec.design != "factorial" else "every level"
+        print(f"Sweep: {spec.path}, {spec.design} design with {points}")
+        for name, value in spec.settings.items():
+            print(f"{name}: {value}")
+        for name, axis in spec.axes.items():
+            levels = axis.values if axis.values is not None else f"{axis.low} to {axis.high}"
+            print(f"{name}: {levels}" + (f" in {axis.levels} levels" if axis.levels and spec.design == "factorial" else ""))
     print(f"Number of processes: {N_PROCESSES}")
+    if SWEEP_ENGINE == "lockstep":
+        print(f"Lockstep engine: up to {LOCKSTEP_REPLICAS} runs at once")
+    if INSTRUMENT or PROFILE is not None:
+        print(f"Instrumentation: counters {'on' if INSTRUMENT else 'off'}, profiler {PROFILE}, in {INSTRUMENT_DIR}")
+    if TRAJECTORY_DIR is not None:
+        print(f"Trajectories: recorded in {TRAJECTORY_DIR}")
+    if ADAPTIVE_RUNS:
+        print(f"Adaptive runs: up to {MAX_RUNS_PER_SCENARIO} per scenario, until the {CI_CONFIDENCE:.0%} "
+              f"confidence interval is within {CI_HALF_WIDTH} conflicts or {CI_RELATIVE_HALF_WIDTH:.0%} of the mean")
+
+class ReplicationResult(NamedTuple):
+    # Position of the config in the sweep
+    index: int
+    replication: int
+    conflicts: int
+    seconds: float
+    # Whether the result comes from the store instead of being run
+    stored: bool = False
+
+# Seed and stream of the generator for run j of config i
+def replication_seed(i: int, j: int, config: Config) -> Tuple[int, Optional[int]]:
+    if LEGACY_SEEDS:
+        return SEED + i*RUNS_PER_SCENARIO + j, None
+    if config.common_random_numbers:
+        return SEED, j*STREAMS_PER_RUN
+    return SEED, i*STREAMS_PER_SCENARIO + j
 
-def run(i: int, config: Config) -> Tuple[float, float, float]:    
-    print(f"Starting automata...")
+def replication_key(i: int, j: int, config: Config) -> str:
+    seed, stream = replication_seed(i, j, config)
+    engine_version = LOCKSTEP_ENGINE_VERSION if SWEEP_ENGINE == "lockstep" else ENGINE_VERSION
+    return run_key(config, seed, stream, engine_version)
+
+# Every replication is a task of its own. Since each task runs in its own
+# process with its own copy of the generator, seeding it here is enough to
+# avoid race conditions between them
+def run_replication(i: int, j: int, config: Config) -> ReplicationResult:
     start = time.time()
-    results = []
-    for j in range(RUNS_PER_SCENARIO):
-        # Since we are running the scenarios in different processes, each one
-        # will have a different generator, and no race conditions will happen
-        # while accessing the generator
-        set_seed(9*10**6 + i*RUNS_PER_SCENARIO + j)
-        automata = Automata(config)
-        automata.advance_to(SIMULATION_TIME)
-        results.append(automata._conflicts)
-    print(f"Scenario finished in {time.time() - start} seconds")
-
-    pedestrian_arrival_rate = config.pedestrian_arrival_rate
-    vehicle_arrival_rate = config.vehicle_arrival_rate
-    return pedestrian_arrival_rate, vehicle_arrival_rate, sum(results)/len(results)
-
-def build_configs() -> List[Config]:
+    set_seed(*replication_seed(i, j, config))
+    key = replication_key(i, j, config)
+    path = os.path.join(INSTRUMENT_DIR, key)
+    trajectory_file = os.path.join(TRAJECTORY_DIR, f"{key}.npy") if TRAJECTORY_DIR is not None else None
+    with capture(PROFILE, path):
+        automata = Automata(config, instrument=INSTRUMENT, trajectory_file=trajectory_file)
+        automata.advance_to(config.simulation_time)
+    automata.close_trajectory()
+    if INSTRUMENT:
+        save_json({"config": config.to_dict(), "replication": j, **automata.stats()}, f"{path}.json")
+    return ReplicationResult(i, j, automata._conflicts, time.time() - start)
+
+def _run_task(task: Tuple[int, int, Config]) -> ReplicationResult:
+    return run_replication(*task)
+
+# Runs the replications on a pool as they are submitted, so what is run
+# next can depend on the results of the ones already finished. With a single
+# process they are queued instead, and each runs when its result is asked
+# for, so the results are still yielded as they finish
+class _Dispatcher:
+    def __init__(self, configs: List[Config], processes: Optional[int], store: Optional[ResultStore]):
+        self._configs = configs
+        self._store = store
+        self._pool = None if processes == 1 else Pool(processes)
+        self._queued: Deque[Tuple[int, int, Config]] = deque()
+        self._finished: "queue.Queue[Union[ReplicationResult, BaseException]]" = queue.Queue()
+        self.pending = 0
+
+    # Returns the stored result of the run instead of running it, if any
+    def submit(self, i: int, j: int) -> Optional[ReplicationResult]:
+        if self._store is not None:
+            stored = self._store.get(replication_key(i, j, self._configs[i]))
+            if stored is not None:
+                return ReplicationResult(i, j, stored["conflicts"], stored["seconds"], True)
+
+        self.pending += 1
+        task = (i, j, self._configs[i])
+        if self._pool is None:
+            self._queued.append(task)
+        else:
+            self._pool.apply_async(_run_task, (task,),
+                                   callback=self._finished.put,
+                                   error_callback=self._finished.put)
+        return None
+
+    def next(self) -> ReplicationResult:
+        if self._pool is None:
+            self._finished.put(_run_task(self._queued.popleft()))
+        result = self._finished.get()
+        self.pending -= 1
+        if isinstance(result, BaseException):
+            raise result
+
+        if self._store is not None:
+            config = self._configs[result.index]
+            seed, stream = replication_seed(result.index, result.replication, config)
+            self._store.put(replication_key(result.index, result.replication, config),
+                            config, seed, stream, result.conflicts, result.seconds)
+        return result
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+
+def _by_cost(configs: List[Config], cost_model: Optional[CostModel]) -> List[int]:
+    cost_model = cost_model or CostModel()
+    costs = [cost_model.predict(config) for config in configs]
+    return sorted(range(len(configs)), key=lambda i: -costs[i])
+
+# Runs runs replications of every config, yielding their results as they
+# finish. The replications are handed to the processes one at a time, the
+# ones predicted to take longest first, so no process is left running a
+# long one on its own at the end of the sweep. With a store, the runs it
+# has are yielded first without running them, and the rest are added to
+# it as they finish
+def run_sweep(configs: List[Config],
+              runs: int = RUNS_PER_SCENARIO,
+              processes: Optional[int] = N_PROCESSES,
+              cost_model: CostModel = None,
+              store: ResultStore = None) -> Iterator[ReplicationResult]:
+    dispatcher = _Dispatcher(configs, processes, store)
+    try:
+        stored = []
+        for i in _by_cost(configs, cost_model):
+            for j in range(runs):
+                result = dispatcher.submit(i, j)
+                if result is not None:
+                    stored.append(result)
+        yield from stored
+        while dispatcher.pending > 0:
+            yield dispatcher.next()
+    finally:
+        dispatcher.close()
+
+# Sequential stopping: runs min_runs replications of every config, and then
+# more, in batches of at most as many as it already has, until the
+# confidence interval of its mean conflicts is narrow enough or max_runs are
+# done. Yields the results as run_sweep does
+def run_adaptive_sweep(configs: List[Config],
+                       min_runs: int = RUNS_PER_SCENARIO,
+                       max_runs: int = MAX_RUNS_PER_SCENARIO,
+                       half_width: float = CI_HALF_WIDTH,
+                       relative_half_width: float = CI_RELATIVE_HALF_WIDTH,
+                       confidence: float = CI_CONFIDENCE,
+                       processes: Optional[int] = N_PROCESSES,
+                       cost_model: CostModel = None,
+                       store: ResultStore = None) -> Iterator[ReplicationResult]:
+    if LEGACY_SEEDS:
+        raise ValueError("Adaptive runs need substream seeds, unset LEGACY_SEEDS")
+    if not 2 <= min_runs <= max_runs <= STREAMS_PER_SCENARIO:
+        raise ValueError(f"Expected 2 <= min runs <= max runs <= {STREAMS_PER_SCENARIO}, got {min_runs} and {max_runs}")
+    if half_width <= 0:
+        raise ValueError(f"The confidence interval half width must be positive, got {half_width}")
+
+    stats = [RunningStats() for _ in configs]
+    submitted = [0] * len(configs)
+    pending = [0] * len(configs)
+    dispatcher = _Dispatcher(configs, processes, store)
+
+    def more_runs(i: int) -> int:
+        target = max(half_width, relative_half_width * abs(stats[i].mean))
+        needed = stats[i].needed(target, confidence)
+        return min(needed, stats[i].count, max_runs - submitted[i])
+
+    # Submits runs more replications of config i, yielding the stored ones
+    def submit(i: int, runs: int) -> Iterator[ReplicationResult]:
+        for _ in range(runs):
+            result = dispatcher.submit(i, submitted[i])
+            submitted[i] += 1
+            if result is None:
+                pending[i] += 1
+            else:
+                stats[i].push(result.conflicts)
+                yield result
+
+    # Once the submitted runs of config i are done, decides whether it
+    # needs more
+    def top_up(i: int) -> Iterator[ReplicationResult]:
+        while pending[i] == 0:
+            runs = more_runs(i)
+            if runs <= 0:
+                return
+            yield from submit(i, runs)
+
+    try:
+        order = _by_cost(configs, cost_model)
+        for i in order:
+            yield from submit(i, min_runs)
+        for i in order:
+            yield from top_up(i)
+        while dispatcher.pending > 0:
+            result = dispatcher.next()
+            pending[result.index] -= 1
+            stats[result.index].push(result.conflicts)
+            yield result
+            yield from top_up(result.index)
+    finally:
+        dispatcher.close()
+
+# Runs the replications (i, j) of the configs as the replicas of a single
+# LockstepAutomata, seeded after the stream of the first one
+def run_lockstep_batch(tasks: List[Tuple[int, int]], configs: List[Config]) -> List[ReplicationResult]:
+    start = time.time()
+    seed, stream = replication_seed(*tasks[0], configs[tasks[0][0]])
+    with capture(PROFILE, os.path.join(INSTRUMENT_DIR, f"lockstep-{replication_key(*tasks[0], configs[tasks[0][0]])}")):
+        automata = LockstepAutomata(configs[tasks[0][0]],
+                                    np.array([configs[i].pedestrian_arrival_rate for i, _ in tasks]),
+                                    np.array([configs[i].vehicle_arrival_rate for i, _ in tasks]),
+                                    np.random.SeedSequence(seed, spawn_key=() if stream is None else (stream,)))
+        automata.advance_to(configs[tasks[0][0]].simulation_time)
+    seconds = (time.time() - start) / len(tasks)
+    return [ReplicationResult(i, j, int(conflicts), seconds)
+            for (i, j), conflicts in zip(tasks, automata.conflicts)]
+
+def _run_lockstep_task(task: Tuple[List[Tuple[int, int]], List[Config]]) -> List[ReplicationResult]:
+    return run_lockstep_batch(*task)
+
+# Runs runs replications of every config as run_sweep does, in batches of
+# up to replicas runs advanced together by the lockstep engine. The configs
+# may only differ in their arrival rates, as the replicas of a batch share
+# everything else
+def run_lockstep_sweep(configs: List[Config],
+                       runs: int = RUNS_PER_SCENARIO,
+                       processes: Optional[int] = N_PROCESSES,
+                       replicas: int = LOCKSTEP_REPLICAS,
+                       store: ResultStore = None) -> Iterator[ReplicationResult]:
+    def geometry(config: Config) -> dict:
+        return {name: value for name, value in config.to_dict().items()
+                if name not in ("pedestrian_arrival_rate", "vehicle_arrival_rate")}
+    if any(geometry(config) != geometry(configs[0]) for config in configs):
+        raise ValueError("The lockstep engine needs configs that only differ in their arrival rates")
+
+    missing = []
+    for i in range(len(configs)):
+        for j in range(runs):
+            stored = None if store is None else store.get(replication_key(i, j, configs[i]))
+            if stored is not None:
+                yield ReplicationResult(i, j, stored["conflicts"], stored["seconds"], True)
+            else:
+                missing.append((i, j))
+
+    tasks = [(missing[k:k + replicas], configs) for k in range(0, len(missing), replicas)]
+    pool = None if processes == 1 or len(tasks) <= 1 else Pool(processes)
+    try:
+        batches = map(_run_lockstep_task, tasks) if pool is None else pool.imap_unordered(_run_lockstep_task, tasks)
+        for batch in batches:
+            for result in batch:
+                if store is not None:
+                    config = configs[result.index]
+                    seed, stream = replication_seed(result.index, result.replication, config)
+                    store.put(replication_key(result.index, result.replication, config),
+                              config, seed, stream, result.conflicts, result.seconds)
+                yield result
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+def build_configs(spec: Optional[SweepSpec] = None) -> List[Config]:
+    if spec is not None:
+        return build_sweep(spec)
     config = Config.new_from_env_file()
     configs = []
     for pedestrian_arrival_rate in PEDESTRIAN_ARRIVAL_RATES:
         for vehicle_arrival_rate in VEHICLE_ARRIVAL_RATES:
-            config_dup = config.duplicate()
-            config_dup.pedestrian_arrival_rate = pedestrian_arrival_rate
-            config_dup.vehicle_arrival_rate = vehicle_arrival_rate
-            configs.append(config_dup)
+            configs.append(dataclasses.replace(config,
+                                               pedestrian_arrival_rate=pedestrian_arrival_rate,
+                                               vehicle_arrival_rate=vehicle_arrival_rate))
     return configs
 
-def run_parallel(configs: List[Config]) -> List[Tuple[float, float, float]]:
-    with Pool(N_PROCESSES) as p:
-       results = p.starmap(run, zip(range(len(configs)), configs))
+def print_progress(configs: List[Config], result: ReplicationResult, done: int, total: Optional[int], eta: Optional[float]):
+    config = configs[result.index]
+    counter = f"[{done}/{total}]" if total is not None else f"[{done}]"
+    timing = f"in {result.seconds:.1f} seconds"
+    if eta is not None:
+        timing += f" (ETA {eta:.0f} seconds)"
+    print(f"{counter} "
+          f"{int(SWEEP_AXES['PEDESTRIAN_ARRIVAL_RATE_HR'].value(config))} cap/hr, "
+          f"{int(SWEEP_AXES['VEHICLE_ARRIVAL_RATE_HR'].value(config))} veh/hr, "
+          f"run {result.replication}: {result.conflicts} conflicts "
+          f"{timing}", flush=True)
+
+def run_parallel(configs: List[Config], store: ResultStore = None) -> List[ReplicationResult]:
+    if SWEEP_ENGINE not in SWEEP_ENGINES:
+        raise ValueError(f"Unknown sweep engine {SWEEP_ENGINE}, expected one of {list(SWEEP_ENGINES)}")
+    if SWEEP_ENGINE == "lockstep" and ADAPTIVE_RUNS:
+        raise ValueError("Adaptive runs aren't supported by the lockstep engine")
+    if SWEEP_ENGINE == "lockstep" and INSTRUMENT:
+        raise ValueError("The lockstep engine has no counters, unset INSTRUMENT or use PROFILE")
+    if SWEEP_ENGINE == "lockstep" and TRAJECTORY_DIR is not None:
+        raise ValueError("The lockstep engine records no trajectories, unset TRAJECTORY_DIR")
+    if PROFILE is not None and PROFILE not in PROFILERS:
+        raise ValueError(f"Unknown profiler {PROFILE}, expected one of {list(PROFILERS)}")
+
+    cost_model = CostModel.load(RUNTIMES_FILE)
+    if SWEEP_ENGINE == "lockstep":
+        sweep = run_lockstep_sweep(configs, store=store)
+        total = len(configs) * RUNS_PER_SCENARIO
+    elif ADAPTIVE_RUNS:
+        sweep = run_adaptive_sweep(configs, cost_model=cost_model, store=store)
+        # The amount of runs is only known at the end
+        total = None
+    else:
+        sweep = run_sweep(configs, cost_model=cost_model, store=store)
+        total = len(configs) * RUNS_PER_SCENARIO
+    remaining_cost = sum(cost_model.predict(config) for config in configs) * RUNS_PER_SCENARIO
+    done_cost = 0.0
+    start = time.time()
+
+    results = []
+    stored = 0
+    for result in sweep:
+        results.append(result)
+        cost = cost_model.predict(configs[result.index])
+        remaining_cost -= cost
+        if result.stored:
+            stored += 1
+            continue
+        done_cost += cost
+        eta = None if total is None else max(0.0, (time.time() - start) * remaining_cost / done_cost)
+        print_progress(configs, result, len(results), total, eta)
+    if stored > 0:
+        print(f"{stored} of {len(results)} runs were already in the store")
+    if ADAPTIVE_RUNS:
+        print(f"{len(results)} runs done, {len(results)/len(configs):.1f} per config on average")
+
+    # The runtimes of the lockstep engine say nothing of the ones of Automata
+    for result in results:
+        if not result.stored and SWEEP_ENGINE == "scalar":
+            cost_model.record(configs[result.index], result.seconds)
+    cost_model.save(RUNTIMES_FILE)
     return results
 
-def save_results(results: List[Tuple[float, float, float]]):
+# The CSV is a view over the store: the average conflicts of the stored
+# runs of every config that took part in the sweep. Axes of the spec other
+# than the rates get a column of their own, before the conflicts
+def save_results(configs: List[Config], store: ResultStore, runs: List[ReplicationResult],
+                 spec: Optional[SweepSpec] = None):
+    conflicts: List[List[int]] = [[] for _ in configs]
+    for run in runs:
+        stored = store.get(replication_key(run.index, run.replication, configs[run.index]))
+        conflicts[run.index].append(stored["conflicts"])
+    rates = ("PEDESTRIAN_ARRIVAL_RATE_HR", "VEHICLE_ARRIVAL_RATE_HR")
+    columns = [name for name in (spec.axes if spec is not None else []) if name not in rates]
+    results = [[int(SWEEP_AXES[name].value(config)) for name in (*rates, *columns)] + [sum(c)/len(c)]
+               for config, c in zip(configs, conflicts)]
+
     if "RESULTS_FILE_NAME" in os.environ:
         file_name = os.environ["RESULTS_FILE_NAME"]
+    elif spec is not None:
+        file_name = f"{spec.name}.csv"
     else:
         t = time.localtime()
         file_name = f"{t.tm_year}-{t.tm_mon}-{t.tm_mday}-{t.tm_hour}-{t.tm_min}-{t.tm_sec}.csv"
         
     with open(f"results/{file_name}", "w") as f:
-        f.write("pedestrian_arrival_rate,vehicle_arrival_rate,conflicts\n")
+        f.write(",".join(["pedestrian_arrival_rate", "vehicle_arrival_rate", *(name.lower() for name in columns), "conflicts"]) + "\n")
         for r in results:
-            f.write(f"{int(r[0]*2*3600)},{int(r[1]*6*3600)},{r[2]}\n")
+            f.write(",".join(str(value) for value in r) + "\n")
     print(f"Results saved in results/{file_name}")
 
 def main():
-    print_simulation_config()
-    configs = build_configs()
-    results = run_parallel(configs)
-    save_results(results)
+    spec = load_spec(SWEEP_SPEC) if SWEEP_SPEC is not None else None
+    print_simulation_config(spec)
+    configs = build_configs(spec)
+    store = ResultStore(RESULT_STORE)
+    runs = run_parallel(configs, store)
+    save_results(configs, store, runs, spec)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,103 @@
+import math
+from statistics import NormalDist
+
+# Below this many degrees of freedom the Cornish-Fisher expansion is off by
+# more than 0.01% in the tails, and by 11% at 1 degree of freedom for a 95%
+# interval, so the quantile is found from the exact distribution instead
+EXACT_T_DEGREES_OF_FREEDOM = 10
+
+# Distribution function of the Student's t distribution for a whole number
+# of degrees of freedom, from its closed form as a sum of powers of cos(θ),
+# with θ = atan(t / sqrt(v))
+def t_cdf(t: float, degrees_of_freedom: int) -> float:
+    v = degrees_of_freedom
+    theta = math.atan(t / math.sqrt(v))
+    sin, cos2 = math.sin(theta), math.cos(theta)**2
+    if v % 2:
+        term = sin * math.cos(theta)
+        total = term if v > 1 else 0.0
+        for k in range(3, v - 1, 2):
+            term *= cos2 * (k - 1) / k
+            total += term
+        total = 2 / math.pi * (theta + total)
+    else:
+        term = total = sin
+        for k in range(2, v - 1, 2):
+            term *= cos2 * (k - 1) / k
+            total += term
+    return (1 + total) / 2
+
+# Quantile of the Student's t distribution. With few degrees of freedom it
+# is found by bisection of t_cdf, and otherwise from the normal one with the
+# Cornish-Fisher expansion
+def t_quantile(p: float, degrees_of_freedom: int) -> float:
+    if degrees_of_freedom < 1:
+        raise ValueError(f"The t distribution needs at least 1 degree of freedom, got {degrees_of_freedom}")
+    if not 0 < p < 1:
+        raise ValueError(f"Expected a probability between 0 and 1, got {p}")
+    v = degrees_of_freedom
+    if v < EXACT_T_DEGREES_OF_FREEDOM:
+        if p < 0.5:
+            return -t_quantile(1 - p, v)
+        low, high = 0.0, 1.0
+        while t_cdf(high, v) < p:
+            low, high = high, 2 * high
+        while high - low > 1e-12 * high:
+            middle = (low + high) / 2
+            if t_cdf(middle, v) < p:
+                low = middle
+            else:
+                high = middle
+        return (low + high) / 2
+
+    z = NormalDist().inv_cdf(p)
+    return (z
+            + (z**3 + z) / (4*v)
+            + (5*z**5 + 16*z**3 + 3*z) / (96*v**2)
+            + (3*z**7 + 19*z**5 + 17*z**3 - 15*z) / (384*v**3)
+            + (79*z**9 + 776*z**7 + 1482*z**5 - 1920*z**3 - 945*z) / (92160*v**4))
+
+# Mean and variance of a series of values updated one value at a time,
+# with Welford's algorithm
+class RunningStats:
+    def __init__(self):
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def push(self, x: float):
+        self._count += 1
+        delta = x - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (x - self._mean)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        return self._mean
+
+    @property
+    def variance(self) -> float:
+        if self._count < 2:
+            return math.inf
+        return self._m2 / (self._count - 1)
+
+    # Half the width of the confidence interval of the mean
+    def half_width(self, confidence: float = 0.95) -> float:
+        if self._count < 2:
+            return math.inf
+        t = t_quantile(1 - (1 - confidence) / 2, self._count - 1)
+        return t * math.sqrt(self.variance / self._count)
+
+    # Values still needed for the half width to reach target, assuming the
+    # variance stays as it is
+    def needed(self, target: float, confidence: float = 0.95) -> int:
+        if self._count < 2:
+            return 2 - self._count
+        if self.half_width(confidence) <= target:
+            return 0
+        t = t_quantile(1 - (1 - confidence) / 2, self._count - 1)
+        return max(1, math.ceil(self.variance * (t / target)**2) - self._count)
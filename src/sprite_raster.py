@@ -0,0 +1,62 @@
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+from rectangle import Rectangle, Point
+from grid.grid import Grid
+from road_entity import RoadEntity
+from images import SPRITE_PIXELS, sprite_atlas
+
+# Renders the cells of bounds of a grid to a single RGB array, row by row
+# from the top and pixels x pixels per cell. The background is rendered
+# once and every frame is a copy of it with the tiles of the entities
+# written over by slicing, so a frame costs a copy and a slice per entity cell
+class SpriteRaster:
+    def __init__(self, bounds: Rectangle, background: Callable[[Point], str], pixels: int = SPRITE_PIXELS):
+        self._bounds = bounds
+        self._atlas = sprite_atlas(pixels)
+        self._pixels = pixels
+        self._emojis = list(self._atlas.index)
+        self._cell_background = np.array([[self._atlas.index[background((row, col))]
+                                           for col in range(bounds.start_col, bounds.end_col + 1)]
+                                          for row in range(bounds.start_row, bounds.end_row + 1)])
+        self._background = np.concatenate(
+            [np.concatenate([self.tile(self._emojis[i], self._emojis[i]) for i in row], axis=1)
+             for row in self._cell_background], axis=0)
+        # Tiles of the sprites over each background, built the first time
+        # they are needed
+        self._tiles: Dict[Tuple[int, int], np.ndarray] = {}
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self._background.shape
+
+    # Sprite over a background sprite, with the alpha of the sprite, as
+    # 8 bit RGB
+    def tile(self, emoji: str, background: str) -> np.ndarray:
+        sprite = self._atlas.sprites[self._atlas.index[emoji]]
+        under = self._atlas.sprites[self._atlas.index[background]][..., :3]
+        alpha = sprite[..., 3:]
+        return np.round((sprite[..., :3] * alpha + under * (1 - alpha)) * 255).astype(np.uint8)
+
+    def _tile_at(self, sprite: int, row: int, col: int) -> np.ndarray:
+        key = (sprite, self._cell_background[row, col])
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = self._tiles[key] = self.tile(self._emojis[sprite], self._emojis[key[1]])
+        return tile
+
+    # Entities are drawn whole, so the cells of vehicles only partially
+    # inside the bounds are cropped
+    def render(self, grid: Grid[RoadEntity]) -> np.ndarray:
+        frame = self._background.copy()
+        p = self._pixels
+        start_row, start_col = self._bounds.start_row, self._bounds.start_col
+        for _, entity in grid.entities():
+            sprite = self._atlas.index[entity._repr]
+            for row, col in entity.cells():
+                if not self._bounds.is_inside((row, col)):
+                    continue
+                row, col = row - start_row, col - start_col
+                frame[row*p:(row + 1)*p, col*p:(col + 1)*p] = self._tile_at(sprite, row, col)
+        return frame
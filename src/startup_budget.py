@@ -0,0 +1,50 @@
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+# Time a fresh sweep worker may take to import the simulator and build its
+# first automata. Workers started with the "spawn" method pay it once each
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", 300))
+STARTUP_SAMPLES = int(os.environ.get("STARTUP_SAMPLES", 5))
+
+# Rendering modules a headless worker must never load
+RENDERING_MODULES = ["matplotlib", "sympy", "images", "plotter"]
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = f"""
+import json, sys, time
+sys.path.insert(0, {SRC_DIR!r})
+start = time.perf_counter()
+import run_scenario
+from automata import Automata
+Automata()
+elapsed = time.perf_counter() - start
+loaded = [m for m in {RENDERING_MODULES!r} if m in sys.modules]
+print(json.dumps({{"elapsed_ms": elapsed * 1000, "loaded": loaded}}))
+"""
+
+def measure_startup() -> dict:
+    output = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+def main():
+    samples = [measure_startup() for _ in range(STARTUP_SAMPLES)]
+    elapsed = [sample["elapsed_ms"] for sample in samples]
+    loaded = sorted({module for sample in samples for module in sample["loaded"]})
+
+    print(f"Worker startup: median {statistics.median(elapsed):.0f} ms, max {max(elapsed):.0f} ms "
+          f"(budget {STARTUP_BUDGET_MS:.0f} ms, {STARTUP_SAMPLES} samples)")
+    ok = True
+    if loaded:
+        print(f"Rendering modules loaded by a headless worker: {', '.join(loaded)}")
+        ok = False
+    if statistics.median(elapsed) > STARTUP_BUDGET_MS:
+        print("Startup budget exceeded")
+        ok = False
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
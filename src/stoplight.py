@@ -18,6 +18,16 @@ class StopLight:
             self._state = "green" if self._state == "red" else "red"
             self._time_to_change = self._green_light_time if self._state == "green" else self._cycle - self._green_light_time
 
+    # Updates left until the light changes
+    @property
+    def time_to_change(self) -> int:
+        return self._time_to_change
+
+    # The same as ticks updates, as long as the light doesn't change in them
+    def advance(self, ticks: int):
+        assert ticks < self._time_to_change
+        self._time_to_change -= ticks
+
     @property
     def state(self) -> StopLightState:
         return self._state
@@ -28,8 +38,8 @@ class StopLight:
     def is_red(self) -> bool:
         return self._state == "red"
 
+    def __str__(self) -> str:
+        return f"{'🟢' if self._state == 'green' else '🔴'} {self._time_to_change}"
+
     def show(self):
-        if self._state == "green":
-            print("🟢", self._time_to_change)
-        else:
-            print("🔴", self._time_to_change)
\ No newline at end of file
+        print(self)
\ No newline at end of file
@@ -0,0 +1,78 @@
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+# Designs of sweeps that sample the unit cube: points x dims arrays of
+# coordinates in [0, 1), which sweep_spec.py turns into settings. Full
+# factorial designs take every level of every axis and are built there
+
+# Every dimension is split in points strata of the same width, and every
+# stratum holds exactly one point, at a random place within it
+def latin_hypercube(points: int, dims: int, seed: Optional[int] = None) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    design = np.empty((points, dims))
+    for d in range(dims):
+        design[:, d] = (rng.permutation(points) + rng.random(points)) / points
+    return design
+
+# Degree, coefficients and initial direction numbers of the primitive
+# polynomials of dimensions 2 to 10 of the Sobol sequence, from the
+# new-joe-kuo-6.21201 table of Joe and Kuo. The first dimension is the van
+# der Corput sequence
+SOBOL_DIRECTIONS = [
+    (1, 0, (1,)),
+    (2, 1, (1, 3)),
+    (3, 1, (1, 3, 1)),
+    (3, 2, (1, 1, 1)),
+    (4, 1, (1, 1, 3, 3)),
+    (4, 4, (1, 3, 5, 13)),
+    (5, 2, (1, 1, 5, 5, 17)),
+    (5, 4, (1, 1, 5, 5, 5)),
+    (5, 7, (1, 1, 7, 11, 19)),
+]
+SOBOL_BITS = 30
+
+def _sobol_directions(dims: int) -> np.ndarray:
+    directions = np.zeros((dims, SOBOL_BITS), dtype=np.int64)
+    directions[0] = 1 << (SOBOL_BITS - 1 - np.arange(SOBOL_BITS))
+    for d in range(1, dims):
+        degree, coefficients, initial = SOBOL_DIRECTIONS[d - 1]
+        v = directions[d]
+        for i in range(SOBOL_BITS):
+            if i < degree:
+                v[i] = initial[i] << (SOBOL_BITS - 1 - i)
+                continue
+            x = v[i - degree] ^ (v[i - degree] >> degree)
+            for k in range(1, degree):
+                if (coefficients >> (degree - 1 - k)) & 1:
+                    x ^= v[i - k]
+            v[i] = x
+    return directions
+
+# The first points of the Sobol sequence, in Gray code order. The first 2^k
+# points, the corner at the origin included, fill the cube evenly, so powers
+# of two are the best amounts of points. With a seed every dimension is
+# shifted by the same random digits for all of its points, which keeps how
+# evenly they fill it and moves the first point away from the corner
+def sobol(points: int, dims: int, seed: Optional[int] = None) -> np.ndarray:
+    if dims > len(SOBOL_DIRECTIONS) + 1:
+        raise ValueError(f"The Sobol design has up to {len(SOBOL_DIRECTIONS) + 1} dimensions, {dims} were given")
+    if points > 2**SOBOL_BITS:
+        raise ValueError(f"The Sobol design has up to {2**SOBOL_BITS} points, {points} were asked for")
+    directions = _sobol_directions(dims)
+    x = np.zeros(dims, dtype=np.int64)
+    if seed is not None:
+        x = np.random.default_rng(seed).integers(0, 2**SOBOL_BITS, dims)
+    design = np.empty((points, dims))
+    for n in range(points):
+        # The lowest set bit of n is the one that changes in its Gray code
+        if n > 0:
+            x ^= directions[:, (n & -n).bit_length() - 1]
+        design[n] = x / 2**SOBOL_BITS
+    return design
+
+# Designs that sample the unit cube, by their name in the sweep specs
+SAMPLED_DESIGNS: Dict[str, Callable[[int, int, Optional[int]], np.ndarray]] = {
+    "lhs": latin_hypercube,
+    "sobol": sobol,
+}
@@ -0,0 +1,153 @@
+import itertools
+import math
+import os
+import tomllib
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Union
+
+from config import Config, DEFAULT_VEHICLE_LANES
+from sweep_design import SAMPLED_DESIGNS
+
+DESIGNS = ("factorial", *SAMPLED_DESIGNS)
+
+def _vehicle_lanes(config: Config) -> int:
+    return config.crosswalk_size[1] // config.vehicle_lane_size[1]
+
+# A setting a sweep can vary, with its values in the units of the spec.
+# Dividing them by unit gives the ones of the setting, which may depend on
+# the other settings of the point, and value reads them back from a config
+class SweepAxis(NamedTuple):
+    setting: str
+    integer: bool
+    unit: Callable[[Mapping[str, str]], float]
+    value: Callable[[Config], float]
+
+# Axes by their name in the specs, in the order the settings of a point are
+# worked out, so the ones the units of others depend on come first. Rates
+# are in pedestrians per hour on both sides, and vehicles per hour on all
+# the lanes, as in the CSV files
+SWEEP_AXES: Dict[str, SweepAxis] = {
+    "GREEN_LIGHT_TIME": SweepAxis("GREEN_LIGHT_TIME", True, lambda _: 1, lambda c: c.green_light_time),
+    "STOP_LIGHT_CYCLE": SweepAxis("STOP_LIGHT_CYCLE", True, lambda _: 1, lambda c: c.stop_light_cycle),
+    "CROSSWALK_ROWS": SweepAxis("CROSSWALK_ROWS", True, lambda _: 1, lambda c: c.crosswalk_size[0]),
+    "VEHICLE_LANES": SweepAxis("VEHICLE_LANES", True, lambda _: 1, _vehicle_lanes),
+    "PEDESTRIAN_ARRIVAL_RATE_HR": SweepAxis("PEDESTRIAN_ARRIVAL_RATE", False, lambda _: 2*3600,
+                                            lambda c: c.pedestrian_arrival_rate*2*3600),
+    "VEHICLE_ARRIVAL_RATE_HR": SweepAxis("VEHICLE_ARRIVAL_RATE", False,
+                                         lambda s: int(s.get("VEHICLE_LANES", DEFAULT_VEHICLE_LANES))*3600,
+                                         lambda c: c.vehicle_arrival_rate*_vehicle_lanes(c)*3600),
+}
+
+# The values an axis of a spec takes: levels evenly spaced from low to high,
+# both included, or the values listed. Factorial designs take each of them,
+# and the others sample anywhere from low to high, or among the values
+class AxisRange(NamedTuple):
+    low: float
+    high: float
+    levels: Optional[int] = None
+    values: Optional[List[float]] = None
+
+    @property
+    def count(self) -> Optional[int]:
+        return len(self.values) if self.values is not None else self.levels
+
+    # The setting at a level of a factorial design, or at a coordinate in
+    # [0, 1) of a sampled one. Levels are worked out in the units of the
+    # setting as np.linspace does, so a factorial spec of the sweep of
+    # build_configs gives its configs exactly
+    def setting(self, coordinate: Union[int, float], unit: float, integer: bool) -> Union[int, float]:
+        if self.values is not None:
+            index = coordinate if isinstance(coordinate, int) else min(int(coordinate*len(self.values)), len(self.values) - 1)
+            value = self.values[index] / unit
+        elif isinstance(coordinate, int):
+            low, high = self.low / unit, self.high / unit
+            if self.levels == 1:
+                value = low
+            elif coordinate == self.levels - 1:
+                value = high
+            else:
+                value = low + coordinate*((high - low)/(self.levels - 1))
+        elif integer:
+            value = self.low + math.floor(coordinate*(self.high - self.low + 1))
+        else:
+            low, high = self.low / unit, self.high / unit
+            value = low + coordinate*(high - low)
+        return round(value) if integer else value
+
+class SweepSpec(NamedTuple):
+    path: str
+    design: str
+    # Points of the sampled designs, and the seed they are drawn with
+    points: Optional[int]
+    seed: Optional[int]
+    # Settings shared by every point, named as the environment variables
+    settings: Dict[str, str]
+    # In the order of SWEEP_AXES
+    axes: Dict[str, AxisRange]
+
+    @property
+    def name(self) -> str:
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+def _setting(value: Any) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return str(value)
+
+def load_spec(path: str) -> SweepSpec:
+    with open(path, "rb") as f:
+        spec = tomllib.load(f)
+    design = spec.get("design", "factorial")
+    if design not in DESIGNS:
+        raise ValueError(f"Unknown design {design} in {path}, expected one of {list(DESIGNS)}")
+    unknown = [name for name in spec.get("axes", {}) if name not in SWEEP_AXES]
+    if unknown:
+        raise ValueError(f"Unknown axes {unknown} in {path}, expected some of {list(SWEEP_AXES)}")
+    if not spec.get("axes"):
+        raise ValueError(f"No axes in {path}")
+
+    axes = {}
+    for name in SWEEP_AXES:
+        if name not in spec["axes"]:
+            continue
+        axis = spec["axes"][name]
+        values = axis.get("values")
+        if values is not None:
+            axes[name] = AxisRange(min(values), max(values), values=list(values))
+        elif "low" in axis and "high" in axis:
+            axes[name] = AxisRange(axis["low"], axis["high"], axis.get("levels"))
+        else:
+            raise ValueError(f"The axis {name} in {path} needs low and high, or values")
+        if design == "factorial" and axes[name].count is None:
+            raise ValueError(f"The axis {name} in {path} needs levels or values for a factorial design")
+
+    settings = {name: _setting(value) for name, value in spec.get("settings", {}).items()}
+    overlap = [SWEEP_AXES[name].setting for name in axes if SWEEP_AXES[name].setting in settings]
+    if overlap:
+        raise ValueError(f"The settings {overlap} in {path} are swept as well")
+    points = spec.get("points")
+    if design != "factorial" and not points:
+        raise ValueError(f"The {design} design in {path} needs points")
+    return SweepSpec(path, design, points, spec.get("seed"), settings, axes)
+
+# Level indices of a factorial design, or coordinates of a sampled one, of
+# every point of the spec
+def _coordinates(spec: SweepSpec) -> Sequence[Sequence[Union[int, float]]]:
+    if spec.design == "factorial":
+        return list(itertools.product(*(range(axis.count) for axis in spec.axes.values())))
+    return SAMPLED_DESIGNS[spec.design](spec.points, len(spec.axes), spec.seed).tolist()
+
+# The configs of the points of the spec, from the settings of the spec over
+# the ones of environ. In factorial designs the last axis changes fastest
+def build_sweep(spec: SweepSpec, environ: Optional[Mapping[str, str]] = None) -> List[Config]:
+    base = {**(os.environ if environ is None else environ), **spec.settings}
+    configs = []
+    for i, coordinates in enumerate(_coordinates(spec)):
+        settings = dict(base)
+        for (name, axis_range), coordinate in zip(spec.axes.items(), coordinates):
+            axis = SWEEP_AXES[name]
+            settings[axis.setting] = str(axis_range.setting(coordinate, axis.unit(settings), axis.integer))
+        try:
+            configs.append(Config.from_settings(settings))
+        except ValueError as e:
+            raise ValueError(f"Point {i} of {spec.path}: {e}") from e
+    return configs
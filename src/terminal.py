@@ -0,0 +1,97 @@
+import re
+import sys
+import time
+import unicodedata
+from functools import lru_cache
+from typing import List, Optional, TextIO
+
+# A line of a frame is a list of cells, each a string that may carry ANSI
+# colors. Cells are the unit the renderer compares between frames
+Line = List[str]
+
+DEFAULT_TERMINAL_FPS = 10
+
+_ESCAPE = re.compile(r"\033\[[0-9;?]*[A-Za-z]")
+
+# Columns the string takes on a terminal, with wide characters such as the
+# emojis of the grid taking two
+@lru_cache(maxsize=4096)
+def display_width(s: str) -> int:
+    return sum(2 if unicodedata.east_asian_width(c) in "WF" else 0 if unicodedata.combining(c) else 1
+               for c in _ESCAPE.sub("", s))
+
+# Writes the lines at the cursor, in a single write
+def print_lines(lines: List[Line], stream: Optional[TextIO] = None):
+    stream = stream or sys.stdout
+    stream.write("".join("".join(line) + "\n" for line in lines))
+    stream.flush()
+
+def _move(row: int, col: int) -> str:
+    return f"\033[{row + 1};{col + 1}H"
+
+# Draws frames on an ANSI terminal, keeping the last one drawn and writing
+# only the runs of cells that changed since, each after a cursor move, in a
+# single write per frame. Lines whose cells no longer line up with the ones
+# drawn before are written whole. With fps, due tells whether enough time
+# went by for the next frame, so the simulation can run at a speed of its own
+class TerminalRenderer:
+    def __init__(self, stream: Optional[TextIO] = None, fps: Optional[float] = DEFAULT_TERMINAL_FPS):
+        self._stream = stream or sys.stdout
+        self._interval = 1 / fps if fps else 0.0
+        self._next_frame = 0.0
+        self._lines: Optional[List[Line]] = None
+        self._columns: List[List[int]] = []
+        self.frames = 0
+        self.bytes_written = 0
+
+    def due(self) -> bool:
+        return time.monotonic() >= self._next_frame
+
+    def draw(self, lines: List[Line]):
+        out = []
+        if self._lines is None:
+            # Clears the screen and hides the cursor on the first frame
+            out.append("\033[?25l\033[H\033[2J")
+        previous = self._lines or []
+        columns = []
+        for i, line in enumerate(lines):
+            starts = self._starts(line)
+            columns.append(starts)
+            if i >= len(previous) or self._columns[i] != starts:
+                out.append(_move(i, 0) + "".join(line) + "\033[0m\033[K")
+                continue
+            j = 0
+            while j < len(line):
+                if line[j] == previous[i][j]:
+                    j += 1
+                    continue
+                run_start = j
+                while j < len(line) and line[j] != previous[i][j]:
+                    j += 1
+                out.append(_move(i, starts[run_start]) + "".join(line[run_start:j]) + "\033[0m")
+        if len(lines) < len(previous):
+            out.append(_move(len(lines), 0) + "\033[J")
+        out.append(_move(len(lines), 0))
+
+        data = "".join(out)
+        self._stream.write(data)
+        self._stream.flush()
+        self._lines = [list(line) for line in lines]
+        self._columns = columns
+        self.frames += 1
+        self.bytes_written += len(data)
+        self._next_frame = time.monotonic() + self._interval
+
+    # Columns where the cells of a line start, with a last one where the
+    # line ends
+    @staticmethod
+    def _starts(line: Line) -> List[int]:
+        starts = [0]
+        for cell in line:
+            starts.append(starts[-1] + display_width(cell))
+        return starts
+
+    # Shows the cursor again, below the last frame
+    def close(self):
+        self._stream.write("\033[?25h")
+        self._stream.flush()
@@ -0,0 +1,247 @@
+import json
+import os
+import struct
+import weakref
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+from directions import DIRECTIONS, Direction, direction_code
+from grid.grid import Grid
+from grid.cell_filter import VEHICLE, kind_of
+from rectangle import Point, Rectangle
+from road_entity import RoadEntity
+from stoplight import StopLight
+from frame_sink import DEFAULT_ANIMATION_FPS
+from terminal import Line, TerminalRenderer
+
+DEFAULT_TRAJECTORY_FILE = "results/trajectory.npy"
+# Records kept in memory before they are written to the file
+DEFAULT_TRAJECTORY_CHUNK = 65536
+
+# A record is an entity at the end of a tick. Entities take up the rows x
+# cols rectangle at (row, col), and keep their id for as long as they are
+# on the grid
+TRAJECTORY_DTYPE = np.dtype([
+    ("tick", "<i4"),
+    ("id", "<i4"),
+    ("kind", "u1"),
+    ("row", "<i2"),
+    ("col", "<i2"),
+    ("rows", "u1"),
+    ("cols", "u1"),
+    ("facing", "u1"),
+    ("velocity", "u1"),
+    ("crossing", "?"),
+    ("repr", "<U1"),
+])
+
+# The file is a .npy array of records, so np.load maps it as it is. Its
+# header is padded to a fixed size and rewritten with the records written
+# so far after every chunk, so the file is readable while it is written
+HEADER_BYTES = 1024
+
+def _write_header(f, records: int):
+    header = repr({"descr": np.lib.format.dtype_to_descr(TRAJECTORY_DTYPE),
+                   "fortran_order": False,
+                   "shape": (records,)}).encode("latin1")
+    prefix = np.lib.format.MAGIC_PREFIX + bytes([1, 0])
+    header_len = HEADER_BYTES - len(prefix) - 2
+    f.seek(0)
+    f.write(prefix + struct.pack("<H", header_len) + header.ljust(header_len - 1) + b"\n")
+
+def _meta_path(path: str) -> str:
+    return f"{path}.json"
+
+# Writes the entities of every tick of a run to path, a chunk of records
+# at a time through a memory map of the end of the file. Next to it, a JSON
+# file keeps the config and the ticks recorded
+class TrajectoryRecorder:
+    def __init__(self, path: str, config: Config, start_tick: int = 0, chunk: int = DEFAULT_TRAJECTORY_CHUNK):
+        self._path = path
+        self._meta = {"config": config.to_dict(), "start_tick": start_tick, "end_tick": start_tick}
+        self._buffer = np.zeros(chunk, dtype=TRAJECTORY_DTYPE)
+        self._buffered = 0
+        self._written = 0
+        self._last = np.zeros(0, dtype=TRAJECTORY_DTYPE)
+        self._ids: "weakref.WeakKeyDictionary[RoadEntity, int]" = weakref.WeakKeyDictionary()
+        self._next_id = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            _write_header(f, 0)
+        self._write_meta()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def _id(self, entity: RoadEntity) -> int:
+        entity_id = self._ids.get(entity)
+        if entity_id is None:
+            entity_id = self._ids[entity] = self._next_id
+            self._next_id += 1
+        return entity_id
+
+    def record(self, tick: int, grid: Grid[RoadEntity]):
+        rows = []
+        for _, entity in grid.entities():
+            area = entity.footprint()
+            rows.append((tick, self._id(entity), kind_of(entity), area.start_row, area.start_col, area.rows,
+                         area.cols, direction_code(entity.facing), entity._vel, entity.is_crossing(), entity._repr))
+        self._last = np.array(rows, dtype=TRAJECTORY_DTYPE)
+        self._append(self._last)
+        self._meta["end_tick"] = tick
+
+    # The ticks after the last one recorded, with every entity where it was
+    def repeat(self, ticks: int):
+        for _ in range(ticks):
+            self._last = self._last.copy()
+            self._last["tick"] += 1
+            self._append(self._last)
+        self._meta["end_tick"] += ticks
+
+    def _append(self, records: np.ndarray):
+        while len(records) > 0:
+            n = min(len(records), len(self._buffer) - self._buffered)
+            self._buffer[self._buffered:self._buffered + n] = records[:n]
+            self._buffered += n
+            records = records[n:]
+            if self._buffered == len(self._buffer):
+                self.flush()
+
+    def flush(self):
+        if self._buffered > 0:
+            offset = HEADER_BYTES + self._written * TRAJECTORY_DTYPE.itemsize
+            with open(self._path, "r+b") as f:
+                f.truncate(offset + self._buffered * TRAJECTORY_DTYPE.itemsize)
+            chunk = np.memmap(self._path, dtype=TRAJECTORY_DTYPE, mode="r+", offset=offset, shape=(self._buffered,))
+            chunk[:] = self._buffer[:self._buffered]
+            chunk.flush()
+            del chunk
+            self._written += self._buffered
+            self._buffered = 0
+            with open(self._path, "r+b") as f:
+                _write_header(f, self._written)
+        self._write_meta()
+
+    def _write_meta(self):
+        with open(_meta_path(self._path), "w") as f:
+            json.dump(self._meta, f)
+
+    # Extra values, such as the conflicts of the run, are kept with the config
+    def close(self, **extra):
+        self._meta.update(extra)
+        self.flush()
+
+# An entity as recorded, with what plotting it needs
+class RecordedEntity:
+    def __init__(self, record: np.void):
+        self.id = int(record["id"])
+        self._kind = int(record["kind"])
+        self._area = Rectangle.spanning((int(record["row"]), int(record["col"])),
+                                        (int(record["row"]) + int(record["rows"]) - 1,
+                                         int(record["col"]) + int(record["cols"]) - 1))
+        self._facing: Direction = DIRECTIONS[record["facing"]]
+        self._vel = int(record["velocity"])
+        self._crossing = bool(record["crossing"])
+        self._repr = str(record["repr"])
+
+    @property
+    def facing(self) -> Direction:
+        return self._facing
+
+    def is_vehicle(self) -> bool:
+        return self._kind == VEHICLE
+
+    def is_pedestrian(self) -> bool:
+        return not self.is_vehicle()
+
+    def is_crossing(self) -> bool:
+        return self._crossing
+
+    def cells(self) -> List[Point]:
+        return list(self._area.points())
+
+    def footprint(self) -> Rectangle:
+        return self._area
+
+    def __repr__(self) -> str:
+        return self._repr
+
+# A recorded run, read through a memory map of its file, so only the ticks
+# looked at are read from disk
+class Trajectory:
+    def __init__(self, path: str):
+        self.records: np.ndarray = np.load(path, mmap_mode="r")
+        with open(_meta_path(path)) as f:
+            self._meta: Dict[str, Any] = json.load(f)
+        self.config = Config.from_dict(self._meta["config"])
+        self._ticks = self.records["tick"]
+
+    # Ticks recorded, after the one the recording started at
+    @property
+    def ticks(self) -> range:
+        return range(self._meta["start_tick"] + 1, self._meta["end_tick"] + 1)
+
+    def at(self, tick: int) -> np.ndarray:
+        start, end = np.searchsorted(self._ticks, [tick, tick + 1])
+        return self.records[start:end]
+
+    def grid(self, tick: int) -> Grid[RecordedEntity]:
+        grid = Grid[RecordedEntity](self.config.total_rows, self.config.total_cols)
+        for record in self.at(tick):
+            entity = RecordedEntity(record)
+            area = entity.footprint()
+            grid.fill_area(area, entity, area.upper_left)
+        return grid
+
+    # The stop light at the end of tick, from the one the recording started
+    # with. It goes back to where it was every cycle
+    def stop_light(self, tick: int) -> StopLight:
+        light = self.config.new_stop_light()
+        for _ in range((tick - self._meta["start_tick"]) % self.config.stop_light_cycle):
+            light.update()
+        return light
+
+    def frames(self, start: Optional[int] = None, end: Optional[int] = None) -> Iterator[Tuple[int, Grid[RecordedEntity]]]:
+        ticks = self.ticks
+        start = ticks.start if start is None else start
+        end = ticks.stop - 1 if end is None else end
+        for tick in range(start, end + 1):
+            yield tick, self.grid(tick)
+
+def status_lines(trajectory: Trajectory, tick: int, grid: Grid[RecordedEntity]) -> List[Line]:
+    return [[f"Epoch: {tick}"],
+            [str(trajectory.stop_light(tick))],
+            [f"Entities: {grid.entity_count}"]]
+
+# Draws the ticks from start to end of a recorded run on renderer, at most
+# speed ticks per second unless it is 0, and writes them to animation_file.
+# Returns the path of the animation, if any
+def replay(trajectory: Trajectory,
+           renderer: Optional[TerminalRenderer] = None,
+           animation_file: Optional[str] = None,
+           animation_fps: int = DEFAULT_ANIMATION_FPS,
+           speed: float = 0,
+           start: Optional[int] = None,
+           end: Optional[int] = None) -> Optional[str]:
+    from plotter import Plotter
+
+    end = trajectory.ticks.stop - 1 if end is None else end
+    plotter = None
+    began = time.monotonic()
+    for i, (tick, grid) in enumerate(trajectory.frames(start, end)):
+        if plotter is None:
+            plotter = Plotter(grid, trajectory.config, animation_file is not None, animation_file, animation_fps)
+        plotter.grid = grid
+        if animation_file is not None:
+            plotter.add_frame()
+        if renderer is not None and (renderer.due() or tick == end):
+            renderer.draw(status_lines(trajectory, tick, grid) + plotter.plot_lines())
+        if speed > 0:
+            time.sleep(max(0.0, began + (i + 1) / speed - time.monotonic()))
+    if plotter is not None and animation_file is not None:
+        return plotter.save()
+    return None
@@ -1,20 +1,16 @@
-import matplotlib.pyplot as plt
-from matplotlib.image import AxesImage
-
-from images import place_image, squares
 from typing import List
 from abc import ABC, abstractmethod
 
 from grid.relative_grid import RelativeGrid
 from relative_position import forward, right, still
 from stoplight import StopLight
-from generator.tp_generator import choice
-from rectangle import Rectangle
+from generator.tp_generator import choice, APPEARANCE
+from rectangle import Point, Rectangle
 from road_entity import RoadEntity
 
 class Vehicle(RoadEntity, ABC):
     def __init__(self, origin: RelativeGrid[RoadEntity], prototype: Rectangle):
-        self._repr = choice(["🟥", "🟧", "🟨", "🟩", "🟦", "🟪", "🟫"])
+        self._repr = choice(["🟥", "🟧", "🟨", "🟩", "🟦", "🟪", "🟫"], (APPEARANCE, 1))
         self._vel = 10
         self._crossing = False
         self._desired_movement = still()
@@ -23,23 +19,12 @@ class Vehicle(RoadEntity, ABC):
 
         self.build_grids(origin)
 
+    # The vehicle takes up a single area of the grid, spanning from the
+    # rear left cell of the origin to the driver at the front left
     def build_grids(self, origin: RelativeGrid[RoadEntity]):
-        self.relative_origins: List[RelativeGrid[RoadEntity]] = []
-        for i in range(self._width):
-            for j in range(self._length):
-                origin_ij = origin.new_displaced(
-                    right(i) + forward(j)
-                )
-                if i == 0 and j == self._length - 1:
-                    self.driver_pos: RelativeGrid[RoadEntity] = origin_ij
-                else:
-                    self.relative_origins.insert(0,
-                                                 origin_ij)  # We will want to move the last ones first as they're in front
-
-        self.driver_pos.fill(still(), self)
-        for rel_grid_i in self.relative_origins:
-            part = VehiclePart(self, rel_grid_i, self._repr)
-            rel_grid_i.fill(still(), part)
+        self.driver_pos: RelativeGrid[RoadEntity] = origin.new_displaced(forward(self._length - 1))
+        self._footprint = origin.area(right(self._width - 1) + forward(self._length - 1))
+        self.driver_pos.fill_area(self._footprint, self)
 
     @property
     def facing(self):
@@ -83,20 +68,17 @@ class Vehicle(RoadEntity, ABC):
             return False
         
         if self.is_pedestrian_ahead():
-            for rel_grid_i in self.relative_origins:
-                if rel_grid_i.new_displaced(self._desired_movement).is_in(crosswalk_zone):
-                    return True
-            return False
+            d_row, d_col = self._desired_movement.apply(self.facing, (0, 0))
+            return self._footprint.displaced(d_row, d_col).intersects(crosswalk_zone)
 
         if not self.driver_pos.is_inbounds(self._desired_movement):
             self.remove()
             return False
 
-        self._crossing = True
-        self.driver_pos.move(self._desired_movement)
-
-        for rel_grid_i in self.relative_origins:
-            rel_grid_i.move(self._desired_movement)
+        if not self._crossing:
+            self._crossing = True
+            self.driver_pos.refresh_area(self._footprint)
+        self._footprint = self.driver_pos.move_area(self._footprint, self._desired_movement)
 
         return False
 
@@ -104,42 +86,10 @@ class Vehicle(RoadEntity, ABC):
         return self._repr
 
     def remove(self):
-        self.driver_pos.clear()
-        for rel_grid_i in self.relative_origins:
-            rel_grid_i.clear()
-
-    def plot_in_ax(self, ax: plt.Axes) -> List[AxesImage]:
-        return [place_image(ax, squares[self._repr], self.driver_pos._center[1], self.driver_pos._center[0])]
-
-
-class VehiclePart(RoadEntity):
-    def __init__(self, parent: Vehicle, relative_origin: RelativeGrid[RoadEntity], repr: str):
-        self.parent = parent
-        self.relative_origin = relative_origin
-        self._repr = repr
-        self._vel = 0
-
-    @property
-    def facing(self):
-        return self.relative_origin.facing
-    
-    def is_vehicle(self) -> bool:
-        return True
-    
-    def is_crossing(self) -> bool:
-        return self.parent.is_crossing
-
-    def think(self, _: Rectangle, __: StopLight):
-        pass
-
-    def __repr__(self):
-        return self._repr
-
-    def move(self, _: Rectangle):
-        pass
+        self.driver_pos.clear_area(self._footprint)
 
-    def remove(self):
-        pass
+    def cells(self) -> List[Point]:
+        return list(self._footprint.points())
 
-    def plot_in_ax(self, ax: plt.Axes) -> List[AxesImage]:
-        return [place_image(ax, squares[self._repr], self.relative_origin._center[1], self.relative_origin._center[0])]
\ No newline at end of file
+    def footprint(self) -> Rectangle:
+        return self._footprint
@@ -2,7 +2,7 @@ from abc import ABC, abstractmethod
 
 from grid.relative_grid import RelativeGrid
 
-from generator.tp_generator import poi
+from arrivals.arrival_schedule import ArrivalSchedule
 
 from relative_position import right
 from directions import Direction
@@ -15,17 +15,23 @@ from road_entity import RoadEntity
 class VehicleLane(ABC):
     def __init__(self,
                  config: Config,
-                 rel_grid: RelativeGrid[RoadEntity]):
+                 rel_grid: RelativeGrid[RoadEntity],
+                 arrivals: ArrivalSchedule):
         self._config = config
+        self._vehicle_prot = config.vehicle_prot
         self._rel_grid = rel_grid
+        self._arrivals = arrivals
         self._waiting_vehicles = 0
+        self._total_generated_vehicles = 0
 
     @abstractmethod
     def spawn_vehicle(self, vehicle_grid: RelativeGrid[RoadEntity], vehicle_prot: Rectangle):
         pass
 
     def _generate_vehicle(self):
-        self._waiting_vehicles += poi(self._config.vehicle_arrival_rate)
+        new_vehicles = self._arrivals.next()
+        self._waiting_vehicles += new_vehicles
+        self._total_generated_vehicles += new_vehicles
 
     @property
     def facing(self) -> Direction:
@@ -33,7 +39,7 @@ class VehicleLane(ABC):
 
     def _can_place_vehicle(self) -> bool:
         for i in range(self._rel_grid.cols):
-            dist_to_next = self._rel_grid.calc_dist_to_next(right(i), max_checks=self._config.vehicle_prot.cols)
+            dist_to_next = self._rel_grid.calc_dist_to_next(right(i), max_checks=self._vehicle_prot.cols)
             if dist_to_next is not None:
                 return False
         return True
@@ -42,12 +48,26 @@ class VehicleLane(ABC):
         if self._waiting_vehicles == 0 or not self._can_place_vehicle():
             return
 
-        offset = (self._rel_grid.cols - self._config.vehicle_prot.cols) // 2
+        offset = (self._rel_grid.cols - self._vehicle_prot.cols) // 2
 
         vehicle_grid = self._rel_grid.new_displaced(right(offset))
-        self.spawn_vehicle(vehicle_grid, self._config.vehicle_prot)
+        self.spawn_vehicle(vehicle_grid, self._vehicle_prot)
         self._waiting_vehicles -= 1
 
+    # Ticks, up to limit, in which the lane is sure to place no vehicle as
+    # long as the grid doesn't change. The schedule is looked up before the
+    # grid, which is the costly check
+    def idle_ticks(self, limit: int) -> int:
+        ticks = 0 if self._waiting_vehicles > 0 else self._arrivals.idle_ticks(limit)
+        if ticks == limit or self._can_place_vehicle():
+            return ticks
+        return self._arrivals.known_ticks(limit)
+
+    # The same as ticks updates that place no vehicle
+    def skip(self, ticks: int):
+        for _ in range(ticks):
+            self._generate_vehicle()
+
     def update(self):
         self._generate_vehicle()
         self._place_vehicle()